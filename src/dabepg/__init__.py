@@ -21,18 +21,162 @@
 #===============================================================================
 
 
+import bisect
 import datetime
-import locale
+import importlib
 import re
-from dateutil.tz import tzlocal
+from collections import OrderedDict
 import logging
 
 logger = logging.getLogger('dabepg')
 
 MAX_SHORTCRID = 16777215
 TRIGGER_PATTERN = '[0-9a-fA-F]{8}'
+TRIGGER_REGEX = re.compile(TRIGGER_PATTERN)
 
-class Bearer:  
+class InternCache:
+    """Holds a single shared instance of each of a set of immutable values, such
+    as identifiers, by key. The cache is emptied when it reaches its limit.
+    
+    :param limit: maximum number of values held
+    :type limit: int
+    """
+    
+    def __init__(self, limit=65536):
+        self.limit = limit
+        self.values = {}
+        
+    def get(self, key):
+        return self.values.get(key)
+    
+    def add(self, key, value):
+        """Holds a value under a key, unless one is held already, and returns the
+        value held"""
+        held = self.values.get(key)
+        if held is not None: return held
+        if len(self.values) >= self.limit: self.values.clear()
+        self.values[key] = value
+        return value
+    
+    def clear(self):
+        self.values.clear()
+        
+    def __len__(self):
+        return len(self.values)
+
+class LazyModule(object):
+    """Stands in for a module, which is only imported when one of its attributes
+    is first used, keeping the cost of importing dabepg down
+    
+    :param name: absolute name of the module
+    :type name: str
+    """
+    
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        
+    def __getattr__(self, attribute):
+        value = getattr(importlib.import_module(self._name), attribute)
+        setattr(self, attribute, value)
+        return value
+    
+    def __repr__(self):
+        return '<LazyModule: %s>' % self._name
+    
+tz = LazyModule('dateutil.tz')
+
+def now():
+    """Returns the current time in the local timezone"""
+    return datetime.datetime.now(tz.tzlocal())
+
+def to_seconds(delta):
+    """Returns the whole seconds of a timedelta"""
+    return delta.days * 86400 + delta.seconds
+
+# shared by everything that creates content IDs and CRIDs
+identifiers = InternCache()
+
+# shared by the parsers for names, descriptions and keywords
+texts = InternCache()
+
+def intern_string(string):
+    """Returns the shared instance of a string, such as a keyword"""
+    
+    if string is None: return None
+    return texts.add(('string', string), string)
+
+def lazy_list(slot):
+    """Returns a property for a list attribute held in the given slot, which
+    is only allocated when the attribute is first used"""
+    
+    def get(self):
+        try: return getattr(self, slot)
+        except AttributeError:
+            value = []
+            setattr(self, slot, value)
+            return value
+    def set(self, value):
+        setattr(self, slot, value)
+    return property(get, set)
+
+def get_slots(cls):
+    """Returns the names of the slots of a class and its bases"""
+    
+    slots = []
+    for base in reversed(cls.__mro__):
+        names = base.__dict__.get('__slots__', ())
+        if isinstance(names, basestring): names = (names,)
+        slots.extend([x for x in names if x not in slots])
+    return slots
+
+class Slotted(object):
+    """Base of the classes of the object model holding their attributes in
+    ``__slots__``, which pickles the slots that are set, whatever the protocol"""
+    
+    __slots__ = ()
+    
+    def __getstate__(self):
+        state = {}
+        for slot in get_slots(type(self)):
+            try: state[slot] = getattr(self, slot)
+            except AttributeError: pass
+        return state
+    
+    def __setstate__(self, state):
+        for slot, value in state.items(): object.__setattr__(self, slot, value)
+        
+    def copy(self):
+        """Returns a copy holding lists of its own, of the same elements"""
+        
+        state = self.__getstate__()
+        for slot, value in state.items():
+            if isinstance(value, list): state[slot] = list(value)
+        copy = type(self).__new__(type(self))
+        copy.__setstate__(state)
+        return copy
+
+class Freezable(Slotted):
+    """Base of the value classes of the object model whose shared instances are
+    frozen, so that changing one cannot change every holder of it. Copies are
+    not frozen."""
+    
+    __slots__ = ('_frozen',)
+    
+    def freeze(self):
+        """Rejects any further change to the instance, and returns it"""
+        object.__setattr__(self, '_frozen', True)
+        return self
+    
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False): raise AttributeError('%r is shared, and cannot be changed' % self)
+        object.__setattr__(self, name, value)
+        
+    def __getstate__(self):
+        state = Slotted.__getstate__(self)
+        state.pop('_frozen', None)
+        return state
+
+class Bearer(Slotted):
     """DAB Bearer details
 
     :param id: ContentId
@@ -43,13 +187,17 @@ class Bearer:
     8 hexadecimal characters.
     :type trigger: str
     """
+    
+    __slots__ = ('id', 'trigger')
+    
     def __init__(self, id, trigger=None):
         """Creates the Bearer"""
 
-        if isinstance(id, str): id = ContentId.fromstring(id)
+        if isinstance(id, basestring): id = ContentId.fromstring(id)
+        elif isinstance(id, ContentId): id = ContentId.intern(id)
         self.id = id
         self.trigger = trigger
-        if trigger is not None and re.match(TRIGGER_PATTERN, trigger) is None:
+        if trigger is not None and TRIGGER_REGEX.match(trigger) is None:
             raise ValueError('trigger does not match the following pattern ' + TRIGGER_PATTERN)
         
     def __eq__(self, other):
@@ -64,8 +212,9 @@ class Bearer:
         
 
 CONTENTID_PATTERN = '([0-9a-fA-F]{2})\\.([0-9a-fA-F]{4})(\\.([0-9a-fA-F]{4,8})\\.([0-9a-fA-F]{1})){0,1}'
+CONTENTID_REGEX = re.compile(CONTENTID_PATTERN)
 
-class ContentId:
+class ContentId(Freezable):
     """DAB ensemble Content ID, of the form:
     
     ::
@@ -98,8 +247,16 @@ class ContentId:
     :: 
     
         e1c238
+        
+    Content IDs compare by their integer fields, and equal their string forms.
+    They hash by their string forms, so that either can be used as a key. Those
+    returned by :meth:fromstring and :meth:intern are shared instances, and
+    are frozen: a copy of one can be changed instead. Frozen ones keep their
+    hash.
     """
     
+    __slots__ = ('ecc', 'eid', 'sid', 'scids', 'xpad', '_hash')
+    
     def __init__(self, ecc, eid, sid=None, scids=None, xpad=None):
         """Values can be passed in as hex string or integers"""
         self.sid = sid
@@ -131,10 +288,12 @@ class ContentId:
         
     @classmethod
     def fromstring(cls, string):
-        """Parses a ContentId from its string representation"""        
+        """Parses a ContentId from its string representation, returning the
+        shared instance for it"""        
         
-        pattern = re.compile(CONTENTID_PATTERN)
-        matcher = pattern.search(string)
+        id = identifiers.get(('contentid', string))
+        if id is not None: return id
+        matcher = CONTENTID_REGEX.search(string)
         if not matcher: raise ValueError('ContentId %s does not match the pattern: %s' % (string, CONTENTID_PATTERN))
         ecc = matcher.group(1)
         eid = matcher.group(2)
@@ -143,22 +302,59 @@ class ContentId:
         if len(matcher.groups()) > 2:
             sid = matcher.group(4)
             scids = matcher.group(5)
-        return ContentId(ecc, eid, sid, scids)
+        return identifiers.add(('contentid', string), ContentId.intern(ContentId(ecc, eid, sid, scids)))
+    
+    @classmethod
+    def intern(cls, ecc, eid=None, sid=None, scids=None, xpad=None):
+        """Returns the shared instance of a ContentId, given either as an instance
+        or by the constructor arguments"""
+        
+        id = ecc if isinstance(ecc, ContentId) else ContentId(ecc, eid, sid, scids, xpad)
+        key = ('contentid', id.get_key())
+        held = identifiers.get(key)
+        if held is not None: return held
+        # the instance given is left as it is, and a frozen copy shared instead
+        if id is ecc and not getattr(id, '_frozen', False): id = id.copy()
+        return identifiers.add(key, id.freeze())
+    
+    def get_key(self):
+        """Returns the integer fields as a tuple"""
+        return (self.ecc, self.eid, self.sid, self.scids, self.xpad)
     
     def __str__(self):
-        id = '{ecc:02x}.{eid:04x}'.format(ecc=self.ecc, eid=self.eid)
         if self.sid is not None and self.scids is not None:
-            id += '.{sid:04x}.{scids:x}'.format(sid=self.sid, scids=self.scids)
-        return id
+            return '%02x.%04x.%04x.%x' % (self.ecc, self.eid, self.sid, self.scids)
+        return '%02x.%04x' % (self.ecc, self.eid)
     
     def __repr__(self):
         return '<ContentId: %s>' % str(self)
     
     def __eq__(self, other):
-        return str(self) == str(other)
+        if isinstance(other, ContentId): return self.get_key() == other.get_key()
+        if isinstance(other, basestring): return str(self) == other
+        return NotImplemented
+    
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+    
+    def __hash__(self):
+        # equal content IDs have equal string forms, as do content IDs and the strings they equal
+        value = getattr(self, '_hash', None)
+        return value if value is not None else hash(str(self))
+        
+    def freeze(self):
+        object.__setattr__(self, '_hash', hash(str(self)))
+        return Freezable.freeze(self)
+    
+    def __getstate__(self):
+        state = Freezable.__getstate__(self)
+        state.pop('_hash', None)
+        return state
             
         
 CRID_PATTERN = 'crid://([^\\/]+)/([^\\/]+)'
+CRID_REGEX = re.compile(CRID_PATTERN)
         
 class Crid:
     """A unique identifier for a programme, programme event or programme group in the format
@@ -183,17 +379,29 @@ class Crid:
         
     @classmethod
     def fromstring(cls, string):
-        """Parses a Crid from its string representation"""    
+        """Parses a Crid from its string representation, returning the shared
+        instance for it"""    
         
-        pattern = re.compile(CRID_PATTERN)
-        matcher = pattern.search(string)
-        authority = matcher.group(0)
-        data = matcher.group(1)
-        return Crid(authority, data)
+        crid = identifiers.get(('crid', string))
+        if crid is not None: return crid
+        matcher = CRID_REGEX.search(string)
+        if not matcher: raise ValueError('Crid %s does not match the pattern: %s' % (string, CRID_PATTERN))
+        authority = matcher.group(1)
+        data = matcher.group(2)
+        return identifiers.add(('crid', string), Crid(authority, data))
         
     def __str__(self):
         return 'crid://%s/%s' % (self.authority, self.data)
     
+    def __eq__(self, other):
+        return str(self) == str(other)
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    def __hash__(self):
+        return hash(str(self))
+    
     
 class Ensemble:
     """Used to describe and locate a DAB ensemble or DRM channel.
@@ -233,7 +441,7 @@ class Epg:
 class Link:
     """This is used to link to additional information of content."""    
         
-    def __init__(self, url, mimetype=None, description=None, expiry=None, locale=locale.getlocale()):
+    def __init__(self, url, mimetype=None, description=None, expiry=None, locale=None):
         self.url = url
         self.mimetype = mimetype
         self.description = description
@@ -244,7 +452,7 @@ class Link:
         return self.url
         
         
-class Location:
+class Location(Slotted):
     """Describes the time information and the location in the DAB or DRM channel of a programme.
     There may be:
     
@@ -253,9 +461,14 @@ class Location:
     * One bearer element and multiple time elements
     """
     
+    __slots__ = ('_times', '_bearers')
+    
+    times = lazy_list('_times')
+    bearers = lazy_list('_bearers')
+    
     def __init__(self, times=None, bearers=None):
-        self.times = times if times is not None else []
-        self.bearers = [] if bearers is None else map(lambda x: x if isinstance(x, ContentId) else ContentId.fromstring(str(x)), bearers)
+        if times is not None: self.times = times
+        if bearers is not None: self.bearers = map(lambda x: ContentId.intern(x) if isinstance(x, ContentId) else ContentId.fromstring(str(x)), bearers)
         
     def __str__(self):
         return str(dict(times=self.times, bearers=self.bearers))
@@ -264,9 +477,11 @@ class Location:
         return '<Location: %s>' % str(self)
         
         
-class BaseTime:
+class BaseTime(Slotted):
     """Base for Absolute and Relative times"""
     
+    __slots__ = ()
+    
     def get_billed_time(self, base):
         raise ValueError('not implemented')
         
@@ -283,6 +498,8 @@ class BaseTime:
 class RelativeTime(BaseTime):
     """Time for a :class:ProgrammeEvent relative to the start of the containing :class:Programme"""
     
+    __slots__ = ('billed_offset', 'billed_duration', 'actual_offset', 'actual_duration')
+    
     def __init__(self, billed_offset, billed_duration, actual_offset=None, actual_duration=None):
         self.actual_offset = actual_offset
         self.actual_duration = actual_duration
@@ -313,6 +530,8 @@ class RelativeTime(BaseTime):
 class Time(BaseTime):
     """Absolute time for a :class:ProgrammeEvent or :class:Programme"""
     
+    __slots__ = ('billed_time', 'billed_duration', 'actual_time', 'actual_duration')
+    
     def __init__(self, billed_time, billed_duration, actual_time=None, actual_duration=None):
         self.actual_time = actual_time
         self.actual_duration = actual_duration
@@ -337,17 +556,52 @@ class Time(BaseTime):
     def __repr__(self):
         return '<Time: %s>' % str(self)
 
-class Text:
-    """Abstract class for textual information"""
+class Text(Freezable):
+    """Abstract class for textual information.
+    
+    Texts compare and hash by their type and text. Those returned by
+    :meth:intern are shared instances, and are frozen: a copy of one can be
+    changed instead.
+    """
     
-    def __init__(self, text, max_length, locale=locale.getdefaultlocale()):
+    __slots__ = ('text', '_max_length')
+    
+    def __init__(self, text, max_length, locale=None):
         if not isinstance(text, basestring): raise ValueError('text must be of a basestring subtype, not %s: %s', type(text), text)
         if len(text) > max_length: 
             #raise ValueError('text length exceeds the maximum: %d>%d' % (len(text), max_length))
             logger.warning('text length exceeds the maximum: %d>%d : %s' % (len(text), max_length, text))
-        self.max_length = max_length
+        self._max_length = max_length
         self.text = text
         
+    def get_max_length(self):
+        return self._max_length
+    
+    def set_max_length(self, max_length):
+        self._max_length = max_length
+        
+    max_length = property(get_max_length, set_max_length)
+    
+    @classmethod
+    def intern(cls, text):
+        """Returns the shared instance of a text of this type, holding the shared
+        instance of its string"""
+        
+        shared = texts.get((cls, text))
+        if shared is not None: return shared
+        return texts.add((cls, text), cls(intern_string(text)).freeze())
+    
+    def __eq__(self, other):
+        if self is other: return True
+        if not isinstance(other, Text): return False
+        return type(self) is type(other) and self.text == other.text
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    def __hash__(self):
+        return hash((type(self), self.text))
+        
     def __str__(self):
         return self.text
 
@@ -357,41 +611,51 @@ class Text:
 class LongDescription(Text):
     """Long descriptive text, with maximum length of 1800 characters"""
     
+    __slots__ = ()
+    
     max_length = 1800
     
-    def __init__(self, text, locale=locale.getdefaultlocale()):
+    def __init__(self, text, locale=None):
         Text.__init__(self, text, 1800, locale)
 
 class ShortDescription(Text):
     """Short descriptive text, with maximum length of 180 characters"""
     
+    __slots__ = ()
+    
     max_length = 180
     
-    def __init__(self, text, locale=locale.getdefaultlocale()):
+    def __init__(self, text, locale=None):
         Text.__init__(self, text, 180, locale)
         
 class LongName(Text):
     """Long name text, with maximum length of 128 characters"""
     
+    __slots__ = ()
+    
     max_length = 128
     
-    def __init__(self, text, locale=locale.getdefaultlocale()):
+    def __init__(self, text, locale=None):
         Text.__init__(self, text, 128, locale)
 
 class MediumName(Text):
     """Medium name text, with maximum length of 16 characters"""
 
+    __slots__ = ()
+    
     max_length = 16
     
-    def __init__(self, text, locale=locale.getdefaultlocale()):
+    def __init__(self, text, locale=None):
         Text.__init__(self, text, 16, locale)
         
 class ShortName(Text):
     """Short name text, with maximum length of 8 characters"""
     
+    __slots__ = ()
+    
     max_length = 8
     
-    def __init__(self, text, locale=locale.getdefaultlocale()):
+    def __init__(self, text, locale=None):
         Text.__init__(self, text, 8, locale)    
         
 def suggest_names(names):   
@@ -458,7 +722,7 @@ class Multimedia:
     LOGO_MONO_RECTANGLE = "logo_mono_rectangle"
     LOGO_COLOUR_RECTANGLE = "logo_colour_rectangle"
     
-    def __init__(self, url, type=LOGO_UNRESTRICTED, mimetype=None, height=None, width=None, locale=locale.getdefaultlocale()):
+    def __init__(self, url, type=LOGO_UNRESTRICTED, mimetype=None, height=None, width=None, locale=None):
         self.url = url
         self.type = type
         self.mimetype = mimetype
@@ -469,7 +733,7 @@ class Multimedia:
         elif type != Multimedia.LOGO_UNRESTRICTED and (height or width):
             raise ValueError('should not specify width or height when type is restricted')    
         
-class Programme:
+class Programme(Slotted):
     """Describes and locates a programme.
     
     :param shortcrid: Short Crid
@@ -487,6 +751,18 @@ class Programme:
     :type version: int
     """   
     
+    __slots__ = ('shortcrid', 'crid', 'version', 'bitrate', 'onair', 'recommendation', '_names', '_locations',
+                 '_media', '_genres', '_keywords', '_memberships', '_links', '_events')
+    
+    names = lazy_list('_names')
+    locations = lazy_list('_locations')
+    media = lazy_list('_media')
+    genres = lazy_list('_genres')
+    keywords = lazy_list('_keywords')
+    memberships = lazy_list('_memberships')
+    links = lazy_list('_links')
+    events = lazy_list('_events')
+    
     def __init__(self, shortcrid, crid=None, bitrate=None, onair=True, recommendation=True, version=1):
         self.shortcrid = shortcrid
         self.crid = crid
@@ -494,14 +770,6 @@ class Programme:
         self.bitrate = bitrate
         self.onair = onair
         self.recommendation = recommendation
-        self.names = []
-        self.locations = []
-        self.media = []
-        self.genres = []
-        self.keywords = []
-        self.memberships = []
-        self.links = []
-        self.events = []
         
     def get_name(self, max_length=LongName.max_length):
         """returns the first name set with a length at or below the max_length field, which 
@@ -532,7 +800,7 @@ class Programme:
         return '<Programme: %s>' % str(self)    
     
     
-class ProgrammeEvent:
+class ProgrammeEvent(Slotted):
     """Describes and locates a programme event
     
     :param shortcrid: Short Crid
@@ -550,6 +818,17 @@ class ProgrammeEvent:
     :type version: int
     """       
     
+    __slots__ = ('shortcrid', 'originator', 'crid', 'version', 'bitrate', 'onair', 'recommendation', '_names',
+                 '_locations', '_media', '_genres', '_keywords', '_memberships', '_links')
+    
+    names = lazy_list('_names')
+    locations = lazy_list('_locations')
+    media = lazy_list('_media')
+    genres = lazy_list('_genres')
+    keywords = lazy_list('_keywords')
+    memberships = lazy_list('_memberships')
+    links = lazy_list('_links')
+    
     def __init__(self, shortcrid, originator=None, crid=None, version=None, bitrate=None, onair=True, recommendation=False):
         self.shortcrid = shortcrid
         self.originator = originator
@@ -558,13 +837,6 @@ class ProgrammeEvent:
         self.bitrate = bitrate
         self.onair = onair
         self.recommendation = recommendation
-        self.names = []
-        self.locations = []
-        self.media = []
-        self.genres = []
-        self.keywords = []
-        self.memberships = []
-        self.links = []
         
     def __str__(self):
         return str(self.names)
@@ -573,36 +845,429 @@ class ProgrammeEvent:
         return '<ProgrammeEvent: %s>' % str(self)
     
     
-class Schedule:
-    """Contains programmes within a given time period."""
+class ScheduleListener:
+    """Receives notice of the programmes added to and removed from a :class:Schedule,
+    to keep indexes over it up to date"""
     
-    def __init__(self, created=datetime.datetime.now(tzlocal()), version=1, originator=None):
-        self.created = created
+    def on_programme_added(self, programme):
+        pass
+    
+    def on_programme_removed(self, programme):
+        pass
+    
+
+class ProgrammeList(list):
+    """List of the programmes of a :class:Schedule, which tells the schedule's
+    listeners about every programme added to or removed from it"""
+    
+    def __init__(self, programmes=(), listeners=None):
+        list.__init__(self, programmes)
+        self.listeners = listeners if listeners is not None else []
+        
+    def added(self, programmes):
+        for listener in self.listeners:
+            for programme in programmes: listener.on_programme_added(programme)
+            
+    def removed(self, programmes):
+        for listener in self.listeners:
+            for programme in programmes: listener.on_programme_removed(programme)
+        
+    def append(self, programme):
+        list.append(self, programme)
+        self.added([programme])
+        
+    def extend(self, programmes):
+        programmes = list(programmes)
+        list.extend(self, programmes)
+        self.added(programmes)
+        
+    def __iadd__(self, programmes):
+        self.extend(programmes)
+        return self
+    
+    def __imul__(self, n):
+        self.extend(list(self) * (n - 1) if n > 0 else [])
+        if n <= 0: del self[:]
+        return self
+        
+    def insert(self, index, programme):
+        list.insert(self, index, programme)
+        self.added([programme])
+        
+    def remove(self, programme):
+        list.remove(self, programme)
+        self.removed([programme])
+        
+    def pop(self, index=-1):
+        programme = list.pop(self, index)
+        self.removed([programme])
+        return programme
+    
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            old = self[index]
+            value = list(value)
+        else:
+            old = [self[index]]
+        list.__setitem__(self, index, value)
+        self.removed(old)
+        self.added(value if isinstance(index, slice) else [value])
+        
+    def __delitem__(self, index):
+        old = self[index] if isinstance(index, slice) else [self[index]]
+        list.__delitem__(self, index)
+        self.removed(old)
+        
+    def __setslice__(self, i, j, programmes):
+        self.__setitem__(slice(max(0, i), max(0, j)), programmes)
+        
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(max(0, i), max(0, j)))
+        
+    def __reduce__(self):
+        # listeners belong to the schedule, which restores them
+        return (ProgrammeList, (list(self),))
+    
+    
+def get_extent(programme):
+    """Returns the earliest start, latest end and the service IDs of the
+    locations of a programme, as a tuple"""
+    
+    start = None
+    end = None
+    services = []
+    
+    for location in programme.locations:
+        for time in location.times:
+            if isinstance(time, RelativeTime) or time.billed_time is None: continue
+            if start is None or start > time.billed_time:
+                start = time.billed_time
+            if end is None or end < time.billed_time + time.billed_duration:
+                end = time.billed_time + time.billed_duration
+        for bearer in location.bearers:
+            if isinstance(bearer, Bearer): bearer = bearer.id # we have a Bearer
+            elif not isinstance(bearer, ContentId): continue
+            if bearer not in services: services.append(bearer)
+            
+    return start, end, services
+
+
+class CountingListener(ScheduleListener):
+    """Base of the listeners a schedule keeps itself, which can leave the
+    programmes of a schedule just loaded to be counted when first used"""
+    
+    deferred = None
+    
+    def defer(self, programmes):
+        """Clears the listener, leaving the given programmes to be counted in one
+        pass by :meth:rebuild the first time the listener is used"""
+        self.rebuild(())
+        self.deferred = list(programmes)
+        
+    def settle(self):
+        if self.deferred is not None: self.rebuild(self.deferred)
+        
+        
+class ScopeTracker(CountingListener):
+    """Keeps the scope of the programmes of a schedule as they are added and
+    removed, by counting the programmes at each start and end time and on each
+    service. The earliest start and latest end are only looked for again when
+    the programmes holding them are removed."""
+    
+    def __init__(self, programmes=()):
+        self.rebuild(programmes)
+        
+    def rebuild(self, programmes):
+        """Recounts the given programmes in one pass"""
+        self.deferred = None
+        self.starts = {}
+        self.ends = {}
+        self.services = OrderedDict()
+        self.extents = {}
+        self.start = None
+        self.end = None
+        for programme in programmes: self.on_programme_added(programme)
+        
+    def on_programme_added(self, programme):
+        self.settle()
+        start, end, services = extent = get_extent(programme)
+        self.extents.setdefault(id(programme), []).append(extent)
+        if start is not None:
+            self.starts[start] = self.starts.get(start, 0) + 1
+            if self.start is not None and start < self.start or len(self.starts) == 1: self.start = start
+        if end is not None:
+            self.ends[end] = self.ends.get(end, 0) + 1
+            if self.end is not None and end > self.end or len(self.ends) == 1: self.end = end
+        for service in services:
+            self.services[service] = self.services.get(service, 0) + 1
+            
+    def on_programme_removed(self, programme):
+        self.settle()
+        extents = self.extents.get(id(programme))
+        if not extents: return
+        start, end, services = extents.pop()
+        if not extents: del self.extents[id(programme)]
+        if start is not None:
+            self.starts[start] = count = self.starts[start] - 1
+            if not count:
+                del self.starts[start]
+                if start == self.start: self.start = None
+        if end is not None:
+            self.ends[end] = count = self.ends[end] - 1
+            if not count:
+                del self.ends[end]
+                if end == self.end: self.end = None
+        for service in services:
+            self.services[service] = count = self.services[service] - 1
+            if not count: del self.services[service]
+            
+    def check(self, programmes):
+        """Recounts those of the given programmes whose locations have changed
+        in place since they were counted"""
+        self.settle()
+        for programme in programmes:
+            extents = self.extents.get(id(programme))
+            if not extents: continue
+            extent = get_extent(programme)
+            if extents[-1] == extent: continue
+            for i in range(len(extents)):
+                self.on_programme_removed(programme)
+                self.on_programme_added(programme)
+        
+    def get_scope(self):
+        self.settle()
+        if not len(self.starts) or not len(self.ends): return None
+        if self.start is None: self.start = min(self.starts)
+        if self.end is None: self.end = max(self.ends)
+        return Scope(self.start, self.end, self.services.keys())
+    
+    
+class KeyIndex(CountingListener):
+    """Index of the programmes of a schedule by their short CRIDs and CRIDs. Where
+    programmes share a key, the one added last is held under it, and when that
+    is removed the one added before it is held again."""
+    
+    def __init__(self, programmes=()):
+        self.rebuild(programmes)
+        
+    def rebuild(self, programmes):
+        self.deferred = None
+        self.shortcrids = {}
+        self.crids = {}
+        self.keys = {}
+        for programme in programmes: self.on_programme_added(programme)
+        
+    def on_programme_added(self, programme):
+        self.settle()
+        shortcrid, crid = keys = get_keys(programme)
+        self.keys.setdefault(id(programme), []).append(keys)
+        if shortcrid is not None: self.shortcrids.setdefault(shortcrid, []).append(programme)
+        if crid is not None: self.crids.setdefault(crid, []).append(programme)
+        
+    def on_programme_removed(self, programme):
+        self.settle()
+        keys = self.keys.get(id(programme))
+        if not keys: return
+        shortcrid, crid = keys.pop()
+        if not keys: del self.keys[id(programme)]
+        if shortcrid is not None: discard(self.shortcrids, shortcrid, programme)
+        if crid is not None: discard(self.crids, crid, programme)
+        
+    def get(self, shortcrid=None, crid=None):
+        self.settle()
+        if shortcrid is not None: programmes = self.shortcrids.get(int(shortcrid))
+        elif crid is not None: programmes = self.crids.get(str(crid))
+        else: return None
+        return programmes[-1] if programmes else None
+        
+        
+def discard(index, key, programme):
+    """Removes the last entry of a programme from those held under a key"""
+    programmes = index[key]
+    for i in xrange(len(programmes) - 1, -1, -1):
+        if programmes[i] is programme:
+            del programmes[i]
+            break
+    if not programmes: del index[key]
+    
+def get_keys(programme):
+    """Returns the short CRID and CRID of a programme, as an int and a str"""
+    return (int(programme.shortcrid) if programme.shortcrid is not None else None,
+            str(programme.crid) if programme.crid is not None else None)
+
+        
+class Schedule(object):
+    """Contains programmes within a given time period.
+    
+    Indexes can be kept over the programmes by registering a :class:ScheduleListener,
+    which is told about programmes as they are added to or removed from
+    ``programmes``. Programmes changed in place should be passed to :meth:update.
+    
+    The scope of the schedule and an index of its programmes by short CRID and
+    CRID are kept up to date in the same way.
+    """
+    
+    def __init__(self, created=None, version=1, originator=None):
+        self.created = created if created is not None else now()
         self.version = version
         self.originator = originator
-        self.programmes = []
+        self.scope_tracker = ScopeTracker()
+        self.key_index = KeyIndex()
+        self.listeners = [self.scope_tracker, self.key_index]
+        self.positions = {}
+        self.removed = []
+        self._programmes = ProgrammeList(listeners=self.listeners)
         
-    def get_scope(self):
+    def get_programmes(self):
+        return self._programmes
+    
+    def set_programmes(self, programmes):
+        old = self._programmes
+        self._programmes = ProgrammeList(programmes, self.listeners)
+        old.listeners = []
+        self._programmes.removed(old)
+        self._programmes.added(self._programmes)
+        
+    programmes = property(get_programmes, set_programmes)
+    
+    def load_programmes(self, programmes):
+        """Sets the programmes of the schedule, as setting ``programmes`` does,
+        but leaves the scope and the index by key to count them the first time
+        they are used, for schedules loaded in bulk that may not be queried"""
+        
+        old = self._programmes
+        self._programmes = ProgrammeList(programmes, self.listeners)
+        old.listeners = []
+        for listener in self.listeners:
+            if isinstance(listener, CountingListener):
+                listener.defer(self._programmes)
+            else:
+                for programme in old: listener.on_programme_removed(programme)
+                for programme in self._programmes: listener.on_programme_added(programme)
+    
+    def add_listener(self, listener):
+        """Registers a listener, telling it about the programmes already in the schedule"""
+        self.listeners.append(listener)
+        for programme in self._programmes: listener.on_programme_added(programme)
+        
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+        
+    def update(self, programme):
+        """Tells the listeners that a programme in the schedule has been changed in place"""
+        for listener in self.listeners:
+            listener.on_programme_removed(programme)
+            listener.on_programme_added(programme)
+            
+    def get_programme(self, shortcrid=None, crid=None):
+        """Returns the programme with the given short CRID or CRID, or None if
+        there is none"""
+        
+        return self.key_index.get(shortcrid, crid)
+    
+    def get_position(self, programme):
+        """Returns the position of a programme in the list of programmes"""
+        
+        # positions are remembered as they were when last counted, less the
+        # programmes since removed by :meth:remove before them, and checked on use
+        position = self.positions.get(id(programme))
+        if position is not None:
+            current = position - bisect.bisect_left(self.removed, position)
+            if current < len(self._programmes) and self._programmes[current] is programme: return current
+        self.positions = dict([(id(x), i) for i, x in enumerate(self._programmes)])
+        self.removed = []
+        position = self.positions.get(id(programme))
+        if position is None: raise ValueError('programme is not in the schedule: %r' % programme)
+        return position
+    
+    def replace(self, programme, replacement):
+        """Puts a programme in the place of another"""
+        
+        position = self.get_position(programme)
+        self._programmes[position] = replacement
+        self.positions[id(replacement)] = self.positions.pop(id(programme))
+        
+    def upsert(self, programme):
+        """Replaces the programme with the same short CRID, or failing that CRID,
+        as the given one, or adds the programme if there is none. Returns the
+        programme replaced, if any."""
+        
+        shortcrid, crid = get_keys(programme)
+        existing = self.get_programme(shortcrid=shortcrid)
+        if existing is None and crid is not None: existing = self.get_programme(crid=crid)
+        if existing is not None:
+            self.replace(existing, programme)
+        else:
+            self._programmes.append(programme)
+            self.positions[id(programme)] = len(self._programmes) - 1 + len(self.removed)
+        return existing
+    
+    def remove(self, shortcrid=None, crid=None):
+        """Removes and returns the programme with the given short CRID or CRID, or
+        returns None if there is none"""
+        
+        programme = self.get_programme(shortcrid, crid)
+        if programme is None: return None
+        position = self.get_position(programme)
+        del self._programmes[position]
+        bisect.insort(self.removed, self.positions.pop(id(programme)))
+        return programme
+            
+    def __getstate__(self):
+        # the built in indexes hold programmes by identity, so are rebuilt instead
+        state = self.__dict__.copy()
+        state['_programmes'] = list(self._programmes)
+        state['listeners'] = [x for x in self.listeners if x is not self.scope_tracker and x is not self.key_index]
+        state['positions'] = {}
+        state['removed'] = []
+        del state['scope_tracker']
+        del state['key_index']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.scope_tracker = ScopeTracker(state['_programmes'])
+        self.key_index = KeyIndex(state['_programmes'])
+        self.listeners[0:0] = [self.scope_tracker, self.key_index]
+        self._programmes = ProgrammeList(state['_programmes'], self.listeners)
+        
+    def get_scope(self, check=True):
         """Returns the suggested scope of the schedule, taken as an aggregate of the bearers
-        and times in the locations of each programme"""
+        and times in the locations of each programme. Services are listed in the
+        order they were first added.
+        
+        The scope is kept as programmes are added, removed and passed to
+        :meth:update. Unless ``check`` is cleared, the locations of every
+        programme are looked at again first, and those changed in place are
+        recounted. Callers that only change programmes through :meth:update
+        can clear it to have the kept scope straight away."""
+        
+        if check: self.scope_tracker.check(self._programmes)
+        return self.scope_tracker.get_scope()
+    
+    def rebuild_scope(self):
+        """Recounts the scope from the programmes in one pass, for instance after
+        programmes have been changed in place without being passed to :meth:update"""
+        
+        self.scope_tracker.rebuild(self.programmes)
+        
+    def compute_scope(self):
+        """Recomputes the scope of the schedule from its programmes in one pass, with
+        services listed in the order they appear in"""
         
         start = None
         end = None
         services = []
+        seen = set()
         
         for programme in self.programmes:
-            for location in programme.locations:
-                for time in location.times:
-                    if isinstance(time, RelativeTime): continue
-                    if start is None or start > time.billed_time:
-                        start = time.billed_time
-                    if end is None or end < time.billed_time + time.billed_duration:
-                        end = time.billed_time + time.billed_duration
-                for bearer in location.bearers:
-                    if isinstance(bearer, Bearer) and bearer.id not in services:
-                        services.append(bearer.id) # we have a Bearer
-                    elif isinstance(bearer, ContentId) and bearer not in services:
-                        services.append(bearer) # we have a ContentId
+            programme_start, programme_end, programme_services = get_extent(programme)
+            if programme_start is not None and (start is None or start > programme_start): start = programme_start
+            if programme_end is not None and (end is None or end < programme_end): end = programme_end
+            for service in programme_services:
+                if service not in seen:
+                    seen.add(service)
+                    services.append(service)
                     
         if start is None or end is None: return None    
     
@@ -644,7 +1309,7 @@ class Service:
     DGPS = "DGPS"
     PROPRIETARY = "proprietary"
     
-    def __init__(self, id, bitrate=None, type=PRIMARY, format=AUDIO, version=1, locale=locale.getdefaultlocale()):
+    def __init__(self, id, bitrate=None, type=PRIMARY, format=AUDIO, version=1, locale=None):
         self.ids = [id]
         self.bitrate = bitrate
         self.type = type
@@ -681,14 +1346,19 @@ class ServiceInfo:
         self.ensembles = []
         
          
-class Genre:
+class Genre(Freezable):
     """Indicates the genre of a programme, group or service. The genre scheme is based on that used by the 
     TV-Anytime specification.
     
+    Genres held by the registry of :mod:dabepg.genres are shared instances, and
+    are frozen: a copy of one can be changed instead.
+    
     :param href: Genre URI
     :type href: str  
     """
     
+    __slots__ = ('href', 'name')
+    
     def __init__(self, href, name=None):
         self.href = href
         self.name = name     
@@ -0,0 +1,621 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Append-only archive of schedules in a single memory mapped file, whose
+programmes are held in fixed width columns and scanned without being built.
+
+The file is a header followed by segments, one written for each batch of
+programmes appended. A segment holds a column for each field of its
+programmes, a column for each field of their airings (each time of a location
+on each of its bearers), the hrefs and names of their genres, and a heap of the
+strings first used in it. Strings are referred to by a number across the whole
+archive, and stored once.
+
+Whatever the columns cannot hold exactly (keywords, memberships, links,
+events, multimedia, and names, descriptions and locations of other shapes) is
+kept with the programme as a snapshot (see :mod:dabepg.snapshot)."""
+
+from dabepg import Schedule, Programme, Location, Time, Bearer, ContentId, Genre, to_seconds
+from dabepg.columnar import ONAIR, RECOMMENDATION, TIMED, NAIVE, NAME_TYPES, DESCRIPTION_TYPES, \
+    is_pooled, to_timestamp, get_tzoffset
+import dabepg.snapshot as snapshot
+import bisect
+import datetime
+import logging
+import mmap
+import os
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger('dabepg.archive')
+
+MAGIC = 'DABEPGAR'
+SEGMENT_MAGIC = 'SEGM'
+
+# bump whenever the layout below changes
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<8sII')
+HEADER_SIZE = 64
+SEGMENT_HEADER = struct.Struct('<4sIIIIqq')
+
+# programme flags, beyond those of a columnar schedule
+RESIDUAL_LOCATIONS = 0x08
+
+# airing flags
+BEARER = 0x02
+
+# kinds of string in the heap
+STRING = 's'
+UNICODE = 'u'
+BLOB = 'b'
+
+# column name, struct code, value for None
+PROGRAMME_COLUMNS = (('shortcrid', 'i', -1),
+                     ('crid', 'i', -1),
+                     ('version', 'i', -1),
+                     ('bitrate', 'i', -1),
+                     ('flags', 'B', 0),
+                     ('short_name', 'i', -1),
+                     ('medium_name', 'i', -1),
+                     ('long_name', 'i', -1),
+                     ('short_description', 'i', -1),
+                     ('long_description', 'i', -1),
+                     ('genres', 'i', 0),
+                     ('residual', 'i', -1))
+AIRING_COLUMNS = (('programme', 'i', 0),
+                  ('location', 'h', 0),
+                  ('start', 'q', 0),
+                  ('duration', 'i', -1),
+                  ('offset', 'h', NAIVE),
+                  ('bearer', 'i', -1),
+                  ('flags', 'B', 0))
+GENRE_COLUMNS = (('href', 'i', -1),
+                 ('name', 'i', -1))
+
+NAME_COLUMNS = ('short_name', 'medium_name', 'long_name')
+DESCRIPTION_COLUMNS = ('short_description', 'long_description')
+
+class Segment:
+    """The columns of one batch of programmes, read from the archive's memory
+    map, along with the numbers of its first programme and string"""
+
+    def __init__(self, archive, offset):
+        self.offset = offset
+        magic, self.programme_count, self.airing_count, self.genre_count, self.string_count, self.heap_length, self.length = \
+            SEGMENT_HEADER.unpack_from(archive.map, offset)
+        if magic != SEGMENT_MAGIC: raise ValueError('corrupt archive segment at %d: %s' % (offset, archive.path))
+        position = offset + SEGMENT_HEADER.size
+        self.programmes, position = read_columns(archive.map, PROGRAMME_COLUMNS, self.programme_count, position)
+        self.airings, position = read_columns(archive.map, AIRING_COLUMNS, self.airing_count, position)
+        self.genres, position = read_columns(archive.map, GENRE_COLUMNS, self.genre_count, position)
+        self.string_offsets, position = read_column(archive.map, 'q', self.string_count + 1, position)
+        self.heap = position
+        self.programme_base = 0
+        self.string_base = 0
+
+class ScheduleArchive:
+    """Append-only archive of programmes in a file, scanned through a read-only
+    memory map. Programmes are only built when asked for by number, so a scan
+    over months of schedules touches nothing but columns, using NumPy where it
+    is installed.
+
+    Times are stored to the second. Programmes are numbered in the order they
+    were appended, from 0.
+
+    :param path: path of the archive, created if missing
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path) or not os.path.getsize(path):
+            f = open(path, 'wb')
+            try: f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0).ljust(HEADER_SIZE, '\0'))
+            finally: f.close()
+        self.map = None
+        self.strings = None
+        self.open()
+
+    def open(self):
+        """Maps the file and reads the headers of its segments"""
+
+        if self.map is not None: self.map.close()
+        f = open(self.path, 'rb')
+        try: self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally: f.close()
+        magic, version, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC: raise ValueError('not an archive: %s' % self.path)
+        if version != FORMAT_VERSION: raise ValueError('archive is of format version %d, not %d: %s' % (version, FORMAT_VERSION, self.path))
+
+        self.segments = []
+        offset = HEADER_SIZE
+        programmes = strings = 0
+        for i in range(count):
+            segment = Segment(self, offset)
+            segment.programme_base, segment.string_base = programmes, strings
+            programmes += segment.programme_count
+            strings += segment.string_count
+            offset += segment.length
+            self.segments.append(segment)
+        self.end = offset
+        self.programme_count = programmes
+        self.string_count = strings
+        self.string_bases = [x.string_base for x in self.segments]
+
+    def close(self):
+        self.map.close()
+
+    def append(self, programmes):
+        """Appends programmes, or the programmes of a :class:Schedule, as a new
+        segment"""
+
+        if isinstance(programmes, Schedule): programmes = programmes.programmes
+        strings = self.get_strings()
+        writer = SegmentWriter(strings, self.string_count)
+        for programme in programmes: writer.add(programme)
+        if not len(writer.programmes['flags']): return
+
+        f = open(self.path, 'r+b')
+        try:
+            # anything past the last complete segment is left from a failed append
+            f.truncate(self.end)
+            f.seek(self.end)
+            writer.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(self.segments) + 1))
+            f.flush()
+        except:
+            f.close()
+            strings.clear()
+            self.strings = None
+            raise
+        f.close()
+        logger.debug('appended %d programmes to %s', len(writer.programmes['flags']), self.path)
+        self.open()
+
+    def find(self, start=None, end=None, service=None, genre=None, crid=None):
+        """Returns the numbers of the programmes matching every criterion given,
+        in order, scanning the columns of each segment without building any
+        programmes: as a NumPy array where NumPy is installed, otherwise as a
+        list.
+
+        A programme matches a period and a service where one of its airings is
+        on that service and overlaps that period. It matches a genre where one
+        of its genres is that genre or lies below it.
+
+        :param start: only programmes airing after this time
+        :type start: datetime
+        :param end: only programmes airing before this time
+        :type end: datetime
+        :param service: only programmes airing on this service
+        :type service: ContentId, str
+        :param genre: only programmes of this genre, given by href
+        :type genre: str
+        :param crid: only programmes with this CRID
+        :type crid: str
+        """
+
+        start = to_timestamp(start)[0] if start is not None else None
+        end = to_timestamp(end)[0] if end is not None else None
+        bearer = genres = crid_index = None
+        if service is not None:
+            bearer = self.find_string(str(service))
+        if genre is not None:
+            genres = [index for index in self.get_genres() if self.get_string(index) == genre or self.get_string(index).startswith(genre + '.')]
+        if crid is not None:
+            crid_index = self.find_string(str(crid))
+
+        if numpy is not None:
+            found = [x.programme_base + scan_segment(x, start, end, bearer, genres, crid_index) for x in self.segments]
+            return numpy.concatenate(found) if len(found) else numpy.zeros(0, dtype=numpy.intp)
+        found = []
+        for segment in self.segments:
+            found.extend([segment.programme_base + x for x in scan_rows(segment, start, end, bearer, genres, crid_index)])
+        return found
+
+    def count(self, start=None, end=None, service=None, genre=None, crid=None):
+        """Returns the number of programmes matching every criterion given, as
+        :meth:find"""
+
+        return len(self.find(start, end, service, genre, crid))
+
+    def get_programme(self, number):
+        """Builds the programme of a number"""
+
+        if number < 0: number += self.programme_count
+        if number < 0 or number >= self.programme_count: raise IndexError('programme out of range: %d' % number)
+        i = bisect.bisect_right([x.programme_base for x in self.segments], number) - 1
+        segment = self.segments[i]
+        return self.build_programme(segment, number - segment.programme_base)
+
+    def get_programmes(self, numbers):
+        """Yields the programmes of a list of numbers, such as those returned
+        by :meth:find"""
+
+        bases = [x.programme_base for x in self.segments]
+        for number in numbers:
+            segment = self.segments[bisect.bisect_right(bases, number) - 1]
+            yield self.build_programme(segment, int(number) - segment.programme_base)
+
+    def toschedule(self, numbers=None, created=None, version=1, originator=None):
+        """Returns a :class:Schedule of the programmes of a list of numbers, or
+        of every programme"""
+
+        if numbers is None: numbers = xrange(self.programme_count)
+        schedule = Schedule(created, version, originator)
+        schedule.programmes = list(self.get_programmes(numbers))
+        return schedule
+
+    def slice(self, start, end, service=None):
+        """Returns a :class:Schedule of the programmes airing in a period"""
+
+        return self.toschedule(self.find(start, end, service))
+
+    def build_programme(self, segment, i):
+        columns = segment.programmes
+        flags = columns['flags'][i]
+        shortcrid, version, bitrate = columns['shortcrid'][i], columns['version'][i], columns['bitrate'][i]
+        programme = Programme(int(shortcrid) if shortcrid >= 0 else None, self.get_string(columns['crid'][i]),
+                              int(bitrate) if bitrate >= 0 else None, bool(flags & ONAIR), bool(flags & RECOMMENDATION),
+                              int(version) if version >= 0 else None)
+
+        residual = columns['residual'][i]
+        residual = snapshot.unmarshall(self.get_string(residual)) if residual >= 0 else None
+        if residual is not None:
+            for name in ('names', 'media', 'keywords', 'memberships', 'links', 'events', 'locations'):
+                values = getattr(residual, name)
+                if len(values): setattr(programme, name, values)
+        if residual is None or not len(residual.names):
+            for name, type in zip(NAME_COLUMNS, NAME_TYPES):
+                text = self.get_string(columns[name][i])
+                if text is not None: programme.names.append(type.intern(text))
+        if residual is None or not len(residual.media):
+            for name, type in zip(DESCRIPTION_COLUMNS, DESCRIPTION_TYPES):
+                text = self.get_string(columns[name][i])
+                if text is not None: programme.media.append(type.intern(text))
+
+        # genres run up to those of the next programme
+        first = int(columns['genres'][i])
+        last = int(columns['genres'][i + 1]) if i + 1 < segment.programme_count else segment.genre_count
+        for j in xrange(first, last):
+            programme.genres.append(Genre(self.get_string(segment.genres['href'][j]), self.get_string(segment.genres['name'][j])))
+
+        if not flags & RESIDUAL_LOCATIONS:
+            programme.locations = self.build_locations(segment, i)
+        return programme
+
+    def build_locations(self, segment, i):
+        """Builds the locations of a programme from the times and bearers of its
+        airings"""
+
+        airings = segment.airings
+        rows = find_airings(segment, i)
+        locations = []
+        for row in rows:
+            index = airings['location'][row]
+            while len(locations) <= index: locations.append((Location(), set(), set()))
+            location, times, bearers = locations[index]
+            flags = airings['flags'][row]
+            if flags & TIMED:
+                key = (int(airings['start'][row]), int(airings['duration'][row]), int(airings['offset'][row]))
+                if key not in times:
+                    times.add(key)
+                    location.times.append(Time(get_datetime(key[0], key[2]), datetime.timedelta(seconds=key[1])))
+            bearer = int(airings['bearer'][row])
+            if bearer >= 0 and bearer not in bearers:
+                bearers.add(bearer)
+                id = ContentId.fromstring(self.get_string(bearer))
+                location.bearers.append(Bearer(id) if flags & BEARER else id)
+        return [x[0] for x in locations]
+
+    def get_string(self, index):
+        """Returns a string from the heap by its number, or None for -1"""
+
+        if index < 0: return None
+        segment = self.segments[bisect.bisect_right(self.string_bases, index) - 1]
+        i = index - segment.string_base
+        start = segment.heap + int(segment.string_offsets[i])
+        end = segment.heap + int(segment.string_offsets[i + 1])
+        kind, value = self.map[start], self.map[start + 1:end]
+        if kind == UNICODE: return value.decode('utf-8')
+        return value
+
+    def find_string(self, value):
+        """Returns the number of a string in the heap, or -2 if it is not there.
+        Unless every string has been read already for appending, the bytes of
+        the heap of each segment are searched, so that no other string is read."""
+
+        if isinstance(value, unicode): value = value.encode('utf-8')
+        if self.strings is not None: return self.strings.get(value, -2)
+        for segment in self.segments:
+            offsets = segment.string_offsets
+            end = segment.heap + int(offsets[-1])
+            for kind in (STRING, UNICODE):
+                entry = kind + value
+                position = self.map.find(entry, segment.heap, end)
+                while position >= 0:
+                    # a match counts only where it is a whole entry
+                    i = find_offset(offsets, position - segment.heap)
+                    if i >= 0 and int(offsets[i + 1]) - int(offsets[i]) == len(entry): return segment.string_base + i
+                    position = self.map.find(entry, position + 1, end)
+        return -2
+
+    def get_genres(self):
+        """Returns the numbers of the distinct genre hrefs in the archive"""
+
+        genres = set()
+        for segment in self.segments:
+            hrefs = segment.genres['href']
+            genres.update(numpy.unique(hrefs).tolist() if numpy is not None else hrefs)
+        return sorted(genres)
+
+    def get_strings(self):
+        """Returns the numbers of the strings in the heap by their encoded value,
+        read once for the first append and then kept up to date by appends"""
+
+        if self.strings is None:
+            strings = {}
+            for segment in self.segments:
+                for i in xrange(segment.string_count):
+                    start = segment.heap + int(segment.string_offsets[i])
+                    end = segment.heap + int(segment.string_offsets[i + 1])
+                    kind = self.map[start]
+                    if kind != BLOB: strings[self.map[start + 1:end]] = segment.string_base + i
+            self.strings = strings
+        return self.strings
+
+    def __len__(self):
+        return self.programme_count
+
+    def __repr__(self):
+        return '<ScheduleArchive: %s, %d programmes in %d segments>' % (self.path, len(self), len(self.segments))
+
+class SegmentWriter:
+    """Gathers the columns of a batch of programmes, adding new strings to the
+    archive's index of strings as it goes
+
+    :param strings: numbers of the strings already in the archive
+    :type strings: dict
+    :param base: number of the first new string
+    :type base: int
+    """
+
+    def __init__(self, strings, base):
+        self.strings = strings
+        self.base = base
+        self.heap = []
+        self.programmes = dict([(name, []) for name, code, default in PROGRAMME_COLUMNS])
+        self.airings = dict([(name, []) for name, code, default in AIRING_COLUMNS])
+        self.genres = dict([(name, []) for name, code, default in GENRE_COLUMNS])
+
+    def add_string(self, value):
+        """Returns the number of a string, adding it to the heap if new"""
+
+        if value is None: return -1
+        if isinstance(value, unicode): data, kind = value.encode('utf-8'), UNICODE
+        else: data, kind = str(value), STRING
+        index = self.strings.get(data)
+        if index is None:
+            index = self.strings[data] = self.base + len(self.heap)
+            self.heap.append(kind + data)
+        return index
+
+    def add_blob(self, data):
+        self.heap.append(BLOB + data)
+        return self.base + len(self.heap) - 1
+
+    def add(self, programme):
+        """Adds the rows of a programme"""
+
+        row = {}
+        number = len(self.programmes['flags'])
+        row['shortcrid'] = int(programme.shortcrid) if programme.shortcrid is not None else -1
+        row['crid'] = self.add_string(str(programme.crid) if programme.crid is not None else None)
+        if programme.version is not None: row['version'] = programme.version
+        if programme.bitrate is not None: row['bitrate'] = int(programme.bitrate)
+        row['flags'] = (ONAIR if programme.onair else 0) | (RECOMMENDATION if programme.recommendation else 0)
+        residual = Programme(None)
+
+        # names and descriptions are pooled when there is at most one of each kind, in order of length
+        if is_pooled(programme.names, NAME_TYPES):
+            for name in programme.names: row[NAME_COLUMNS[NAME_TYPES.index(type(name))]] = self.add_string(name.text)
+        else: residual.names = list(programme.names)
+        if is_pooled(programme.media, DESCRIPTION_TYPES):
+            for media in programme.media: row[DESCRIPTION_COLUMNS[DESCRIPTION_TYPES.index(type(media))]] = self.add_string(media.text)
+        else: residual.media = list(programme.media)
+
+        row['genres'] = len(self.genres['href'])
+        for genre in programme.genres:
+            self.genres['href'].append(self.add_string(genre.href))
+            self.genres['name'].append(self.add_string(genre.name))
+
+        # the airings are written whatever the shape of the locations, to be
+        # scanned, but are only built from where they hold the locations exactly
+        exact = True
+        for index, location in enumerate(programme.locations):
+            exact = self.add_airings(number, index, location) and exact
+        if not exact:
+            row['flags'] |= RESIDUAL_LOCATIONS
+            residual.locations = list(programme.locations)
+
+        for name in ('keywords', 'memberships', 'links', 'events'):
+            values = getattr(programme, name)
+            if len(values): setattr(residual, name, list(values))
+        for name in ('names', 'media', 'keywords', 'memberships', 'links', 'events', 'locations'):
+            if len(getattr(residual, name)):
+                row['residual'] = self.add_blob(snapshot.marshall(residual))
+                break
+
+        for name, code, default in PROGRAMME_COLUMNS:
+            self.programmes[name].append(row.get(name, default))
+
+    def add_airings(self, number, index, location):
+        """Adds an airing for each time of a location on each of its bearers,
+        returning whether they hold the location exactly"""
+
+        exact = True
+        times = []
+        for time in location.times:
+            if type(time) is not Time or time.billed_time is None:
+                exact = False
+                continue
+            if time.actual_time is not None or time.actual_duration is not None: exact = False
+            if time.billed_time.microsecond or time.billed_duration.microseconds: exact = False
+            start, offset = to_timestamp(time.billed_time)
+            if offset != NAIVE and to_seconds(time.billed_time.utcoffset()) % 60: exact = False
+            times.append((start, to_seconds(time.billed_duration), offset))
+        bearers = []
+        for bearer in location.bearers:
+            if isinstance(bearer, Bearer):
+                if bearer.trigger is not None: exact = False
+                bearers.append((self.add_string(str(bearer.id)), BEARER))
+            else:
+                bearers.append((self.add_string(str(bearer)), 0))
+        if len(set(times)) != len(times) or len(set(bearers)) != len(bearers): exact = False
+
+        columns = self.airings
+        for time in times or [None]:
+            for bearer, flags in bearers or [(-1, 0)]:
+                columns['programme'].append(number)
+                columns['location'].append(index)
+                if time is not None:
+                    columns['start'].append(time[0])
+                    columns['duration'].append(time[1])
+                    columns['offset'].append(time[2])
+                    flags |= TIMED
+                else:
+                    columns['start'].append(0)
+                    columns['duration'].append(-1)
+                    columns['offset'].append(NAIVE)
+                columns['bearer'].append(bearer)
+                columns['flags'].append(flags)
+        return exact
+
+    def write(self, f):
+        """Writes the segment to a file, at its current position"""
+
+        chunks = []
+        for columns, spec in ((self.programmes, PROGRAMME_COLUMNS), (self.airings, AIRING_COLUMNS), (self.genres, GENRE_COLUMNS)):
+            for name, code, default in spec: chunks.append(pad(pack_column(code, columns[name])))
+        offsets = [0]
+        for value in self.heap: offsets.append(offsets[-1] + len(value))
+        chunks.append(pad(pack_column('q', offsets)))
+        heap = pad(''.join(self.heap))
+        length = SEGMENT_HEADER.size + sum([len(x) for x in chunks]) + len(heap)
+        f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(self.programmes['flags']), len(self.airings['flags']),
+                                    len(self.genres['href']), len(self.heap), len(heap), length))
+        for chunk in chunks: f.write(chunk)
+        f.write(heap)
+
+def scan_segment(segment, start, end, bearer, genres, crid):
+    """Returns the local numbers of the programmes of a segment matching the
+    criteria, as a NumPy array, working on whole columns"""
+
+    programmes = numpy.ones(segment.programme_count, dtype=bool)
+    airings = segment.airings
+    if start is not None or end is not None or bearer is not None:
+        mask = numpy.ones(segment.airing_count, dtype=bool)
+        if start is not None or end is not None: mask &= (airings['flags'] & TIMED) != 0
+        if start is not None: mask &= airings['start'] + airings['duration'] > start
+        if end is not None: mask &= airings['start'] < end
+        if bearer is not None: mask &= airings['bearer'] == bearer
+        programmes &= numpy.bincount(airings['programme'][mask], minlength=segment.programme_count) > 0
+    if genres is not None:
+        matches = numpy.flatnonzero(numpy.in1d(segment.genres['href'], genres))
+        owners = numpy.searchsorted(segment.programmes['genres'], matches, 'right') - 1
+        programmes &= numpy.bincount(owners, minlength=segment.programme_count) > 0
+    if crid is not None:
+        programmes &= segment.programmes['crid'] == crid
+    return numpy.flatnonzero(programmes)
+
+def scan_rows(segment, start, end, bearer, genres, crid):
+    """Returns the local numbers of the programmes of a segment matching the
+    criteria, a row at a time"""
+
+    programmes = set(xrange(segment.programme_count))
+    airings = segment.airings
+    if start is not None or end is not None or bearer is not None:
+        matched = set()
+        for row in xrange(segment.airing_count):
+            if start is not None or end is not None:
+                if not airings['flags'][row] & TIMED: continue
+                if start is not None and airings['start'][row] + airings['duration'][row] <= start: continue
+                if end is not None and airings['start'][row] >= end: continue
+            if bearer is not None and airings['bearer'][row] != bearer: continue
+            matched.add(airings['programme'][row])
+        programmes &= matched
+    if genres is not None:
+        genres = set(genres)
+        starts = segment.programmes['genres']
+        programmes &= set([bisect.bisect_right(starts, i) - 1 for i, x in enumerate(segment.genres['href']) if x in genres])
+    if crid is not None:
+        programmes = set([x for x in programmes if segment.programmes['crid'][x] == crid])
+    return sorted(programmes)
+
+def find_airings(segment, i):
+    """Returns the rows of the airings of a programme, which are written in
+    order of programme"""
+
+    column = segment.airings['programme']
+    if numpy is not None:
+        return xrange(numpy.searchsorted(column, i, 'left'), numpy.searchsorted(column, i, 'right'))
+    return xrange(bisect.bisect_left(column, i), bisect.bisect_right(column, i))
+
+def find_offset(offsets, offset):
+    """Returns the index of an offset in a sorted column of offsets, or -1"""
+
+    if numpy is not None: i = int(numpy.searchsorted(offsets, offset))
+    else: i = bisect.bisect_left(offsets, offset)
+    return i if i < len(offsets) and offsets[i] == offset else -1
+
+def read_columns(map, spec, count, position):
+    columns = {}
+    for name, code, default in spec:
+        columns[name], position = read_column(map, code, count, position)
+    return columns, position
+
+def read_column(map, code, count, position):
+    """Returns a column of a memory map, as a NumPy array over the map where
+    NumPy is installed, otherwise as a tuple, and the position after it"""
+
+    size = struct.calcsize('<' + code) * count
+    if numpy is not None: column = numpy.frombuffer(map, dtype='<' + code, count=count, offset=position)
+    else: column = struct.unpack_from('<%d%s' % (count, code), map, position)
+    return column, position + size + (-size % 8)
+
+def pack_column(code, values):
+    return struct.pack('<%d%s' % (len(values), code), *values)
+
+def pad(data):
+    """Pads data to a multiple of 8 bytes, keeping the columns aligned"""
+    return data + '\0' * (-len(data) % 8)
+
+def get_datetime(start, offset):
+    if offset == NAIVE: return datetime.datetime.utcfromtimestamp(start)
+    return datetime.datetime.fromtimestamp(start, get_tzoffset(offset))
@@ -21,24 +21,46 @@
 #===============================================================================
 
 from dabepg import *
+from dabepg.genres import SCHEMES, get_registry
 from bitarray import bitarray, bits2bytes
 import math
-import datetime, dateutil.tz
+import struct
+import datetime
 import logging
 
 logger = logging.getLogger("dabepg.binary")
 
+# NumPy is optional, and only imported when first needed
+numpy = False
+
+def get_numpy():
+    """Returns the NumPy module, or None if it is not installed"""
+    global numpy
+    if numpy is False:
+        try: import numpy as module
+        except ImportError: module = None
+        numpy = module
+    return numpy
+
 class Element:
     
-    def __init__(self, tag, attributes=None, children=None, cdata=None):
+    def __init__(self, tag, attributes=None, children=None, cdata=None, data=None):
         self.tag = tag
         self.attributes = (attributes if attributes is not None else [])
         self.children = (children if children is not None else [])
         self.cdata = cdata
+        self.data = data
         logger.debug('created new element: %s', self)
         
     def tobytes(self):
         logger.debug('rendering element: %s', self)
+        
+        # whole encoding worked out beforehand
+        if self.data is not None:
+            bits = bitarray()
+            bits.frombytes(self.data)
+            return bits
+        
         data = bitarray()
         for attribute in self.attributes: 
             try: data += attribute.tobytes()
@@ -315,134 +337,203 @@ class Attribute:
     def __repr__(self):
         return '<Attribute: tag=%s, value=%s>' % (str(self), self.value)
     
-genre_map = dict(
-    IntentionCS=1,
-    FormatCS=2,
-    ContentCS=3, # what happened to 4?!
-    OriginationCS=5,
-    ContentAlertCS=6,
-    MediaTypeCS=7,
-    AtmosphereCS=8
-)
+genre_map = SCHEMES
     
 def encode_genre(genre):
     
-    segments = genre.href.split(':')
-    if len(segments) < 6: raise ValueError('genre is incorrectly formatted: %s' % genre)
-    
-    bits = bitarray(4)
-    bits.setall(False)
-    
-    # b0-3: RFU(0)
-    # b4-7: CS
-    cs = segments[4]
-    if cs in genre_map.keys(): cs_val = genre_map[cs]
-    else: raise ValueError('unknown CS in genre: %s' % cs)
-    bits += int_to_bitarray(cs_val, 4)
-    
-    # optional schema levels
-    if len(segments) >= 6:
-        levels = segments[6].split('.')
-        for level in levels:
-            bits += int_to_bitarray(int(level), 8)
-        
+    # b0-3: RFU(0), b4-7: CS, then 8 bits for each of the schema levels,
+    # worked out once for the genres in the registry
+    bits = bitarray()
+    bits.frombytes(get_registry().get_encoding(genre))
     return bits
 
 def decode_genre(bits):
     
-    # b4-7: CS
-    cs_val = int(bits[4:8].to01(), 2)
-    if cs_val in genre_map.values(): cs = [x[0] for x in genre_map.items() if x[1] == cs_val]
-    else: raise ValueError('unknown CS value for genre: %d' % cs_val)
-    
-    level = '%d' % cs_val
-    
-    # optional schema levels
-    if bits.length() > 8:
-        i = 8
-        while i < bits.length():
-            sublevel = int(bits[i:i+8].to01(), 2)
-            level += '.%d' % sublevel
-            i += 8
-    
-    return Genre('urn:tva:metadata:cs:ContentCS:2002:%s' % level)
+    data = bits.tobytes()
+    registry = get_registry()
+    genre = registry.decode(data)
+    if genre is not None: return genre
+    return Genre(registry.get_href(data))
     
+# date ordinal of the start of the Modified Julian Date, 17 November 1858
+MJD_ORDINAL = 678576
+
+# dates and timezones of decoded timepoints, shared as there are few of them
+timepoint_dates = {}
+timepoint_timezones = {}
+
 def encode_timepoint(timepoint):
     
-    bits = bitarray(1)
-    bits.setall(False)
+    value, length = pack_timepoint(timepoint)
+    bits = bitarray()
+    bits.frombytes(struct.pack('>Q', value << (64 - length))[:length / 8])
+    return bits
+
+def pack_timepoint(timepoint):
+    """Returns a timepoint packed into an integer, and its length in bits"""
+    
+    offset = timepoint.utcoffset() if timepoint.tzinfo is not None else None
+    offset = offset.days * 86400 + offset.seconds if offset is not None else 0
+    long_form = timepoint.second > 0 or timepoint.microsecond > 0
     
     # b0: RFA(0)
-        
     # b1-17: Date
-    a = (14 - timepoint.month) / 12
-    y = timepoint.year + 4800 - a
-    m = timepoint.month + (12 * a) - 3
-    jdn = timepoint.day + ((153 * m) + 2) / 5 + (365 * y) + (y / 4) - (y / 100) + (y / 400) - 32045
-    jd = jdn + (timepoint.hour - 12) / 24 + timepoint.minute / 1440 + timepoint.second / 86400
-    mjd = (int)(jd - 2400000.5)
-    bits += int_to_bitarray(mjd, 17)
-        
+    value = timepoint.toordinal() - MJD_ORDINAL
+    
     # b18: RFA(0)
-    bits += bitarray('0')
-        
     # b19: LTO Flag
-    if timepoint.tzinfo is None or (timepoint.utcoffset().days == 0 and timepoint.utcoffset().seconds == 0):
-        bits += bitarray('0')
-    else:
-        bits += bitarray('1')
-        
     # b20: UTC Flag
+    value = (value << 3) | (2 if offset else 0) | (1 if long_form else 0)
+    
     # b21: UTC - 11 or 27 bits depending on the form
-    if timepoint.second > 0:
-        bits += bitarray('1')
-        bits += int_to_bitarray(timepoint.hour, 5)
-        bits += int_to_bitarray(timepoint.minute, 6)
-        bits += int_to_bitarray(timepoint.second, 6)
-        bits += bitarray('0' * 10)
-    else:
-        bits += bitarray('0')
-        bits += int_to_bitarray(timepoint.hour, 5)
-        bits += int_to_bitarray(timepoint.minute, 6)
+    value = (value << 11) | (timepoint.hour << 6) | timepoint.minute
+    length = 32
+    if long_form:
+        value = (value << 16) | (timepoint.second << 10) | (timepoint.microsecond / 1000)
+        length = 48
         
     # b32/48: LTO
-    if bits[19]:
-        bits += bitarray('00') # b49-50: RFA(0)
-        offset = (timepoint.utcoffset().days * 86400 + timepoint.utcoffset().seconds) + (timepoint.dst().days * 86400 + timepoint.dst().days)
-        bits += bitarray('0' if offset > 0 else '1') # b51: LTO sign
-        bits += int_to_bitarray(offset / (60 * 60) * 2, 5) # b52-56: Half hours
-            
-    return bits
+    if offset:
+        # b49-50: RFA(0), b51: LTO sign, b52-56: Half hours
+        value = (value << 8) | (0x20 if offset < 0 else 0) | (abs(offset) / 1800)
+        length += 8
+        
+    return value, length
 
 def decode_timepoint(bits):
     
     if not bits.any(): return None # NOW
     
-    mjd = int(bits[1:18].to01(), 2)
-    date = datetime.datetime.fromtimestamp((mjd - 40587) * 86400)
-    timepoint = datetime.datetime.combine(date, datetime.time())
-
+    data = bits.tobytes()
+    length = bits.length()
+    value = int(data.encode('hex'), 16) >> (len(data) * 8 - length)
+    
+    # b1-17: Date
+    mjd = (value >> (length - 18)) & 0x1ffff
+    date = timepoint_dates.get(mjd)
+    if date is None:
+        date = datetime.date.fromordinal(mjd + MJD_ORDINAL)
+        date = timepoint_dates[mjd] = (date.year, date.month, date.day)
+    
     # parse timezone
-    if bits[19]:
-        sign = bits[-6]
-        half_hours = int(bits[-5:].to01(), 2)
-        timezone = dateutil.tz.tzoffset(None, half_hours * 30 * 60 * (-1 if sign else 1))
+    if (value >> (length - 20)) & 1:
+        half_hours = -(value & 0x1f) if value & 0x20 else value & 0x1f
     else:
-        timezone = dateutil.tz.tzutc()
-
+        half_hours = 0
+    timezone = get_timezone(half_hours)
+    
     # parse date with UTC short form or long form
-    if bits[20]:
-        timepoint = timepoint.replace(hour=int(bits[21:26].to01(), 2),
-                                      minute=int(bits[26:32].to01(), 2),
-                                      second=int(bits[32:38].to01(), 2),
-                                      microsecond=int(bits[38:48].to01(), 2) * 1000,
-                                      tzinfo=timezone)
+    hour = (value >> (length - 26)) & 0x1f
+    minute = (value >> (length - 32)) & 0x3f
+    if (value >> (length - 21)) & 1:
+        second = (value >> (length - 38)) & 0x3f
+        millisecond = (value >> (length - 48)) & 0x3ff
+        return datetime.datetime(date[0], date[1], date[2], hour, minute, second, millisecond * 1000, timezone)
     else:
-        timepoint = timepoint.replace(hour=int(bits[21:26].to01(), 2), 
-                                      minute=int(bits[26:32].to01(), 2),
-                                      tzinfo=timezone)
-        
-    return timepoint
+        return datetime.datetime(date[0], date[1], date[2], hour, minute, 0, 0, timezone)
+    
+def encode_times(programmes):
+    """Encodes the time elements of a list of programmes and their events in
+    one vectorised step, returning the time and the bytes of each element, tag
+    and length included, by the id of the time. Times holding values of other
+    types, or lacking a billed time or duration, are left out, to be built one
+    at a time.
+    
+    Each element is encoded as :func:build_time builds it: timepoints are
+    packed as by :func:pack_timepoint, and durations are whole seconds in 16
+    bits.
+    """
+    
+    numpy = get_numpy()
+    times = []
+    for programme in programmes:
+        for location in programme.locations: times.extend(location.times)
+        for event in programme.events:
+            for location in event.locations: times.extend(location.times)
+    
+    # one row for the header of each element and one for each of its
+    # attributes, in the order they are written: the kind of the row (0 for a
+    # header, 1 for a timepoint, 2 for a duration), its tag, then the fields
+    # of its value
+    rows = []
+    encoded = []
+    for time in times:
+        if type(time) is Time:
+            values = ((0x80, time.billed_time), (0x82, time.actual_time), (0x83, time.actual_duration), (0x81, time.billed_duration))
+            tag = 0x2c
+        elif type(time) is RelativeTime:
+            values = ((0x80, time.billed_offset), (0x81, time.billed_duration), (0x82, time.actual_offset), (0x83, time.actual_duration))
+            tag = 0x2f
+        else:
+            continue
+        if values[0][1] is None or time.billed_duration is None: continue
+        element = [(0, tag, 0, 0, 0, 0, 0, 0)]
+        for attribute, value in values:
+            if value is None: continue
+            if type(value) is datetime.datetime:
+                offset = value.utcoffset()
+                element.append((1, attribute, value.toordinal(), value.hour, value.minute, value.second, value.microsecond,
+                                offset.days * 86400 + offset.seconds if offset is not None else 0))
+            elif type(value) is datetime.timedelta:
+                element.append((2, attribute, value.seconds, 0, 0, 0, 0, 0))
+            else:
+                break
+        else:
+            rows.extend(element)
+            encoded.append(time)
+    if not len(rows): return {}
+    
+    kinds, tags, ordinals, hours, minutes, seconds, microseconds, offsets = numpy.array(rows, dtype=numpy.int64).T
+    timepoints = kinds == 1
+    
+    # timepoints - b1-17: Date, b19: LTO Flag, b20: UTC Flag, b21: UTC
+    long_form = timepoints & ((seconds > 0) | (microseconds > 0))
+    lto = timepoints & (offsets != 0)
+    values = ((ordinals - MJD_ORDINAL) << 3) | (lto << 1) | long_form
+    values = (values << 11) | (hours << 6) | minutes
+    values = numpy.where(long_form, (values << 16) | (seconds << 10) | (microseconds // 1000), values)
+    lengths = numpy.where(long_form, 6, 4)
+    
+    # b32/48: LTO
+    values = numpy.where(lto, (values << 8) | ((offsets < 0) << 5) | (numpy.abs(offsets) // 1800), values)
+    lengths += lto
+    
+    # durations, and headers, which hold no value of their own
+    values = numpy.where(kinds == 2, ordinals & 0xffff, numpy.where(timepoints, values, 0))
+    lengths = numpy.where(kinds == 2, 2, numpy.where(timepoints, lengths, 0))
+    
+    # the length of each element is that of its attributes, tags and lengths included
+    headers = numpy.flatnonzero(kinds == 0)
+    sizes = numpy.where(kinds == 0, 0, lengths + 2)
+    element_lengths = numpy.add.reduceat(sizes, headers)
+    lengths[headers] = element_lengths
+    sizes[headers] = 2
+    
+    # lay every row out as its tag, length and left aligned value, and keep
+    # the bytes each covers, in one buffer
+    table = numpy.zeros((len(rows), 9), dtype=numpy.uint8)
+    table[:, 0] = tags
+    table[:, 1] = lengths
+    shifts = numpy.where(kinds == 0, 0, 64 - (sizes - 2) * 8).astype(numpy.uint64)
+    table[:, 2:] = (values.astype(numpy.uint64) << shifts).astype('>u8').view(numpy.uint8).reshape(len(rows), 8)[:, :7]
+    data = table[numpy.arange(9) < sizes[:, None]].tostring()
+    
+    starts = (numpy.cumsum(sizes) - sizes)[headers].tolist()
+    ends = (numpy.array(starts) + element_lengths + 2).tolist()
+    # the times are held, so that their ids cannot be taken by others
+    encodings = dict([(id(time), (time, data[start:end])) for time, start, end in zip(encoded, starts, ends)])
+    logger.debug('encoded %d time elements', len(encodings))
+    return encodings
+    
+def get_timezone(half_hours):
+    """Returns the shared timezone for an offset from UTC in half hours"""
+    
+    timezone = timepoint_timezones.get(half_hours)
+    if timezone is None:
+        if half_hours: timezone = tz.tzoffset(None, half_hours * 30 * 60)
+        else: timezone = tz.tzutc()
+        timepoint_timezones[half_hours] = timezone
+    return timezone
 
 def encode_contentid(id):
 
@@ -500,7 +591,11 @@ def encode_contentid(id):
     return bits
 
 def decode_contentid(bits):
-    """decodes a ContentId from a bitarray"""
+    """decodes a ContentId from a bitarray, returning the shared instance for it"""
+    
+    key = ('contentid bits', bits.length(), bits.tobytes())
+    id = identifiers.get(key)
+    if id is not None: return id
     
     # b0: RFA(0)
     
@@ -552,7 +647,7 @@ def decode_contentid(bits):
         raise ValueError('error parsing ContentId from data: %s', bitarray_to_hex(bits))
         
         
-    return ContentId(ecc, eid, sid, scids, xpad)   
+    return identifiers.add(key, ContentId.intern(ecc, eid, sid, scids, xpad))
 
 def decode_tokentable(bits):
     
@@ -684,6 +779,11 @@ def marshall_epg(epg):
     
     schedule = epg.schedule
     
+    # time elements encoded in one go, from the programmes as they will be
+    # marshalled, as a columnar schedule builds them afresh on each pass
+    programmes = list(schedule.programmes)
+    encodings = encode_times(programmes) if get_numpy() is not None else None
+    
     # epg (default type is DAB, so no need to encode)
     epg_element = Element(0x02)
     
@@ -702,7 +802,7 @@ def marshall_epg(epg):
         schedule_element.children.append(build_scope(scope))
     
     # programmes
-    for programme in schedule.programmes:
+    for programme in programmes:
         programme_element = Element(0x1c)
         programme_element.attributes.append(Attribute(0x81, programme.shortcrid, 24))
         if programme.crid is not None:
@@ -721,7 +821,7 @@ def marshall_epg(epg):
             programme_element.children.append(child)
         # locations
         for location in programme.locations:
-            child = build_location(location)
+            child = build_location(location, encodings)
             programme_element.children.append(child)
         # media
         if len(programme.media) > 0:
@@ -741,7 +841,7 @@ def marshall_epg(epg):
             programme_element.children.append(child)      
         # events
         for event in programme.events:
-            child = build_programme_event(event)
+            child = build_programme_event(event, encodings)
             programme_element.children.append(child) 
             
         schedule_element.children.append(programme_element)
@@ -766,19 +866,22 @@ def build_name(name):
     name_element.cdata = CData(name.text)
     return name_element
     
-def build_location(location):
+def build_location(location, encodings=None):
     location_element = Element(0x19)
     for time in location.times:
-        location_element.children.append(build_time(time))                
+        location_element.children.append(build_time(time, encodings))                
     for bearer in location.bearers:
         bearer_element = Element(0x2d)
         bearer_element.attributes.append(Attribute(0x80, bearer))
         location_element.children.append(bearer_element)       
     return location_element  
 
-def build_time(time):
+def build_time(time, encodings=None):
     time_element = None
-    if isinstance(time, Time):
+    encoded = encodings.get(id(time)) if encodings is not None else None
+    if encoded is not None and encoded[0] is time:
+        time_element = Element(0x2c if isinstance(time, Time) else 0x2f, data=encoded[1])
+    elif isinstance(time, Time):
         time_element = Element(0x2c)
         time_element.attributes.append(Attribute(0x80, time.billed_time))
         if time.actual_time is not None:
@@ -854,7 +957,7 @@ def build_link(link):
         link_element.attributes.append(Attribute(0x84, link.expiry))
     return link_element   
 
-def build_programme_event(event):
+def build_programme_event(event, encodings=None):
     event_element = Element(0x2e)
     if event.crid is not None:
         event_element.attributes.append(Attribute(0x80, event.crid))
@@ -863,14 +966,14 @@ def build_programme_event(event):
         event_element.attributes.append(Attribute(0x82, event.version, 16))
     if event.recommendation is True:
         event_element.attributes.append(Attribute(0x83, 0x02, 8))
-    if not event.onair is False:
+    if event.onair is False:
         event_element.attributes.append(Attribute(0x84, 0x02, 8))
     # names
     for name in event.names:
         event_element.children.append(build_name(name))
     # locations
     for location in event.locations:
-        event_element.children.append(build_location(location))    
+        event_element.children.append(build_location(location, encodings))    
     # media
     if len(event.media) > 0:
         event_element.children.append(build_mediagroup(event.media))       
@@ -1047,10 +1150,10 @@ def parse_media(e):
     # descriptions
     for c in e.get_children(0x1a):
         val = apply_token_table(c.cdata.value, e)
-        media.append(ShortDescription(val))
+        media.append(ShortDescription.intern(val))
     for c in e.get_children(0x1b):
         val = apply_token_table(c.cdata.value, e)
-        media.append(LongDescription(val))
+        media.append(LongDescription.intern(val))
         
     return media
 
@@ -1062,13 +1165,13 @@ def parse_programme(e):
     # names
     for c in e.get_children(0x10):
         val = apply_token_table(c.cdata.value, e)
-        programme.names.append(ShortName(val))
+        programme.names.append(ShortName.intern(val))
     for c in e.get_children(0x11):
         val = apply_token_table(c.cdata.value, e)
-        programme.names.append(MediumName(val))
+        programme.names.append(MediumName.intern(val))
     for c in e.get_children(0x12):
         val = apply_token_table(c.cdata.value, e)
-        programme.names.append(LongName(val))  
+        programme.names.append(LongName.intern(val))  
         
     # media
     for c in e.get_children(0x13):
@@ -1095,7 +1198,7 @@ def parse_schedule(e):
 
 def parse_epg(e):
     schedule = parse_schedule(e.get_children(0x21)[0])
-    return Epg(schedule, type)
+    return Epg(schedule)
 
 def parse_service(e):
     
@@ -1142,6 +1245,36 @@ def parse_service_information(e):
     service_info.ensembles.append(ensemble)
     return service_info
     
+def encode_header(tag, datalength):
+    """Returns the tag and (extended) length bytes preceding an element or
+    attribute with the given data length in bytes"""
+
+    if datalength <= 253:
+        return struct.pack('>BB', tag, datalength)
+    elif datalength <= 0xffff:
+        return struct.pack('>BBH', tag, 0xfe, datalength)
+    elif datalength <= 0xffffff:
+        return struct.pack('>BBBH', tag, 0xff, datalength >> 16, datalength & 0xffff)
+    else: raise ValueError('element data length exceeds the maximum allowed by the extended element length (24bits): %d > %d' % (datalength, 0xffffff))
+
+def decode_header(data, i=0):
+    """Reads the tag and (extended) length of the element or attribute starting
+    at byte offset ``i`` of a byte string, returning the tag and the start and
+    end offsets of its data"""
+
+    tag = ord(data[i])
+    datalength = ord(data[i+1])
+    start = i + 2
+    if datalength == 0xfe:
+        datalength = struct.unpack('>H', data[i+2:i+4])[0]
+        start = i + 4
+    elif datalength == 0xff:
+        datalength = struct.unpack('>I', '\x00' + data[i+2:i+5])[0]
+        start = i + 5
+    if start + datalength > len(data):
+        raise ValueError('end of data is beyond length: %d > %d' % (start + datalength, len(data)))
+    return tag, start, start + datalength
+
 def int_to_bitarray(i, n):
     return bitarray(tuple((0,1)[i>>j & 1] for j in xrange(n-1,-1,-1)))
 
@@ -1169,22 +1302,24 @@ def bitarray_to_binary(bits):
 def unmarshall(i):
     """Unmarshalls a PI or SI binary file to its respective :class:Epg or :class:ServiceInfo object
     
-    :param i: String or File object to read binary from
+    Files are read straight into the bit buffer, without an intermediate copy of
+    their contents.
+    
+    :param i: String, path or File object to read binary from
     :type i: str, file
     """    
     
     logger.debug('unmarshalling object of type: %s', type(i))
     
     b = bitarray()
-    if isinstance(i, file):
+    if isinstance(i, basestring) and i[:1] not in ('\x02', '\x03'):
+        logger.debug('object is a path')
+        f = open(i, 'rb')
+        try: b.fromfile(f)
+        finally: f.close()
+    elif isinstance(i, file):
         logger.debug('object is a file')
-        import StringIO
-        io = StringIO.StringIO()
-        d = i.read()
-        while d:
-            io.write(d)
-            d = i.read()
-        b.frombytes(io.getvalue()) 
+        b.fromfile(i)
     else:
         logger.debug('object is a string of %d bytes', len(str(i)))
         b.frombytes(i)
@@ -0,0 +1,187 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Byte span index over the programme elements of a binary PI object, built
+from the element headers alone, so that single programmes can be decoded
+without decoding the whole object"""
+
+from dabepg.binary import Element, decode_header, decode_contentid, decode_timepoint, \
+    decode_tokentable, parse_programme
+from bitarray import bitarray
+import mmap
+import logging
+
+logger = logging.getLogger('dabepg.binary.index')
+
+class IndexEntry:
+    """Location and key fields of a single programme element
+
+    :param start: byte offset of the programme element tag
+    :type start: int
+    :param end: byte offset just past the end of the programme element
+    :type end: int
+    :param shortcrid: Short Crid
+    :type shortcrid: int
+    :param time: billed time of the first location, if indexed
+    :type time: datetime
+    :param bearer: first bearer of the first location, if indexed
+    :type bearer: ContentId
+    :param context: schedule element holding the token table and default
+    content ID that apply to the programme
+    :type context: Element
+    """
+
+    def __init__(self, start, end, shortcrid, time=None, bearer=None, context=None):
+        self.start = start
+        self.end = end
+        self.shortcrid = shortcrid
+        self.time = time
+        self.bearer = bearer
+        self.context = context
+
+    def __repr__(self):
+        return '<IndexEntry: shortcrid=%s, %d-%d>' % (self.shortcrid, self.start, self.end)
+
+class ProgrammeIndex:
+    """Index of the programme elements in a binary PI object. An index built
+    over a file maps it, and holds the map until closed.
+
+    :param data: the encoded object
+    :type data: str, mmap
+    :param entries: indexed programmes, in document order
+    :type entries: list
+    :param mapped: whether the data is a map of the index's own, to close with it
+    :type mapped: bool
+    """
+
+    def __init__(self, data, entries, mapped=False):
+        self.data = data
+        self.entries = entries
+        self.mapped = mapped
+        self.shortcrids = dict([(x.shortcrid, x) for x in entries])
+
+    def get_entry(self, shortcrid):
+        return self.shortcrids.get(shortcrid)
+
+    def get_element(self, entry):
+        """Decodes the element spanned by an entry"""
+        bits = bitarray()
+        bits.frombytes(self.data[entry.start:entry.end])
+        e = Element.frombits(bits)
+        e.parent = entry.context
+        return e
+
+    def get_programme(self, shortcrid):
+        """Decodes the programme with the given short CRID, or returns None if
+        it is not in the object"""
+        entry = self.get_entry(shortcrid)
+        if entry is not None: return parse_programme(self.get_element(entry))
+
+    def close(self):
+        """Closes the map of the file the index was built over"""
+        if self.mapped:
+            self.data.close()
+            self.mapped = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+def build_index(i, locations=False):
+    """Scans the element headers of a binary PI object, recording the byte span
+    and short CRID of every programme element
+
+    :param i: String or File object to read binary from
+    :type i: str, file
+    :param locations: whether to also decode the first timepoint and bearer of
+    each programme
+    :type locations: bool
+    """
+
+    data = i
+    if isinstance(i, file): data = mmap.mmap(i.fileno(), 0, access=mmap.ACCESS_READ)
+
+    tag, start, end = decode_header(data)
+    if tag != 0x02: raise ValueError('not an epg element: 0x%02x' % tag)
+    epg = Element(0x02)
+    context = None
+    entries = []
+
+    for offset, tag, start, end in iter_headers(data, start, end):
+        read_defaults(epg, data, tag, start, end)
+        if tag != 0x21: continue
+        context = Element(0x21)
+        context.parent = epg
+        for offset, tag, start, end in iter_headers(data, start, end):
+            read_defaults(context, data, tag, start, end)
+            if tag != 0x1c: continue
+            entry = IndexEntry(offset, end, None, context=context)
+            for offset, tag, start, end in iter_headers(data, start, end):
+                if tag == 0x81:
+                    entry.shortcrid = int(data[start:end].encode('hex'), 16)
+                    if not locations: break
+                elif tag == 0x19 and entry.time is None:
+                    read_location(entry, data, start, end)
+                    if entry.bearer is None:
+                        entry.bearer = getattr(context, 'default_contentid', getattr(epg, 'default_contentid', None))
+            entries.append(entry)
+
+    logger.debug('indexed %d programmes', len(entries))
+    return ProgrammeIndex(data, entries, data is not i)
+
+def iter_headers(data, start, end):
+    """Yields the offset, tag and data span of each child of an element"""
+    i = start
+    while i < end:
+        tag, child_start, child_end = decode_header(data, i)
+        yield i, tag, child_start, child_end
+        i = child_end
+
+def read_defaults(e, data, tag, start, end):
+    # token table
+    if tag == 0x04:
+        e.tokens = decode_tokentable(to_bitarray(data[start:end]))
+    # default content ID
+    elif tag == 0x05:
+        e.default_contentid = decode_contentid(to_bitarray(data[start:end]))
+
+def read_location(entry, data, start, end):
+    for offset, tag, start, end in iter_headers(data, start, end):
+        if tag == 0x2c and entry.time is None:
+            for offset, attribute, attribute_start, attribute_end in iter_headers(data, start, end):
+                if attribute == 0x80: entry.time = decode_timepoint(to_bitarray(data[attribute_start:attribute_end]))
+        elif tag == 0x2d and entry.bearer is None:
+            for offset, attribute, attribute_start, attribute_end in iter_headers(data, start, end):
+                if attribute == 0x80: entry.bearer = decode_contentid(to_bitarray(data[attribute_start:attribute_end]))
+
+def to_bitarray(data):
+    bits = bitarray()
+    bits.frombytes(data)
+    return bits
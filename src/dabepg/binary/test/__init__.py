@@ -43,6 +43,69 @@ class ScopeElementTest(unittest.TestCase):
         
 class TimepointTypeTest(unittest.TestCase):
     
+    def test_roundtrip(self):
+        from dabepg.binary import encode_timepoint, decode_timepoint
+        from datetime import datetime
+        
+        for timepoint, length in [(datetime(2010, 7, 30, 9, 0, 0, 0, tzinfo=tzutc()), 32),
+                                  (datetime(2010, 7, 30, 23, 59, 0, 0, tzinfo=tzoffset(None, 3600)), 40),
+                                  (datetime(2010, 7, 30, 9, 30, 11, 250000, tzinfo=tzutc()), 48),
+                                  (datetime(2010, 7, 30, 0, 0, 1, 0, tzinfo=tzoffset(None, -19800)), 56)]:
+            bits = encode_timepoint(timepoint)
+            self.assertEqual(bits.length(), length)
+            self.assertEqual(decode_timepoint(bits), timepoint)
+            self.assertEqual(decode_timepoint(bits).date(), timepoint.date())
+        
+        # the date is the Modified Julian Date, whatever the time of day
+        self.assertEqual(bitarray_to_hex(encode_timepoint(datetime(2010, 7, 30, 9, 0, tzinfo=tzutc()))), '36 1B C2 40')
+        
+        # timezones are shared
+        a = decode_timepoint(encode_timepoint(datetime(2010, 7, 30, 9, 0, tzinfo=tzoffset(None, 3600))))
+        b = decode_timepoint(encode_timepoint(datetime(2010, 7, 31, 9, 0, tzinfo=tzoffset(None, 3600))))
+        self.assertTrue(a.tzinfo is b.tzinfo)
+        
+    def test_batch(self):
+        import dabepg.binary
+        from datetime import datetime, timedelta
+        
+        def build(tzinfos):
+            schedule = Schedule()
+            for i, tzinfo in enumerate(tzinfos):
+                programme = Programme(i + 1)
+                programme.names.append(ShortName('Show %d' % i))
+                start = datetime(2010, 7, 30, i * 5, i % 3, i % 2, (i % 3) * 1500, tzinfo=tzinfo)
+                time = Time(start, timedelta(minutes=30 * (i + 1)))
+                if i % 2: time = Time(start, time.billed_duration, start + timedelta(minutes=2), timedelta(minutes=29))
+                programme.locations.append(Location(times=[time, RelativeTime(timedelta(hours=1), timedelta(minutes=5), timedelta(minutes=i))],
+                                                     bearers=[Bearer('e1.ce15.c221.0')]))
+                event = ProgrammeEvent(i + 10)
+                event.locations.append(Location(times=[RelativeTime(timedelta(minutes=15), timedelta(days=1, seconds=5))]))
+                programme.events.append(event)
+                schedule.programmes.append(programme)
+            return schedule
+        
+        # the time elements of a whole schedule encode in one batch where numpy
+        # is installed, to the same bytes as one at a time
+        for schedule in (build([tzutc(), tzoffset(None, 3600), tzoffset(None, -19800), tzutc(), tzoffset(None, 1800)]), build([None] * 4)):
+            encodings = dabepg.binary.encode_times(schedule.programmes)
+            self.assertEqual(len(encodings), len(schedule.programmes) * 3)
+            for programme in schedule.programmes:
+                for time in programme.locations[0].times + programme.events[0].locations[0].times:
+                    self.assertEqual(encodings[id(time)], (time, build_time(time).tobytes().tobytes()))
+            batched = marshall(Epg(schedule))
+            numpy = dabepg.binary.numpy
+            dabepg.binary.numpy = None
+            try:
+                self.assertEqual(marshall(Epg(schedule)), batched)
+            finally:
+                dabepg.binary.numpy = numpy
+        
+        # times it cannot hold are built one at a time
+        self.assertEqual(dabepg.binary.encode_times([]), {})
+        programme = Programme(1)
+        programme.locations.append(Location(times=[Time(None, timedelta(hours=1))]))
+        self.assertEqual(dabepg.binary.encode_times([programme]), {})
+        
     def test_encode_shortform_utc(self):
         from dabepg.binary import encode_timepoint
         from datetime import datetime
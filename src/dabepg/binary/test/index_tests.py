@@ -0,0 +1,79 @@
+import unittest
+
+from dabepg import *
+from dabepg.binary import Element, Attribute, CData, marshall, encode_header, encode_contentid
+from dabepg.binary.index import build_index
+from dateutil.tz import tzutc
+import datetime
+import tempfile
+
+class ProgrammeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 0, 0, tzinfo=tzutc()))
+        for i in range(3):
+            programme = Programme(100 + i)
+            programme.names.append(MediumName('Programme %d' % i))
+            programme.names.append(LongName('Programme number %d' % i + ' with a long name' * i))
+            programme.locations.append(Location(times=[Time(datetime.datetime(2011, 7, 27, 12 + i, 0, 0, tzinfo=tzutc()), datetime.timedelta(hours=1))],
+                                                bearers=[Bearer('e1.ce15.c22%d.0' % i)]))
+            schedule.programmes.append(programme)
+        self.data = marshall(Epg(schedule))
+
+    def test_build_index(self):
+        index = build_index(self.data)
+        self.assertEqual([x.shortcrid for x in index], [100, 101, 102])
+        entry = index.get_entry(101)
+        self.assertEqual(ord(self.data[entry.start]), 0x1c)
+        self.assertEqual(entry.time, None)
+
+        entry = build_index(self.data, locations=True).get_entry(102)
+        self.assertEqual(entry.time, datetime.datetime(2011, 7, 27, 14, 0, 0, tzinfo=tzutc()))
+        self.assertEqual(str(entry.bearer), 'e1.ce15.c222.0')
+
+    def test_get_programme(self):
+        f = tempfile.TemporaryFile()
+        f.write(self.data)
+        f.flush()
+        with build_index(f) as index:
+            programme = index.get_programme(101)
+            self.assertEqual(programme.shortcrid, 101)
+            self.assertEqual(str(programme.names[0]), 'Programme 1')
+            self.assertEqual(str(programme.locations[0].bearers[0]), 'e1.ce15.c221.0')
+            self.assertEqual(index.get_programme(999), None)
+        self.assertRaises(ValueError, index.get_programme, 101)
+        index.close()
+        f.close()
+
+    def test_default_contentid(self):
+        # programme without a bearer, relying on the schedule default content ID
+        programme = Element(0x1c, [Attribute(0x81, 101, 24)])
+        programme.children.append(Element(0x11, cdata=CData('Programme 1')))
+        programme.children.append(Element(0x19, children=[Element(0x2c, [Attribute(0x80, datetime.datetime(2011, 7, 27, 13, 0, tzinfo=tzutc())),
+                                                                          Attribute(0x81, datetime.timedelta(hours=1))])]))
+        contentid = encode_contentid(ContentId.fromstring('e1.ce15.c2ff.0')).tobytes()
+        schedule = encode_header(0x05, len(contentid)) + contentid + programme.tobytes().tobytes()
+        schedule = encode_header(0x21, len(schedule)) + schedule
+        data = encode_header(0x02, len(schedule)) + schedule
+
+        index = build_index(data, locations=True)
+        self.assertEqual(str(index.get_entry(101).bearer), 'e1.ce15.c2ff.0')
+        self.assertEqual(str(index.get_programme(101).locations[0].bearers[0]), 'e1.ce15.c2ff.0')
+
+    def test_schedules(self):
+        # each programme is decoded with the defaults of its own schedule
+        data = ''
+        for i in range(2):
+            programme = Element(0x1c, [Attribute(0x81, 101 + i, 24)])
+            programme.children.append(Element(0x19, children=[Element(0x2c, [Attribute(0x80, datetime.datetime(2011, 7, 27, 13, 0, tzinfo=tzutc())),
+                                                                              Attribute(0x81, datetime.timedelta(hours=1))])]))
+            contentid = encode_contentid(ContentId.fromstring('e1.ce15.c2f%d.0' % i)).tobytes()
+            schedule = encode_header(0x05, len(contentid)) + contentid + programme.tobytes().tobytes()
+            data += encode_header(0x21, len(schedule)) + schedule
+        data = encode_header(0x02, len(data)) + data
+
+        index = build_index(data)
+        self.assertEqual([str(index.get_programme(x).locations[0].bearers[0]) for x in (101, 102)], ['e1.ce15.c2f0.0', 'e1.ce15.c2f1.0'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""On-disk cache of parsed PI and SI files, so that unchanged files are restored
+rather than parsed again"""
+
+from dabepg import snapshot
+import hashlib
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger('dabepg.cache')
+
+# bump whenever the object model changes shape, so that entries written by an
+# older version are parsed again rather than restored
+FORMAT_VERSION = 2
+
+MAGIC = 'dabepg-cache'
+SUFFIX = '.cache'
+
+HASH = 'hash'
+STAT = 'stat'
+
+class ParseCache:
+    """Keeps the :class:Epg or :class:ServiceInfo parsed from each file in a
+    directory, restoring it while the file is unchanged.
+
+    A file is recognised either by the SHA-1 hash of its contents (``hash``,
+    the default), or by its path, size and modification time (``stat``), which
+    does not read the file at all on a hit. Entries are written as snapshots
+    (see :mod:dabepg.snapshot) under a header holding :data:FORMAT_VERSION,
+    and an entry of another version is discarded and the file parsed again.
+
+    The total size of the entries is held under a bound by removing the least
+    recently used, going by the modification time of each entry, which is
+    touched when it is read. Several processes may share a directory, as
+    entries are written to a temporary file and renamed into place.
+
+    :param directory: directory to keep the entries in, created if missing
+    :type directory: str
+    :param max_size: most bytes of entries to keep
+    :type max_size: int
+    :param check: how a file is recognised, ``hash`` or ``stat``
+    :type check: str
+    """
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024, check=HASH):
+        if check not in (HASH, STAT): raise ValueError('unknown check: %s' % check)
+        if not os.path.isdir(directory): os.makedirs(directory)
+        self.directory = directory
+        self.max_size = max_size
+        self.check = check
+        self.hits = 0
+        self.misses = 0
+
+    def unmarshall(self, path, unmarshall):
+        """Returns the object parsed from a file, from the cache where the file
+        is unchanged, otherwise parsed and stored
+
+        :param path: path of the file
+        :type path: str
+        :param unmarshall: function parsing the file, such as
+        :func:dabepg.xml.unmarshall or :func:dabepg.binary.unmarshall
+        :type unmarshall: function
+        """
+
+        parser = '%s.%s' % (unmarshall.__module__, unmarshall.__name__)
+        if self.check == STAT:
+            stat = os.stat(path)
+            key = get_key(parser, os.path.abspath(path), str(stat.st_size), repr(stat.st_mtime))
+            data = path
+        else:
+            f = open(path, 'rb')
+            try: data = f.read()
+            finally: f.close()
+            key = get_key(parser, data)
+
+        obj = self.get(key)
+        if obj is not None:
+            self.hits += 1
+            logger.debug('restored %s from cache entry %s', path, key)
+            return obj
+
+        self.misses += 1
+        obj = unmarshall(data)
+        self.put(key, obj)
+        logger.debug('parsed %s into cache entry %s', path, key)
+        return obj
+
+    def xml(self, path):
+        """Returns the object parsed from an XML file"""
+
+        from dabepg.xml import unmarshall
+        return self.unmarshall(path, unmarshall)
+
+    def binary(self, path):
+        """Returns the object parsed from a binary file"""
+
+        from dabepg.binary import unmarshall
+        return self.unmarshall(path, unmarshall)
+
+    def get(self, key):
+        """Returns the object stored under a key, or None"""
+
+        path = self.get_path(key)
+        try: f = open(path, 'rb')
+        except IOError: return None
+        try:
+            try:
+                if f.readline() != '%s %d\n' % (MAGIC, FORMAT_VERSION):
+                    logger.debug('discarding cache entry of another version: %s', key)
+                    obj = None
+                else:
+                    obj = snapshot.unmarshall(f.read())
+            except Exception, e:
+                logger.warning('discarding unreadable cache entry %s: %s', key, e)
+                obj = None
+        finally:
+            f.close()
+        if obj is None:
+            self.discard(path)
+            return None
+        try: os.utime(path, None)
+        except OSError: pass
+        return obj
+
+    def put(self, key, obj):
+        """Stores an object under a key, then evicts entries over the bound"""
+
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write('%s %d\n' % (MAGIC, FORMAT_VERSION))
+                f.write(snapshot.marshall(obj))
+            finally:
+                f.close()
+            os.rename(temp, self.get_path(key))
+        except:
+            self.discard(temp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the entries fit in
+        the bound"""
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX): continue
+            path = os.path.join(self.directory, name)
+            try: stat = os.stat(path)
+            except OSError: continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+            total += stat.st_size
+        if total <= self.max_size: return
+        entries.sort()
+        for mtime, name, size in entries:
+            if total <= self.max_size: break
+            self.discard(os.path.join(self.directory, name))
+            total -= size
+            logger.debug('evicted cache entry %s of %d bytes', name, size)
+
+    def clear(self):
+        """Removes every entry"""
+
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX): self.discard(os.path.join(self.directory, name))
+
+    def discard(self, path):
+        try: os.remove(path)
+        except OSError: pass
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def __repr__(self):
+        return '<ParseCache: %s, %d hits, %d misses>' % (self.directory, self.hits, self.misses)
+
+def get_key(*parts):
+    """Returns the hex SHA-1 digest of some strings"""
+
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(len(part)))
+        digest.update(':')
+        digest.update(part)
+    return digest.hexdigest()
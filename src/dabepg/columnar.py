@@ -0,0 +1,470 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Column oriented schedule storage, keeping the key fields of each programme
+in typed arrays and its names and descriptions in string pools.
+
+A :class:ColumnarSchedule can stand in for a :class:Schedule wherever one is
+read, including as the schedule of an :class:Epg passed to either marshaller.
+Bulk operations such as :meth:ColumnarSchedule.shift and
+:meth:ColumnarSchedule.filter_service work on whole columns at a time, using
+NumPy when it is installed."""
+
+from dabepg import Schedule, Scope, Programme, Location, Time, ContentId, \
+    ShortName, MediumName, LongName, ShortDescription, LongDescription, tz, now, to_seconds
+from array import array
+import calendar
+import datetime
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger('dabepg.columnar')
+
+# programme flags
+ONAIR = 0x01
+RECOMMENDATION = 0x02
+TIMED = 0x04
+
+# offset column value for times without a timezone
+NAIVE = -0x8000
+
+NAME_TYPES = (ShortName, MediumName, LongName)
+DESCRIPTION_TYPES = (ShortDescription, LongDescription)
+
+# column name, array typecode, value for None
+COLUMNS = (('shortcrid', 'l', -1),
+           ('crid', 'l', -1),
+           ('version', 'l', -1),
+           ('bitrate', 'l', -1),
+           ('flags', 'B', 0),
+           ('start', 'l', 0),
+           ('duration', 'l', -1),
+           ('offset', 'h', NAIVE),
+           ('bearer', 'l', -1),
+           ('short_name', 'l', -1),
+           ('medium_name', 'l', -1),
+           ('long_name', 'l', -1),
+           ('short_description', 'l', -1),
+           ('long_description', 'l', -1))
+
+class StringPool:
+    """Append-only pool of distinct values, each stored once and referred to by
+    its index"""
+
+    def __init__(self):
+        self.values = []
+        self.indices = {}
+
+    def add(self, value):
+        """Returns the index of a value, adding it to the pool if it is new"""
+        if value is None: return -1
+        key = self.key(value)
+        index = self.indices.get(key)
+        if index is None:
+            index = self.indices[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def find(self, value):
+        """Returns the index of a value, or -1 if it is not in the pool"""
+        return self.indices.get(self.key(value), -1)
+
+    def get(self, index):
+        if index < 0: return None
+        return self.values[index]
+
+    def key(self, value):
+        return value
+
+    def __len__(self):
+        return len(self.values)
+
+class ContentIdPool(StringPool):
+    """Pool of content IDs, keyed by their string form"""
+
+    def key(self, value):
+        return str(value)
+
+class ProgrammeSequence:
+    """Read-only sequence of the programmes of a :class:ColumnarSchedule,
+    built as they are iterated over"""
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+
+    def __len__(self):
+        return len(self.schedule)
+
+    def __getitem__(self, index):
+        return self.schedule[index]
+
+    def __iter__(self):
+        for i in xrange(len(self.schedule)):
+            yield self.schedule.get_programme(i)
+
+class ColumnarSchedule:
+    """Schedule held as one row per programme across a set of typed columns.
+
+    The columns hold the scalar fields of each programme, its first absolute
+    time and first bearer, and pool indices for its crid and its names and
+    descriptions. Anything else (further times and locations, genres, events
+    and so on) is kept in a sparse residual :class:Programme for that row, so
+    that programmes survive the round trip unchanged.
+
+    Programmes read from the schedule are views built on demand: they share
+    their child objects with the schedule, but changes to them are only
+    stored by assigning them back with ``schedule[i] = programme``.
+
+    Times are stored to the second.
+
+    :param created: creation time of the schedule
+    :type created: datetime
+    :param version: schedule version
+    :type version: int
+    :param originator: schedule originator
+    :type originator: str
+    """
+
+    def __init__(self, created=None, version=1, originator=None):
+        self.created = created if created is not None else now()
+        self.version = version
+        self.originator = originator
+        self.columns = dict([(name, array(typecode)) for name, typecode, default in COLUMNS])
+        self.crids = StringPool()
+        self.texts = StringPool()
+        self.bearers = ContentIdPool()
+        self.residuals = {}
+
+    @classmethod
+    def fromschedule(cls, schedule):
+        """Builds a columnar copy of a :class:Schedule"""
+        columnar = cls(schedule.created, schedule.version, schedule.originator)
+        columnar.extend(schedule.programmes)
+        return columnar
+
+    def toschedule(self):
+        """Returns the programmes as a :class:Schedule"""
+        schedule = Schedule(self.created, self.version, self.originator)
+        schedule.programmes.extend(self.programmes)
+        return schedule
+
+    def get_programmes(self):
+        return ProgrammeSequence(self)
+
+    programmes = property(get_programmes)
+
+    def append(self, programme):
+        """Adds a programme as a new row"""
+        row = self.decompose(programme)
+        for name, typecode, default in COLUMNS:
+            self.columns[name].append(row.get(name, default))
+        if row.has_key('residual'): self.residuals[len(self.columns['shortcrid']) - 1] = row['residual']
+
+    def extend(self, programmes):
+        for programme in programmes: self.append(programme)
+
+    def get_programme(self, i):
+        """Builds the programme of a row"""
+
+        flags = self.columns['flags'][i]
+        programme = Programme(self.columns['shortcrid'][i], crid=self.crids.get(self.columns['crid'][i]),
+                              bitrate=self.columns['bitrate'][i] if self.columns['bitrate'][i] >= 0 else None,
+                              onair=bool(flags & ONAIR), recommendation=bool(flags & RECOMMENDATION),
+                              version=self.columns['version'][i] if self.columns['version'][i] >= 0 else None)
+
+        residual = self.residuals.get(i)
+        if residual is not None:
+            for name in ('names', 'locations', 'media', 'genres', 'keywords', 'memberships', 'links', 'events'):
+                values = getattr(residual, name)
+                if len(values): setattr(programme, name, list(values))
+
+        for name, type in zip(('short_name', 'medium_name', 'long_name'), NAME_TYPES):
+            text = self.texts.get(self.columns[name][i])
+            if text is not None: programme.names.append(type(text))
+        for name, type in zip(('short_description', 'long_description'), DESCRIPTION_TYPES):
+            text = self.texts.get(self.columns[name][i])
+            if text is not None: programme.media.append(type(text))
+
+        bearer = self.columns['bearer'][i]
+        if flags & TIMED or bearer >= 0:
+            if len(programme.locations):
+                first = programme.locations[0]
+                location = Location()
+                location.times = list(first.times)
+                location.bearers = list(first.bearers)
+                programme.locations[0] = location
+            else:
+                location = Location()
+                programme.locations.append(location)
+            if flags & TIMED:
+                location.times.insert(0, Time(self.get_datetime(i), datetime.timedelta(seconds=self.columns['duration'][i])))
+            if bearer >= 0:
+                location.bearers.insert(0, self.bearers.get(bearer))
+
+        return programme
+
+    def set_programme(self, i, programme):
+        """Replaces the programme of a row"""
+        row = self.decompose(programme)
+        for name, typecode, default in COLUMNS:
+            self.columns[name][i] = row.get(name, default)
+        if row.has_key('residual'): self.residuals[i] = row['residual']
+        elif self.residuals.has_key(i): del self.residuals[i]
+
+    def decompose(self, programme):
+        """Splits a programme into its column values and a residual programme
+        holding whatever the columns cannot"""
+
+        row = dict(shortcrid=int(programme.shortcrid), crid=self.crids.add(programme.crid))
+        if programme.version is not None: row['version'] = programme.version
+        if programme.bitrate is not None: row['bitrate'] = int(programme.bitrate)
+        row['flags'] = (ONAIR if programme.onair else 0) | (RECOMMENDATION if programme.recommendation else 0)
+        residual = Programme(programme.shortcrid)
+
+        # names and descriptions are pooled when there is at most one of each kind, in order of length
+        if is_pooled(programme.names, NAME_TYPES):
+            for name in programme.names:
+                row[('short_name', 'medium_name', 'long_name')[NAME_TYPES.index(type(name))]] = self.texts.add(name.text)
+        else: residual.names = list(programme.names)
+        if is_pooled(programme.media, DESCRIPTION_TYPES):
+            for media in programme.media:
+                row[('short_description', 'long_description')[DESCRIPTION_TYPES.index(type(media))]] = self.texts.add(media.text)
+        else: residual.media = list(programme.media)
+
+        # the first absolute time and the first content ID of the first location go into the columns
+        if len(programme.locations):
+            first = programme.locations[0]
+            location = Location()
+            location.times = list(first.times)
+            location.bearers = list(first.bearers)
+            if len(location.times) and type(location.times[0]) is Time and location.times[0].actual_time is None \
+                    and location.times[0].actual_duration is None:
+                time = location.times.pop(0)
+                row['flags'] |= TIMED
+                row['start'], row['offset'] = to_timestamp(time.billed_time)
+                row['duration'] = to_seconds(time.billed_duration)
+            if len(location.bearers) and type(location.bearers[0]) is ContentId:
+                row['bearer'] = self.bearers.add(location.bearers.pop(0))
+            if len(location.times) or len(location.bearers) or len(programme.locations) > 1 \
+                    or not (row['flags'] & TIMED or row.has_key('bearer')):
+                residual.locations = [location] + programme.locations[1:]
+
+        for name in ('genres', 'keywords', 'memberships', 'links', 'events'):
+            values = getattr(programme, name)
+            if len(values): setattr(residual, name, list(values))
+        if not is_empty(residual): row['residual'] = residual
+        return row
+
+    def get_datetime(self, i):
+        """Returns the start time of a row as a datetime"""
+        offset = self.columns['offset'][i]
+        if offset == NAIVE: return datetime.datetime.utcfromtimestamp(self.columns['start'][i])
+        return datetime.datetime.fromtimestamp(self.columns['start'][i], get_tzoffset(offset))
+
+    def shift(self, delta):
+        """Moves every programme by the given timedelta"""
+
+        seconds = to_seconds(delta)
+        start = get_view(self.columns['start'])
+        if start is not None: start += seconds
+        else: self.columns['start'] = array('l', [x + seconds for x in self.columns['start']])
+
+        # residual times may be shared with other schedules, so are replaced rather than changed
+        for residual in self.residuals.values():
+            if not len(residual.locations): continue
+            locations = []
+            for location in residual.locations:
+                shifted = Location()
+                shifted.bearers = list(location.bearers)
+                for time in location.times:
+                    if isinstance(time, Time):
+                        time = Time(time.billed_time + delta if time.billed_time is not None else None, time.billed_duration,
+                                    time.actual_time + delta if time.actual_time is not None else None, time.actual_duration)
+                    shifted.times.append(time)
+                locations.append(shifted)
+            residual.locations = locations
+
+    def select(self, rows):
+        """Returns a new schedule holding the given rows, in the given order. The
+        pools are shared with this schedule.
+
+        :param rows: row indices
+        :type rows: list, array
+        """
+
+        schedule = ColumnarSchedule(self.created, self.version, self.originator)
+        schedule.crids, schedule.texts, schedule.bearers = self.crids, self.texts, self.bearers
+        if numpy is not None:
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            for name, typecode, default in COLUMNS:
+                schedule.columns[name] = array(typecode, get_view(self.columns[name])[rows].tostring())
+        else:
+            for name, typecode, default in COLUMNS:
+                column = self.columns[name]
+                schedule.columns[name] = array(typecode, [column[i] for i in rows])
+        for i, row in enumerate(rows):
+            if self.residuals.has_key(row): schedule.residuals[i] = self.residuals[row]
+        return schedule
+
+    def filter_service(self, id):
+        """Returns the programmes located on the given service
+
+        :param id: service content ID
+        :type id: ContentId, str
+        """
+
+        index = self.bearers.find(id)
+        rows = set(find_rows(self.columns['bearer'], index)) if index >= 0 else set()
+        for row, residual in self.residuals.items():
+            for location in residual.locations:
+                if str(id) in [str(x) for x in location.bearers]: rows.add(row)
+        return self.select(sorted(rows))
+
+    def filter_time(self, start, end):
+        """Returns the programmes whose first time overlaps the given period
+
+        :param start: start of the period
+        :type start: datetime
+        :param end: end of the period
+        :type end: datetime
+        """
+
+        start, offset = to_timestamp(start)
+        end, offset = to_timestamp(end)
+        if numpy is not None and len(self):
+            starts = get_view(self.columns['start'])
+            mask = ((get_view(self.columns['flags']) & TIMED) != 0) & (starts < end) & (starts + get_view(self.columns['duration']) > start)
+            rows = numpy.flatnonzero(mask)
+        else:
+            rows = [i for i in xrange(len(self)) if self.columns['flags'][i] & TIMED and self.columns['start'][i] < end
+                    and self.columns['start'][i] + self.columns['duration'][i] > start]
+        return self.select(rows)
+
+    def get_scope(self, check=True):
+        """Returns the suggested scope of the schedule, as :meth:Schedule.get_scope.
+        It is always worked out from the columns, so there is nothing to check."""
+
+        start = end = None
+        if numpy is not None and len(self):
+            timed = numpy.flatnonzero(get_view(self.columns['flags']) & TIMED)
+            if len(timed):
+                starts = get_view(self.columns['start'])[timed]
+                ends = starts + get_view(self.columns['duration'])[timed]
+                first, last = timed[starts.argmin()], timed[ends.argmax()]
+                start = self.get_datetime(first)
+                end = self.get_datetime(last) + datetime.timedelta(seconds=self.columns['duration'][last])
+        else:
+            for i in xrange(len(self)):
+                if not self.columns['flags'][i] & TIMED: continue
+                if start is None or self.columns['start'][i] < to_timestamp(start)[0]: start = self.get_datetime(i)
+                if end is None or self.columns['start'][i] + self.columns['duration'][i] > to_timestamp(end)[0]:
+                    end = self.get_datetime(i) + datetime.timedelta(seconds=self.columns['duration'][i])
+
+        services = []
+        seen = set()
+        for i in xrange(len(self)):
+            ids = []
+            if self.columns['bearer'][i] >= 0: ids.append(self.bearers.get(self.columns['bearer'][i]))
+            residual = self.residuals.get(i)
+            if residual is not None:
+                for location in residual.locations:
+                    for time in location.times:
+                        if not isinstance(time, Time): continue
+                        if start is None or start > time.billed_time: start = time.billed_time
+                        if end is None or end < time.billed_time + time.billed_duration:
+                            end = time.billed_time + time.billed_duration
+                    for bearer in location.bearers:
+                        ids.append(bearer if isinstance(bearer, ContentId) else bearer.id)
+            for id in ids:
+                if str(id) not in seen:
+                    seen.add(str(id))
+                    services.append(id)
+
+        if start is None or end is None: return None
+        return Scope(start, end, services)
+
+    def __len__(self):
+        return len(self.columns['shortcrid'])
+
+    def __getitem__(self, i):
+        return self.get_programme(self.get_row(i))
+
+    def __setitem__(self, i, programme):
+        self.set_programme(self.get_row(i), programme)
+
+    def get_row(self, i):
+        if i < 0: i += len(self)
+        if i < 0 or i >= len(self): raise IndexError('row out of range: %d' % i)
+        return i
+
+    def __iter__(self):
+        return iter(self.programmes)
+
+    def __repr__(self):
+        return '<ColumnarSchedule: %d programmes>' % len(self)
+
+def is_pooled(values, types):
+    """Returns whether a list holds at most one of each of the given types, in
+    the order the types are given in"""
+    last = -1
+    for value in values:
+        if type(value) not in types: return False
+        index = types.index(type(value))
+        if index <= last: return False
+        last = index
+    return True
+
+def is_empty(programme):
+    for name in ('names', 'locations', 'media', 'genres', 'keywords', 'memberships', 'links', 'events'):
+        if len(getattr(programme, name)): return False
+    return True
+
+def to_timestamp(time):
+    """Returns the seconds since the epoch and the UTC offset in minutes of a
+    datetime, taking naive datetimes to be in UTC"""
+    offset = time.utcoffset()
+    if offset is None: return calendar.timegm(time.timetuple()), NAIVE
+    return calendar.timegm(time.utctimetuple()), to_seconds(offset) // 60
+
+tzoffsets = {}
+
+def get_tzoffset(minutes):
+    """Returns a shared timezone for a UTC offset"""
+    offset = tzoffsets.get(minutes)
+    if offset is None: offset = tzoffsets[minutes] = tz.tzoffset(None, minutes * 60)
+    return offset
+
+def get_view(column):
+    """Returns a NumPy array sharing the memory of a column, or None if NumPy is
+    not available"""
+    if numpy is None: return None
+    if not len(column): return numpy.zeros(0, dtype=column.typecode)
+    return numpy.frombuffer(column, dtype=column.typecode)
+
+def find_rows(column, value):
+    """Returns the indices of the rows of a column holding a value"""
+    if numpy is not None: return numpy.flatnonzero(get_view(column) == value).tolist()
+    return [i for i, x in enumerate(column) if x == value]
@@ -0,0 +1,251 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Registry of the TV-Anytime genres, looked up by href or by binary encoding"""
+
+from dabepg import Genre
+import logging
+import re
+import types
+
+logger = logging.getLogger('dabepg.genres')
+
+# binary values of the classification schemes
+SCHEMES = dict(
+    IntentionCS=1,
+    FormatCS=2,
+    ContentCS=3, # what happened to 4?!
+    OriginationCS=5,
+    ContentAlertCS=6,
+    MediaTypeCS=7,
+    AtmosphereCS=8
+)
+
+HREF_REGEX = re.compile(r'^urn:tva:metadata:cs:(\w+):(\d+):(\d+(?:\.\d+)*)$')
+
+class GenreNode(object):
+    """Node of a genre trie, holding the genre registered at its path, if any"""
+
+    __slots__ = ('key', 'parent', 'children', 'genre')
+
+    def __init__(self, key=None, parent=None):
+        self.key = key
+        self.parent = parent
+        self.children = {}
+        self.genre = None
+
+    def get_child(self, key, create=False):
+        child = self.children.get(key)
+        if child is None and create: child = self.children[key] = GenreNode(key, self)
+        return child
+
+    def walk(self):
+        """Yields the nodes below this one, depth first in key order"""
+        for key in sorted(self.children.keys()):
+            child = self.children[key]
+            yield child
+            for node in child.walk(): yield node
+
+class GenreRegistry:
+    """Holds one shared :class:Genre for each href, in two tries: one by scheme
+    and level path (``ContentCS``, ``2009``, ``3``, ``6``, ``1``), which answers
+    ancestor and descendant queries, and one by the bytes of the binary
+    encoding, which is worked out once when a genre is registered.
+
+    Where hrefs of different scheme years share a binary encoding, it decodes
+    to the first registered. Encodings of genres it does not hold decode to
+    the year of the first genre registered in their scheme, or failing that of
+    the first genre registered at all.
+    """
+
+    def __init__(self):
+        self.hrefs = {}
+        self.nodes = {}
+        self.encodings = {}
+        self.years = {}
+        self.year = None
+        self.root = GenreNode()
+        self.binary_root = GenreNode()
+
+    def register(self, genre):
+        """Registers a genre, returning the shared instance for its href"""
+
+        shared = self.hrefs.get(genre.href)
+        if shared is not None: return shared
+        # the instance given is left as it is, and a frozen copy shared instead
+        if not getattr(genre, '_frozen', False): genre = genre.copy().freeze()
+        self.hrefs[genre.href] = genre
+
+        path = parse_href(genre.href)
+        if path is None:
+            logger.debug('genre href cannot be placed in the tries: %s', genre.href)
+            return genre
+        scheme, year, levels = path
+        self.years.setdefault(scheme, year)
+        if self.year is None: self.year = year
+        node = self.root.get_child(scheme, True).get_child(year, True)
+        for level in levels: node = node.get_child(level, True)
+        node.genre = genre
+        self.nodes[genre.href] = node
+
+        encoding = build_encoding(scheme, levels)
+        if encoding is not None:
+            self.encodings[genre.href] = encoding
+            node = self.binary_root
+            for byte in encoding: node = node.get_child(byte, True)
+            if node.genre is None: node.genre = genre
+        return genre
+
+    def register_module(self, module):
+        """Registers the genres held by a taxonomy module such as
+        :mod:dabepg.tva_genre_2009, whose nested classes are either groups,
+        genres in their own right, or both"""
+
+        for value in vars(module).values():
+            if isinstance(value, (type, types.ClassType)) and value.__module__ == module.__name__: self.register_class(value)
+
+    def register_class(self, cls):
+        # the genres of a taxonomy module are shared as they are
+        if isinstance(cls, type) and issubclass(cls, Genre): self.register(cls().freeze())
+        for name, value in sorted(vars(cls).items()):
+            if name.startswith('_'): continue
+            if isinstance(value, Genre): self.register(value.freeze())
+            elif isinstance(value, (type, types.ClassType)): self.register_class(value)
+
+    def get(self, href):
+        """Returns the shared genre for an href, or None"""
+        return self.hrefs.get(href)
+
+    def get_encoding(self, genre):
+        """Returns the binary encoding of a genre as a byte string, from the
+        registry where it is known"""
+
+        encoding = self.encodings.get(genre.href)
+        if encoding is not None: return encoding
+        path = parse_href(genre.href)
+        if path is None: raise ValueError('genre is incorrectly formatted: %s' % genre)
+        encoding = build_encoding(path[0], path[2])
+        if encoding is None: raise ValueError('unknown CS in genre: %s' % genre)
+        return encoding
+
+    def decode(self, encoding):
+        """Returns the genre registered for a binary encoding, or None"""
+
+        node = self.binary_root
+        for byte in encoding:
+            node = node.get_child(byte)
+            if node is None: return None
+        return node.genre
+
+    def get_href(self, encoding):
+        """Returns the href of a binary encoding, in the year the registry
+        decodes its scheme to"""
+
+        # b4-7: CS
+        cs = ord(encoding[0]) & 0x0f
+        schemes = [x for x, value in SCHEMES.items() if value == cs]
+        if not len(schemes): raise ValueError('unknown CS value for genre: %d' % cs)
+        year = self.years.get(schemes[0], self.year)
+        if year is None: raise ValueError('no genres registered to take the year of a %s genre from' % schemes[0])
+        return 'urn:tva:metadata:cs:%s:%d:%s' % (schemes[0], year, '.'.join(['%d' % ord(x) for x in encoding[1:]]))
+
+    def get_ancestors(self, genre):
+        """Returns the registered genres above a genre, nearest first. The genre
+        itself need not be registered."""
+
+        href = genre.href if isinstance(genre, Genre) else genre
+        node = self.nodes.get(href)
+        if node is not None:
+            node = node.parent
+        else:
+            # follow the path of an unknown genre as far as the trie goes
+            path = parse_href(href)
+            if path is None: return []
+            node = self.root.get_child(path[0])
+            for key in (path[1],) + path[2][:-1]:
+                if node is None: break
+                child = node.get_child(key)
+                if child is None: break
+                node = child
+        ancestors = []
+        while node is not None:
+            if node.genre is not None: ancestors.append(node.genre)
+            node = node.parent
+        return ancestors
+
+    def get_descendants(self, genre):
+        """Returns the registered genres below a genre, depth first"""
+
+        node = self.get_node(genre)
+        if node is None: return []
+        return [x.genre for x in node.walk() if x.genre is not None]
+
+    def is_ancestor(self, ancestor, genre):
+        """Returns whether a genre lies below another"""
+
+        ancestor = self.get_node(ancestor)
+        return ancestor is not None and ancestor.genre in self.get_ancestors(genre)
+
+    def get_node(self, genre):
+        href = genre.href if isinstance(genre, Genre) else genre
+        return self.nodes.get(href)
+
+    def __len__(self):
+        return len(self.hrefs)
+
+    def __repr__(self):
+        return '<GenreRegistry: %d genres>' % len(self)
+
+def parse_href(href):
+    """Returns the scheme, year and levels of a genre href, or None if it is not
+    of the TV-Anytime form"""
+
+    matcher = HREF_REGEX.match(href)
+    if not matcher: return None
+    return matcher.group(1), int(matcher.group(2)), tuple([int(x) for x in matcher.group(3).split('.')])
+
+def build_encoding(scheme, levels):
+    """Returns the binary encoding of a scheme and level path, as a byte string,
+    or None if the scheme has no binary value"""
+
+    if not SCHEMES.has_key(scheme): return None
+    for level in levels:
+        if level > 0xff: raise ValueError('genre level exceeds 8 bits: %d' % level)
+
+    # b0-3: RFU(0), b4-7: CS, then each level in 8 bits
+    return chr(SCHEMES[scheme]) + ''.join([chr(x) for x in levels])
+
+registry = None
+
+def get_registry():
+    """Returns the registry of the genres in :mod:dabepg.tva_genre_2009 and
+    :mod:dabepg.tva_genre_2005, building it on first use"""
+
+    global registry
+    if registry is None:
+        from dabepg import tva_genre_2005, tva_genre_2009
+        built = GenreRegistry()
+        built.register_module(tva_genre_2009)
+        built.register_module(tva_genre_2005)
+        logger.debug('built genre registry: %s', built)
+        registry = built
+    return registry
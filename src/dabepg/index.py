@@ -0,0 +1,288 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Indexes over the programmes of a :class:Schedule, kept up to date as
+programmes are added to and removed from it"""
+
+from dabepg import ScheduleListener, Bearer, Time, Genre
+from dabepg.genres import get_registry, parse_href, build_encoding
+import bisect
+import collections
+import datetime
+import logging
+
+logger = logging.getLogger('dabepg.index')
+
+class IntervalIndex(ScheduleListener):
+    """Index of the billed times of the programmes in a schedule, by service,
+    answering range, point and now/next queries with a binary search.
+
+    Each service holds its programme times sorted by start, along with the
+    longest duration it has held, which bounds how far back a search for
+    programmes overlapping a time has to look. Times of locations without
+    bearers are held under the service ``None``.
+
+    Results are lists of ``(start, end, programme)`` tuples in start order.
+
+    :param schedule: schedule to index
+    :type schedule: Schedule
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.services = {}
+        self.keys = {}
+        schedule.add_listener(self)
+
+    def close(self):
+        """Stops following the schedule"""
+        self.schedule.remove_listener(self)
+
+    def on_programme_added(self, programme):
+        # a programme may be in the schedule more than once, and the times of
+        # each copy are kept apart so that removing one leaves the others
+        keys = []
+        self.keys.setdefault(id(programme), []).append(keys)
+        for service, start, end in get_intervals(programme):
+            starts, entries, longest = self.services.get(service, ([], [], datetime.timedelta()))
+            i = bisect.bisect_right(starts, start)
+            starts.insert(i, start)
+            entries.insert(i, (start, end, programme))
+            self.services[service] = (starts, entries, max(longest, end - start))
+            keys.append((service, start))
+
+    def on_programme_removed(self, programme):
+        copies = self.keys.get(id(programme))
+        if not copies: return
+        keys = copies.pop()
+        if not copies: del self.keys[id(programme)]
+        for service, start in keys:
+            starts, entries, longest = self.services[service]
+            i = bisect.bisect_left(starts, start)
+            while entries[i][2] is not programme: i += 1
+            del starts[i]
+            del entries[i]
+
+    def get_range(self, service, start, end):
+        """Returns the programme times on a service that overlap a period
+
+        :param service: service ID, or None for locations without bearers
+        :type service: ContentId, str
+        :param start: start of the period
+        :type start: datetime
+        :param end: end of the period
+        :type end: datetime
+        """
+
+        starts, entries, longest = self.get_service(service)
+        i = bisect.bisect_right(starts, start - longest)
+        j = bisect.bisect_left(starts, end)
+        return [x for x in entries[i:j] if x[1] > start]
+
+    def get_at(self, service, time):
+        """Returns the programme times on a service that cover a point in time"""
+
+        starts, entries, longest = self.get_service(service)
+        i = bisect.bisect_right(starts, time - longest)
+        j = bisect.bisect_right(starts, time)
+        return [x for x in entries[i:j] if x[1] > time]
+
+    def get_now_next(self, service, time):
+        """Returns a tuple of the programme time on air on a service at a point
+        in time, and the one that follows it. Either may be None.
+
+        Where programmes overlap, the latest to have started is taken to be on
+        air, and the next is the first to start after the given time.
+        """
+
+        starts, entries, longest = self.get_service(service)
+        now = self.get_at(service, time)
+        j = bisect.bisect_right(starts, time)
+        return (now[-1] if len(now) else None, entries[j] if j < len(entries) else None)
+
+    def get_service(self, service):
+        if service is not None: service = str(service)
+        return self.services.get(service, ([], [], datetime.timedelta()))
+
+    def __getstate__(self):
+        # the keys are held by object identity, which does not survive pickling
+        state = self.__dict__.copy()
+        state['keys'] = [(x[2], self.keys[id(x[2])]) for x in self.get_entries()]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.keys = dict([(id(programme), keys) for programme, keys in state['keys']])
+
+    def get_entries(self):
+        """Returns the first entry of every indexed programme"""
+        entries = {}
+        for starts, service_entries, longest in self.services.values():
+            for entry in service_entries: entries.setdefault(id(entry[2]), entry)
+        return entries.values()
+
+    def __len__(self):
+        return sum([len(x[0]) for x in self.services.values()])
+
+    def __repr__(self):
+        return '<IntervalIndex: %d services, %d times>' % (len(self.services), len(self))
+
+class GenreIndex(ScheduleListener):
+    """Index of the programmes in a schedule by genre, in which each programme
+    is held under every node of the TV-Anytime hierarchy its genres lie in, so
+    that all the programmes in a subtree are found without a scan.
+
+    Nodes are keyed by classification scheme and level path, such as
+    ``('ContentCS', (3, 6))``, so that hrefs of different scheme years share
+    them. Genres whose hrefs are not of the TV-Anytime form are not indexed.
+
+    Programmes are returned in the order they were indexed.
+
+    :param schedule: schedule to index
+    :type schedule: Schedule
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.nodes = {}
+        self.hrefs = {}
+        self.keys = {}
+        schedule.add_listener(self)
+
+    def close(self):
+        """Stops following the schedule"""
+        self.schedule.remove_listener(self)
+
+    def on_programme_added(self, programme):
+        keys = []
+        for genre in programme.genres:
+            path = parse_href(genre.href)
+            if path is None: continue
+            scheme, year, levels = path
+            for i in range(1, len(levels) + 1):
+                key = (scheme, levels[:i])
+                if key in keys: continue
+                keys.append(key)
+                programmes = self.nodes.get(key)
+                if programmes is None: programmes = self.nodes[key] = collections.OrderedDict()
+                programmes[id(programme)] = programme
+                if not self.hrefs.has_key(key): self.hrefs[key] = 'urn:tva:metadata:cs:%s:%d:%s' % (scheme, year, '.'.join(map(str, levels[:i])))
+        # a programme may be in the schedule more than once, and stays under a
+        # node while any copy of it is
+        self.keys.setdefault(id(programme), []).append(keys)
+
+    def on_programme_removed(self, programme):
+        copies = self.keys.get(id(programme))
+        if not copies: return
+        keys = copies.pop()
+        if not copies: del self.keys[id(programme)]
+        for key in keys:
+            if [x for x in copies if key in x]: continue
+            programmes = self.nodes[key]
+            del programmes[id(programme)]
+            if not len(programmes):
+                del self.nodes[key]
+                del self.hrefs[key]
+
+    def get_programmes(self, genre):
+        """Returns the programmes carrying a genre or any genre below it
+
+        :param genre: genre, its href or its node key
+        :type genre: Genre, str, tuple
+        """
+
+        programmes = self.nodes.get(get_node_key(genre))
+        if programmes is None: return []
+        return programmes.values()
+
+    def count(self, genre):
+        """Returns the number of programmes carrying a genre or any genre below it"""
+
+        return len(self.nodes.get(get_node_key(genre), ()))
+
+    def get_subgenres(self, genre=None):
+        """Returns ``(genre, count)`` tuples for the indexed genres immediately
+        below a genre, or at the top of each scheme, in level order. Genres are
+        taken from the registry built from :mod:dabepg.tva_genre_2009 where they
+        are known there."""
+
+        if genre is None:
+            children = [x for x in self.nodes.keys() if len(x[1]) == 1]
+        else:
+            scheme, levels = get_node_key(genre)
+            children = [x for x in self.nodes.keys() if x[0] == scheme and len(x[1]) == len(levels) + 1 and x[1][:-1] == levels]
+        children.sort()
+
+        registry = get_registry()
+        result = []
+        for key in children:
+            encoding = build_encoding(key[0], key[1])
+            genre = registry.decode(encoding) if encoding is not None else None
+            if genre is None: genre = Genre(self.hrefs[key])
+            result.append((genre, len(self.nodes[key])))
+        return result
+
+    def __getstate__(self):
+        # the programmes are held by object identity, which does not survive pickling
+        state = self.__dict__.copy()
+        state['nodes'] = dict([(key, programmes.values()) for key, programmes in self.nodes.items()])
+        indexed = self.get_indexed()
+        state['keys'] = [(indexed[x], keys) for x, keys in self.keys.items() if indexed.has_key(x)]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.nodes = dict([(key, collections.OrderedDict([(id(x), x) for x in programmes])) for key, programmes in state['nodes'].items()])
+        self.keys = dict([(id(programme), keys) for programme, keys in state['keys']])
+
+    def get_indexed(self):
+        """Returns the indexed programmes by identity"""
+        programmes = {}
+        for node in self.nodes.values(): programmes.update(node)
+        return programmes
+
+    def __len__(self):
+        return len([x for x in self.keys.values() if len(x[-1])])
+
+    def __repr__(self):
+        return '<GenreIndex: %d nodes, %d programmes>' % (len(self.nodes), len(self))
+
+def get_node_key(genre):
+    """Returns the key of the node of a genre, given as a :class:Genre, an href or
+    a key"""
+
+    if isinstance(genre, tuple): return genre
+    href = genre.href if isinstance(genre, Genre) else genre
+    path = parse_href(href)
+    if path is None: raise ValueError('genre is not of the TV-Anytime form: %s' % href)
+    return path[0], path[2]
+
+def get_intervals(programme):
+    """Yields the service ID, start and end of every billed time of a programme,
+    for each of the bearers it is located on"""
+
+    for location in programme.locations:
+        services = [str(x.id if isinstance(x, Bearer) else x) for x in location.bearers] or [None]
+        for time in location.times:
+            if not isinstance(time, Time) or time.billed_time is None: continue
+            end = time.billed_time + time.billed_duration
+            for service in services: yield service, time.billed_time, end
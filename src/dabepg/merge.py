@@ -0,0 +1,266 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Merging of the schedules of several feeds into one, resolving overlapping
+programmes on each service by the priority of their feeds"""
+
+from dabepg import Schedule, Location, Time, Bearer
+import heapq
+import logging
+
+logger = logging.getLogger('dabepg.merge')
+
+TRIMMED = 'trimmed'
+SPLIT = 'split'
+DROPPED = 'dropped'
+
+class Conflict:
+    """A period of a service claimed by more than one programme, and how it was
+    resolved
+
+    :param service: service ID, or None for locations without bearers
+    :type service: str
+    :param start: start of the period
+    :type start: datetime
+    :param end: end of the period
+    :type end: datetime
+    :param kept: programme kept for the period
+    :type kept: Programme
+    :param displaced: programme displaced from the period
+    :type displaced: Programme
+    :param action: what became of the displaced programme's time on the service:
+    one of ``TRIMMED``, ``SPLIT`` or ``DROPPED``
+    :type action: str
+    """
+
+    def __init__(self, service, start, end, kept, displaced, action=None):
+        self.service = service
+        self.start = start
+        self.end = end
+        self.kept = kept
+        self.displaced = displaced
+        self.action = action
+
+    def __str__(self):
+        return '%s %s-%s: %s %s by %s' % (self.service, self.start, self.end, self.displaced, self.action, self.kept)
+
+    def __repr__(self):
+        return '<Conflict: %s>' % str(self)
+
+class Segment:
+    """A billed time of a programme on one service, and the pieces of it that
+    survive the merge"""
+
+    def __init__(self, key, service, start, end, programme, location, time):
+        self.key = key
+        self.service = service
+        self.start = start
+        self.end = end
+        self.programme = programme
+        self.location = location
+        self.time = time
+        self.pieces = []
+
+def merge(schedules, priorities=None, created=None, version=None, originator=None):
+    """Merges the schedules of several feeds into one.
+
+    Each service is swept in time order. Where programmes overlap, the one from
+    the feed with the highest priority keeps the overlapping period, and the
+    others are trimmed, split around it or dropped. Feeds of equal priority
+    take precedence in the order they are given. Programmes are only copied
+    when their times change; programme events are left as they are. Times of
+    no duration claim no period, and are kept as they are. Programmes without
+    billed times follow those with them.
+
+    Returns a tuple of the merged :class:Schedule and the list of
+    :class:Conflict resolved, in service and time order.
+
+    :param schedules: schedules to merge
+    :type schedules: list
+    :param priorities: priority of each schedule, highest first, defaulting to
+    the order of the schedules
+    :type priorities: list
+    :param created: creation time of the merged schedule, defaulting to that of
+    the first schedule
+    :type created: datetime
+    """
+
+    if priorities is None: priorities = range(len(schedules), 0, -1)
+    if len(priorities) != len(schedules): raise ValueError('there must be one priority for each schedule')
+    first = schedules[0] if len(schedules) else Schedule()
+
+    # collect the segments of every programme, by service
+    services = {}
+    programmes = []
+    segments = {}
+    for feed, (schedule, priority) in enumerate(zip(schedules, priorities)):
+        for programme in schedule.programmes:
+            programme_segments = segments[id(programme)] = []
+            programmes.append(programme)
+            for location in programme.locations:
+                ids = [str(x.id if isinstance(x, Bearer) else x) for x in location.bearers] or [None]
+                for time in location.times:
+                    if not isinstance(time, Time) or time.billed_time is None: continue
+                    for service in ids:
+                        # ordered by priority, then feed, then position in the feed
+                        segment = Segment((-priority, feed, len(programmes), len(programme_segments)), service, time.billed_time,
+                                          time.billed_time + time.billed_duration, programme, location, time)
+                        programme_segments.append(segment)
+                        if segment.start < segment.end: services.setdefault(service, []).append(segment)
+                        else: segment.pieces.append((segment.start, segment.end))
+
+    conflicts = []
+    for service in sorted(services.keys()):
+        conflicts.extend(sweep(service, services[service]))
+
+    # rebuild the programmes whose times have changed
+    merged = Schedule(created if created is not None else first.created,
+                      version if version is not None else first.version,
+                      originator if originator is not None else first.originator)
+    results = []
+    for i, programme in enumerate(programmes):
+        programme_segments = segments[id(programme)]
+        if all([x.pieces == [(x.start, x.end)] for x in programme_segments]):
+            result = programme
+        else:
+            result = rebuild(programme, programme_segments)
+            if result is None: continue
+        start = min([x.pieces[0][0] for x in programme_segments if len(x.pieces)] or [None])
+        results.append((start, i, result))
+    results.sort(key=lambda x: (x[0] is None, x[0], x[1]))
+    merged.programmes.extend([x[2] for x in results])
+
+    logger.debug('merged %d programmes from %d schedules into %d, resolving %d conflicts',
+                 len(programmes), len(schedules), len(merged.programmes), len(conflicts))
+    return merged, conflicts
+
+def sweep(service, segments):
+    """Sweeps the segments of a service in time order, giving each period to the
+    segment with the highest priority and recording the periods of the others
+    as conflicts. Segments are kept in a heap by priority and in a heap by end,
+    so each is added and expired in logarithmic time."""
+
+    boundaries = sorted(set([x.start for x in segments] + [x.end for x in segments]))
+    segments = sorted(segments, key=lambda x: x.start)
+    heap = []
+    ends = []
+    active = {}
+    conflicts = []
+    open_conflicts = {}
+    i = 0
+    for start, end in zip(boundaries, boundaries[1:]):
+        while i < len(segments) and segments[i].start <= start:
+            heapq.heappush(heap, (segments[i].key, segments[i]))
+            heapq.heappush(ends, (segments[i].end, segments[i].key))
+            active[segments[i].key] = segments[i]
+            i += 1
+        while len(ends) and ends[0][0] <= start: del active[heapq.heappop(ends)[1]]
+        while len(heap) and heap[0][0] not in active: heapq.heappop(heap)
+        if not len(heap): continue
+
+        winner = heap[0][1]
+        if len(winner.pieces) and winner.pieces[-1][1] == start:
+            winner.pieces[-1] = (winner.pieces[-1][0], end)
+        else:
+            winner.pieces.append((start, end))
+
+        for key, segment in active.items():
+            if segment is winner: continue
+            conflict = open_conflicts.get((winner.key, key))
+            if conflict is not None and conflict.end == start:
+                conflict.end = end
+            else:
+                conflict = open_conflicts[(winner.key, key)] = Conflict(service, start, end, winner.programme, segment.programme)
+                conflict.segment = segment
+                conflicts.append(conflict)
+
+    for conflict in conflicts:
+        pieces = conflict.segment.pieces
+        if not len(pieces): conflict.action = DROPPED
+        elif len(pieces) > 1: conflict.action = SPLIT
+        else: conflict.action = TRIMMED
+        del conflict.segment
+    conflicts.sort(key=lambda x: x.start)
+    return conflicts
+
+def rebuild(programme, segments):
+    """Returns a copy of a programme located at the surviving pieces of its
+    segments, or None if nothing of it survives"""
+
+    locations = []
+    timed = set([id(x.location) for x in segments])
+    for location in programme.locations:
+        if id(location) not in timed: locations.append(location)
+
+    # group the services of each location by the pieces they keep, so that
+    # services sharing the same times stay in one location
+    for location in programme.locations:
+        if id(location) not in timed: continue
+        pieces = {}
+        order = []
+        times = {}
+        for segment in [x for x in segments if x.location is location]:
+            for start, end in segment.pieces:
+                if not pieces.has_key((start, end)):
+                    pieces[(start, end)] = []
+                    order.append((start, end))
+                    times[(start, end)] = segment.time
+                bearers = [x for x in location.bearers if str(x.id if isinstance(x, Bearer) else x) == segment.service]
+                for bearer in bearers:
+                    if bearer not in pieces[(start, end)]: pieces[(start, end)].append(bearer)
+        groups = {}
+        group_order = []
+        for start, end in order:
+            key = tuple([id(x) for x in pieces[(start, end)]])
+            if not groups.has_key(key):
+                groups[key] = []
+                group_order.append(key)
+            groups[key].append((start, end))
+        # times that cannot be placed, such as relative ones, go with every group
+        unplaced = [x for x in location.times if not isinstance(x, Time) or x.billed_time is None]
+        for key in group_order:
+            rebuilt = Location()
+            rebuilt.bearers = list([x for x in location.bearers if id(x) in key])
+            rebuilt.times = [clip(times[(start, end)], start, end) for start, end in groups[key]] + unplaced
+            locations.append(rebuilt)
+
+    if not len([x for x in segments if len(x.pieces)]): return None
+    result = programme.copy()
+    result.locations = locations
+    return result
+
+def clip(time, start, end):
+    """Returns a copy of a time billed for a piece of its period. Its actual
+    time and duration are cut at the ends of the piece that were cut from the
+    billed period, so an actual time running over the billed end is kept."""
+
+    billed_start, billed_end = time.billed_time, time.billed_time + time.billed_duration
+    actual_time, actual_duration = time.actual_time, time.actual_duration
+    if actual_time is not None:
+        actual_end = actual_time + (actual_duration if actual_duration is not None else time.billed_duration)
+        if start != billed_start: actual_time = max(actual_time, start)
+        if end != billed_end: actual_end = min(actual_end, end)
+        if actual_time >= actual_end: actual_time = actual_duration = None
+        elif actual_duration is not None: actual_duration = actual_end - actual_time
+    elif actual_duration is not None and (start, end) != (billed_start, billed_end):
+        actual_duration = min(actual_duration, end - start)
+    return Time(start, end - start, actual_time, actual_duration)
@@ -0,0 +1,118 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Partitioning of a multiplex schedule into the daily programme information
+documents of each service"""
+
+from dabepg import Epg, Schedule, Location, Bearer, ContentId, Time
+from dabepg.xml import get_schedule_filename
+import datetime
+import logging
+
+logger = logging.getLogger('dabepg.partition')
+
+def partition(schedule, tz=None):
+    """Splits a schedule into one :class:Epg for each service and local day,
+    in a single pass over its programmes.
+
+    A programme is placed in the document of every service it is located on,
+    for every day its billed times touch, so programmes spanning midnight
+    appear on both days. Each document holds copies of its programmes, in their
+    order, located only at the bearers of its service and the times touching
+    its day, so that the scope of the document is its own. Their names, genres
+    and so on are held in lists of their own, of the same elements. Locations
+    without bearers cannot be placed and are left out.
+
+    Yields ``(filename, Epg)`` tuples in order of day and filename, with the
+    filename given by :func:dabepg.xml.get_schedule_filename.
+
+    :param schedule: schedule to split
+    :type schedule: Schedule
+    :param tz: timezone whose days the schedule is split into, defaulting to
+    that each billed time is given in
+    :type tz: tzinfo
+    """
+
+    buckets = {}
+    for programme in schedule.programmes:
+        for location in programme.locations:
+            services = []
+            for bearer in location.bearers:
+                service = get_service(bearer)
+                if service not in services: services.append(service)
+            for time in location.times:
+                if not isinstance(time, Time) or time.billed_time is None: continue
+                for day in get_days(time.billed_time, time.billed_duration, tz):
+                    for service in services:
+                        bucket = buckets.get((day, service))
+                        if bucket is None: bucket = buckets[(day, service)] = []
+                        # the programme is placed in one go, so a repeat is always the last entry
+                        if not len(bucket) or bucket[-1][0] is not programme: bucket.append((programme, []))
+                        bucket[-1][1].append((location, time))
+
+    documents = []
+    for (day, service), programmes in buckets.items():
+        documents.append((day, get_schedule_filename(day, service), service, programmes))
+    documents.sort(key=lambda x: x[:2])
+    logger.debug('partitioned %d programmes into %d documents', len(schedule.programmes), len(documents))
+
+    for day, filename, service, programmes in documents:
+        day_schedule = Schedule(schedule.created, schedule.version, schedule.originator)
+        day_schedule.programmes.extend([restrict(programme, service, placements) for programme, placements in programmes])
+        yield filename, Epg(day_schedule)
+
+def restrict(programme, service, placements):
+    """Returns a copy of a programme located only at the bearers of a service,
+    at the times given with their locations in ``placements``"""
+
+    locations = []
+    last = None
+    for location, time in placements:
+        if location is not last:
+            locations.append(Location())
+            locations[-1].bearers = [x for x in location.bearers if get_service(x) == service]
+            last = location
+        locations[-1].times.append(time)
+    programme = programme.copy()
+    programme.locations = locations
+    return programme
+
+def get_service(bearer):
+    """Returns the content ID of a bearer"""
+
+    if isinstance(bearer, Bearer): bearer = bearer.id
+    if not isinstance(bearer, ContentId): bearer = ContentId.fromstring(str(bearer))
+    return bearer
+
+def get_days(start, duration, tz=None):
+    """Returns the local dates a period touches. A period ending at midnight
+    does not touch the day after."""
+
+    if tz is not None and start.tzinfo is not None: start = start.astimezone(tz)
+    end = start + duration
+    if end > start: end -= datetime.timedelta(microseconds=1)
+    day, last = start.date(), end.date()
+    days = [day]
+    while day < last:
+        day += datetime.timedelta(days=1)
+        days.append(day)
+    return days
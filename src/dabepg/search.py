@@ -0,0 +1,261 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Full text search over the names, descriptions and keywords of the programmes
+of a schedule"""
+
+from dabepg import ScheduleListener, ShortName, MediumName, LongName, ShortDescription, LongDescription
+import bisect
+import heapq
+import logging
+import re
+
+logger = logging.getLogger('dabepg.search')
+
+TOKEN_REGEX = re.compile(r'\w+', re.UNICODE)
+
+# weight of a match in each field, names ranking over descriptions
+KEYWORDS = 'keywords'
+WEIGHTS = {
+    LongName : 6,
+    MediumName : 5,
+    ShortName : 4,
+    KEYWORDS : 3,
+    ShortDescription : 2,
+    LongDescription : 1
+}
+
+class SearchIndex(ScheduleListener):
+    """Inverted index of the words in the names, descriptions and keywords of
+    the programmes in a schedule, kept up to date as programmes are added,
+    removed and passed to :meth:Schedule.update.
+
+    Each word maps to the programmes containing it, with the weight of the
+    best field it appears in, and to the programmes of each weight in the order
+    they were indexed, from which the best matches of a single word are read
+    without scoring the rest. A sorted vocabulary answers prefix queries.
+
+    :param schedule: schedule to index
+    :type schedule: Schedule
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.postings = {}
+        self.ranked = {}
+        self.vocabulary = []
+        self.programmes = {}
+        self.tokens = {}
+        self.order = {}
+        self.keys = {}
+        self.references = {}
+        self.count = 0
+        schedule.add_listener(self)
+
+    def close(self):
+        """Stops following the schedule"""
+        self.schedule.remove_listener(self)
+
+    def on_programme_added(self, programme):
+        # a programme may be in the schedule more than once, and is indexed
+        # while any copy remains; another copy, as from :meth:Schedule.update,
+        # indexes it again as it is now
+        key = id(programme)
+        references = self.references.get(key, 0)
+        self.references[key] = references + 1
+        self.programmes[key] = programme
+        if references: self.unindex(key)
+        weights = get_weights(programme)
+        if not len(weights): return
+        self.tokens[key] = weights.keys()
+        order = self.order[key] = self.count
+        self.keys[order] = key
+        self.count += 1
+        for token, weight in weights.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                self.ranked[token] = {}
+                bisect.insort(self.vocabulary, token)
+            postings[key] = weight
+            self.ranked[token].setdefault(weight, []).append(order)
+
+    def on_programme_removed(self, programme):
+        key = id(programme)
+        references = self.references.get(key)
+        if not references: return
+        if references > 1:
+            self.references[key] = references - 1
+            return
+        del self.references[key], self.programmes[key]
+        self.unindex(key)
+
+    def unindex(self, key):
+        """Removes the words of a programme from the index"""
+
+        order = self.order.pop(key, None)
+        if order is None: return
+        for token in self.tokens.pop(key):
+            postings = self.postings[token]
+            ranked = self.ranked[token]
+            orders = ranked[postings.pop(key)]
+            del orders[bisect.bisect_left(orders, order)]
+            if not len(postings):
+                del self.postings[token]
+                del self.ranked[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        del self.keys[order]
+
+    def search(self, query, limit=None, prefix=True):
+        """Returns the programmes containing every word of a query, best match
+        first. A programme scores the sum of the weights of the fields each word
+        is found in; equal scores keep the order the programmes were indexed in.
+
+        :param query: words to search for
+        :type query: str
+        :param limit: most programmes to return
+        :type limit: int
+        :param prefix: whether the last word of the query may be the start of a
+        longer word, as while it is being typed
+        :type prefix: bool
+        """
+
+        return [self.programmes[x[2]] for x in self.get_matches(query, limit, prefix)]
+
+    def get_matches(self, query, limit=None, prefix=True):
+        """Returns ``(score, order, key)`` tuples of the programmes matching a
+        query, best match first"""
+
+        tokens = tokenize(query)
+        if not len(tokens): return []
+        if len(tokens) == 1 and limit is not None:
+            words = self.get_words(tokens[0]) if prefix else [tokens[0]]
+            if len(words) == 1: return self.get_best(words[0], limit)
+        lists = []
+        for i, token in enumerate(tokens):
+            if prefix and i == len(tokens) - 1: postings = self.get_prefix_postings(token)
+            else: postings = self.postings.get(token)
+            if not postings: return []
+            lists.append(postings)
+
+        # intersect, walking the fewest postings
+        lists.sort(key=len)
+        first, others = lists[0], lists[1:]
+        order = self.order
+        if not len(others):
+            matches = [(-weight, order[key], key) for key, weight in first.iteritems()]
+        else:
+            matches = []
+            for key, weight in first.iteritems():
+                for postings in others:
+                    other = postings.get(key)
+                    if other is None: break
+                    weight += other
+                else:
+                    matches.append((-weight, order[key], key))
+
+        if limit is not None: matches = heapq.nsmallest(limit, matches)
+        else: matches.sort()
+        return [(-x[0], x[1], x[2]) for x in matches]
+
+    def get_best(self, token, limit):
+        """Returns the best matches of a single word, read in rank order"""
+
+        matches = []
+        ranked = self.ranked.get(token, {})
+        for weight in sorted(ranked.keys(), reverse=True):
+            matches.extend([(weight, x, self.keys[x]) for x in ranked[weight][:limit - len(matches)]])
+            if len(matches) >= limit: break
+        return matches
+
+    def get_prefix_postings(self, prefix):
+        """Returns the postings of every word starting with a prefix, with the
+        best weight of each programme"""
+
+        words = self.get_words(prefix)
+        if len(words) == 1: return self.postings[words[0]]
+        postings = {}
+        for token in words:
+            for key, weight in self.postings[token].iteritems():
+                if postings.get(key, 0) < weight: postings[key] = weight
+        return postings
+
+    def get_words(self, prefix):
+        """Returns the indexed words starting with a prefix, in order"""
+
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        j = bisect.bisect_left(self.vocabulary, prefix + u'\uffff')
+        return self.vocabulary[i:j]
+
+    def complete(self, prefix, limit=10):
+        """Returns the indexed words starting with a prefix, most frequent first"""
+
+        words = [(-len(self.postings[x]), x) for x in self.get_words(u''.join(tokenize(prefix)))]
+        words.sort()
+        return [x[1] for x in words[:limit]]
+
+    def __getstate__(self):
+        # the programmes are held by object identity, which does not survive pickling
+        state = self.__dict__.copy()
+        keys = sorted(self.programmes.keys(), key=lambda x: self.order.get(x, -1))
+        state['programmes'] = [self.programmes[x] for x in keys for i in range(self.references[x])]
+        del state['postings'], state['ranked'], state['vocabulary'], state['tokens'], state['order'], state['keys'], state['references']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.postings = {}
+        self.ranked = {}
+        self.vocabulary = []
+        self.programmes = {}
+        self.tokens = {}
+        self.order = {}
+        self.keys = {}
+        self.references = {}
+        self.count = 0
+        for programme in state['programmes']: self.on_programme_added(programme)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __repr__(self):
+        return '<SearchIndex: %d programmes, %d words>' % (len(self), len(self.vocabulary))
+
+def tokenize(text):
+    """Returns the lower case words of a text, as unicode"""
+
+    if text is None: return []
+    if not isinstance(text, unicode): text = text.decode('utf-8', 'replace')
+    return TOKEN_REGEX.findall(text.lower())
+
+def get_weights(programme):
+    """Returns the words of a programme, with the weight of the best field each
+    appears in"""
+
+    weights = {}
+    fields = [(WEIGHTS.get(type(x), 0), x.text) for x in programme.names + programme.media if hasattr(x, 'text')]
+    fields.extend([(WEIGHTS[KEYWORDS], x) for x in programme.keywords])
+    for weight, text in fields:
+        if not weight: continue
+        for token in tokenize(text):
+            if weights.get(token, 0) < weight: weights[token] = weight
+    return weights
@@ -0,0 +1,442 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Compact snapshots of schedules and service information, for warm starts and
+for handing them between processes.
+
+Strings, texts, genres, content IDs, times and durations are each written
+once, to tables, and the programmes refer to them by index, so that they are
+shared again when the snapshot is loaded. The programmes themselves are
+written as flat records of those indexes. The whole is encoded with
+:mod:marshal, so a snapshot should only be read by the version of Python and
+of this library that wrote it.
+"""
+
+from dabepg import *
+import datetime
+import gc
+import logging
+import marshal
+import types
+
+logger = logging.getLogger('dabepg.snapshot')
+
+MAGIC = 'DABEPG-SNAPSHOT'
+
+# bump whenever the layout below or the object model changes shape
+FORMAT_VERSION = 1
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# the texts written to the table of texts, by code
+TEXT_TYPES = (ShortName, MediumName, LongName, ShortDescription, LongDescription)
+
+# the classes whose instances may be written, by code; nothing else is built
+# when a snapshot is loaded
+CLASSES = (Bearer, ContentId, Crid, Ensemble, Epg, Genre, Link, Location, Membership, Multimedia,
+           Programme, ProgrammeEvent, RelativeTime, Scope, Service, ServiceInfo, Time,
+           Text, LongDescription, ShortDescription, LongName, MediumName, ShortName)
+
+# kinds of root object
+EPG = 0
+SCHEDULE = 1
+OBJECT = 2
+
+# tags of the tuples encoding values outside the records
+TAG_OBJECT = 0
+TAG_DATETIME = 1
+TAG_DURATION = 2
+TAG_TEXT = 3
+TAG_CONTENTID = 4
+TAG_GENRE = 5
+TAG_DICT = 6
+TAG_TUPLE = 7
+
+PRIMITIVES = (types.NoneType, bool, int, long, float, str, unicode)
+
+class SnapshotWriter:
+    """Encodes objects to the tables and records of a snapshot"""
+
+    def __init__(self):
+        self.strings = Table()
+        self.texts = Table()
+        self.genres = Table()
+        self.contentids = Table()
+        self.timezones = Table()
+        self.times = Table()
+        self.durations = Table()
+
+    def write(self, obj):
+        """Returns the snapshot of an :class:Epg, :class:Schedule or any other
+        object of the model, as a string"""
+
+        if isinstance(obj, Epg):
+            root = (EPG, obj.type, self.write_schedule(obj.schedule))
+        elif isinstance(obj, Schedule):
+            root = (SCHEDULE, None, self.write_schedule(obj))
+        else:
+            root = (OBJECT, None, self.encode(obj))
+        body = (self.strings.values,
+                flatten(self.texts.values),
+                flatten(self.genres.values),
+                flatten(self.contentids.values),
+                self.timezones.values,
+                flatten(self.times.values),
+                flatten(self.durations.values),
+                root)
+        return '%s %d\n' % (MAGIC, FORMAT_VERSION) + marshal.dumps(body, 2)
+
+    def write_schedule(self, schedule):
+        header = (self.encode(schedule.created), self.encode(schedule.version), self.encode(schedule.originator))
+        return header, [self.write_programme(x) for x in schedule.programmes]
+
+    def write_programme(self, programme):
+        record = self.write_common(programme)
+        events = getattr(programme, '_events', None)
+        record.append([self.write_event(x) for x in events] if events else None)
+        return record
+
+    def write_event(self, event):
+        record = self.write_common(event)
+        record.append(self.encode(event.originator))
+        return record
+
+    def write_common(self, programme):
+        """Returns the fields programmes and programme events share: their
+        scalar fields, as a tuple where they are all primitive values, then
+        their lists, with those that have not been allocated left as None"""
+
+        fields = (programme.shortcrid, programme.crid, programme.version, programme.bitrate, programme.onair, programme.recommendation)
+        for field in fields:
+            if not isinstance(field, PRIMITIVES):
+                fields = [self.encode(x) for x in fields]
+                break
+        record = [fields]
+        names = getattr(programme, '_names', None)
+        record.append([self.encode_text(x) for x in names] if names else None)
+        media = getattr(programme, '_media', None)
+        record.append([self.encode_text(x) for x in media] if media else None)
+        genres = getattr(programme, '_genres', None)
+        record.append([self.encode_genre(x) for x in genres] if genres else None)
+        keywords = getattr(programme, '_keywords', None)
+        record.append([self.encode_string(x) for x in keywords] if keywords else None)
+        memberships = getattr(programme, '_memberships', None)
+        record.append(self.encode(memberships) if memberships else None)
+        links = getattr(programme, '_links', None)
+        record.append(self.encode(links) if links else None)
+        locations = getattr(programme, '_locations', None)
+        record.append([self.write_location(x) for x in locations] if locations else None)
+        return record
+
+    def write_location(self, location):
+        times = getattr(location, '_times', None)
+        bearers = getattr(location, '_bearers', None)
+        return ([self.write_time(x) for x in times] if times else None,
+                [self.encode_bearer(x) for x in bearers] if bearers else None)
+
+    def write_time(self, time):
+        """Returns a time as a record of the indexes of its times, durations or
+        offsets, with -1 for those not set, led by 0 for an absolute time and
+        1 for a relative one"""
+
+        if type(time) is Time:
+            return (0, self.encode_time(time.billed_time), self.encode_duration(time.billed_duration),
+                    self.encode_time(time.actual_time), self.encode_duration(time.actual_duration))
+        elif type(time) is RelativeTime:
+            return (1, self.encode_duration(time.billed_offset), self.encode_duration(time.billed_duration),
+                    self.encode_duration(time.actual_offset), self.encode_duration(time.actual_duration))
+        return self.encode(time)
+
+    def encode_string(self, string):
+        if type(string) is str or type(string) is unicode: return self.strings.add((type(string), string), string)
+        return self.encode(string)
+
+    def encode_text(self, text):
+        """Returns the index of a name or description in the table of texts"""
+
+        cls = type(text)
+        if cls in TEXT_TYPES and text._max_length == cls.max_length and isinstance(text.text, basestring):
+            return self.texts.add((cls, type(text.text), text.text), (TEXT_TYPES.index(cls), self.encode_string(text.text)))
+        return self.encode(text)
+
+    def encode_genre(self, genre):
+        if type(genre) is not Genre: return self.encode(genre)
+        return self.genres.add((genre.href, genre.name), (self.encode(genre.href), self.encode(genre.name)))
+
+    def encode_contentid(self, id):
+        return self.contentids.add(id.get_key(), id.get_key())
+
+    def encode_bearer(self, bearer):
+        """Returns the index of a content ID, or its complement for a bearer
+        with no trigger"""
+
+        if type(bearer) is ContentId: return self.encode_contentid(bearer)
+        if type(bearer) is Bearer and type(bearer.id) is ContentId and bearer.trigger is None:
+            return ~self.encode_contentid(bearer.id)
+        return self.encode(bearer)
+
+    def encode_time(self, time):
+        if time is None: return -1
+        if type(time) is not datetime.datetime: raise ValueError('not a datetime: %r' % time)
+        offset = time.utcoffset()
+        if offset is not None: offset = offset.days * 86400 + offset.seconds
+        delta = time.replace(tzinfo=None) - EPOCH
+        key = (delta.days * 86400 + delta.seconds, delta.microseconds, offset)
+        return self.times.add(key, (key[0], key[1], self.timezones.add(offset, offset)))
+
+    def encode_duration(self, duration):
+        if duration is None: return -1
+        if type(duration) is not datetime.timedelta: raise ValueError('not a timedelta: %r' % duration)
+        key = (duration.days * 86400 + duration.seconds, duration.microseconds)
+        return self.durations.add(key, key)
+
+    def encode(self, value):
+        """Encodes any value of the model, with objects as tagged tuples"""
+
+        if isinstance(value, PRIMITIVES): return value
+        elif isinstance(value, list): return [self.encode(x) for x in value]
+        elif isinstance(value, tuple): return (TAG_TUPLE, [self.encode(x) for x in value])
+        elif isinstance(value, dict): return (TAG_DICT, [(self.encode(k), self.encode(v)) for k, v in value.items()])
+        elif type(value) is datetime.datetime: return (TAG_DATETIME, self.encode_time(value))
+        elif type(value) is datetime.timedelta: return (TAG_DURATION, self.encode_duration(value))
+        elif type(value) is ContentId: return (TAG_CONTENTID, self.encode_contentid(value))
+        elif type(value) is Genre: return (TAG_GENRE, self.encode_genre(value))
+        elif type(value) in TEXT_TYPES:
+            index = self.encode_text(value)
+            if isinstance(index, int): return (TAG_TEXT, index)
+        cls = value.__class__
+        if cls not in CLASSES: raise ValueError('cannot snapshot a %s: %r' % (cls.__name__, value))
+        return (TAG_OBJECT, CLASSES.index(cls), [(k, self.encode(v)) for k, v in get_state(value)])
+
+class SnapshotReader:
+    """Builds objects from the tables and records of a snapshot"""
+
+    def read(self, data):
+        """Returns the object held in a snapshot string"""
+
+        header, separator, body = data.partition('\n')
+        if header != '%s %d' % (MAGIC, FORMAT_VERSION):
+            if header.startswith(MAGIC): raise ValueError('snapshot is of another version: %s' % header[len(MAGIC):].strip())
+            raise ValueError('not a snapshot')
+
+        # the collector would otherwise walk the growing graph again and again
+        # while it is built, though none of it can be garbage yet
+        enabled = gc.isenabled()
+        gc.disable()
+        try: return self.read_body(marshal.loads(body))
+        finally:
+            if enabled: gc.enable()
+
+    def read_body(self, body):
+        strings, texts, genres, contentids, timezones, times, durations, root = body
+        self.strings = strings
+        self.texts = [TEXT_TYPES[texts[i]].intern(strings[texts[i + 1]]) for i in xrange(0, len(texts), 2)]
+        self.genres = [Genre(self.decode(genres[i]), self.decode(genres[i + 1])) for i in xrange(0, len(genres), 2)]
+        self.contentids = [ContentId.intern(*contentids[i:i + 5]) for i in xrange(0, len(contentids), 5)]
+        timezones = [get_timezone(x) for x in timezones]
+        timedelta = datetime.timedelta
+        self.times = [(EPOCH + timedelta(0, times[i], times[i + 1])).replace(tzinfo=timezones[times[i + 2]])
+                      for i in xrange(0, len(times), 3)]
+        self.durations = [timedelta(0, durations[i], durations[i + 1]) for i in xrange(0, len(durations), 2)]
+
+        kind, epg_type, value = root
+        if kind == EPG: return Epg(self.read_schedule(value), epg_type)
+        elif kind == SCHEDULE: return self.read_schedule(value)
+        return self.decode(value)
+
+    def read_schedule(self, value):
+        header, records = value
+        created, version, originator = [self.decode(x) for x in header]
+        schedule = Schedule(created, version, originator)
+        schedule.load_programmes(self.read_programmes(records))
+        return schedule
+
+    def read_programmes(self, records):
+        new = object.__new__
+        read_common = self.read_common
+        read_event = self.read_event
+        programmes = []
+        for record in records:
+            programme = new(Programme)
+            read_common(programme, record)
+            if record[8] is not None: programme._events = [read_event(x) for x in record[8]]
+            programmes.append(programme)
+        return programmes
+
+    def read_event(self, record):
+        event = object.__new__(ProgrammeEvent)
+        self.read_common(event, record)
+        event.originator = self.decode(record[8])
+        return event
+
+    def read_common(self, programme, record):
+        # the lists are set straight into their slots, past the lazy_list properties
+        fields, names, media, genres, keywords, memberships, links, locations = record[:8]
+        if type(fields) is not tuple: fields = [self.decode(x) for x in fields]
+        programme.shortcrid, programme.crid, programme.version, programme.bitrate, programme.onair, programme.recommendation = fields
+        lookup = self.lookup
+        if names is not None: programme._names = lookup(self.texts, names)
+        if media is not None: programme._media = lookup(self.texts, media)
+        if genres is not None: programme._genres = lookup(self.genres, genres)
+        if keywords is not None: programme._keywords = lookup(self.strings, keywords)
+        if memberships is not None: programme._memberships = self.decode(memberships)
+        if links is not None: programme._links = self.decode(links)
+        if locations is not None: programme._locations = map(self.read_location, locations)
+
+    def read_location(self, record):
+        times, bearers = record
+        location = object.__new__(Location)
+        if times is not None: location._times = map(self.read_time, times)
+        if bearers is not None: location._bearers = map(self.read_bearer, bearers)
+        return location
+
+    def read_time(self, record):
+        if len(record) != 5: return self.decode(record)
+        kind, billed, billed_duration, actual, actual_duration = record
+        if kind == 0:
+            time = object.__new__(Time)
+            table = self.times
+            time.billed_time = table[billed] if billed >= 0 else None
+            time.actual_time = table[actual] if actual >= 0 else None
+        elif kind == 1:
+            time = object.__new__(RelativeTime)
+            table = self.durations
+            time.billed_offset = table[billed] if billed >= 0 else None
+            time.actual_offset = table[actual] if actual >= 0 else None
+        else:
+            raise ValueError('unknown time in snapshot: %r' % kind)
+        durations = self.durations
+        time.billed_duration = durations[billed_duration] if billed_duration >= 0 else None
+        time.actual_duration = durations[actual_duration] if actual_duration >= 0 else None
+        return time
+
+    def read_bearer(self, value):
+        if type(value) is not int: return self.decode(value)
+        if value >= 0: return self.contentids[value]
+        bearer = object.__new__(Bearer)
+        bearer.id = self.contentids[~value]
+        bearer.trigger = None
+        return bearer
+
+    def lookup(self, table, values):
+        """Returns the entries of a table at a list of indexes, decoding any
+        values written in full"""
+
+        try: return map(table.__getitem__, values)
+        except TypeError: return [table[x] if type(x) is int else self.decode(x) for x in values]
+
+    def decode(self, value):
+        """Decodes any value written by :meth:SnapshotWriter.encode"""
+
+        if type(value) is list: return [self.decode(x) for x in value]
+        if type(value) is not tuple: return value
+        tag, content = value[0], value[-1]
+        if tag == TAG_OBJECT: return build(CLASSES[value[1]], [(k, self.decode(v)) for k, v in content])
+        elif tag == TAG_DATETIME: return self.times[content]
+        elif tag == TAG_DURATION: return self.durations[content]
+        elif tag == TAG_TEXT: return self.texts[content]
+        elif tag == TAG_CONTENTID: return self.contentids[content]
+        elif tag == TAG_GENRE: return self.genres[content]
+        elif tag == TAG_DICT: return dict([(self.decode(k), self.decode(v)) for k, v in content])
+        elif tag == TAG_TUPLE: return tuple([self.decode(x) for x in content])
+        raise ValueError('unknown tag in snapshot: %r' % tag)
+
+class Table:
+    """Values held once each, in the order they were added, by key"""
+
+    def __init__(self):
+        self.indexes = {}
+        self.values = []
+
+    def add(self, key, value):
+        """Returns the index of the value held under a key, adding it if new"""
+
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+def marshall(obj):
+    """Returns the snapshot of an :class:Epg, :class:Schedule or
+    :class:ServiceInfo as a string. Listeners registered on a schedule are
+    not kept.
+
+    :param obj: object to snapshot
+    :type obj: Epg, Schedule, ServiceInfo
+    """
+
+    return SnapshotWriter().write(obj)
+
+def unmarshall(i):
+    """Returns the object held in a snapshot
+
+    :param i: String, path or File object to read the snapshot from
+    :type i: str, file
+    """
+
+    if isinstance(i, basestring) and not i.startswith(MAGIC):
+        f = open(i, 'rb')
+        try: return unmarshall(f)
+        finally: f.close()
+    elif isinstance(i, file):
+        return unmarshall(i.read())
+    return SnapshotReader().read(i)
+
+def flatten(records):
+    """Returns the fields of a list of equal length records in one list"""
+
+    values = []
+    for record in records: values.extend(record)
+    return values
+
+def get_state(obj):
+    """Returns the attributes set on an object, from its slots or dictionary,
+    sorted by name"""
+
+    if hasattr(obj, '__dict__'): return sorted(obj.__dict__.items())
+    state = []
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot): state.append((slot, getattr(obj, slot)))
+    return sorted(state)
+
+def build(cls, state):
+    """Returns an instance of a class with the given attributes, without
+    calling its constructor"""
+
+    if isinstance(cls, types.ClassType): return types.InstanceType(cls, dict(state))
+    obj = object.__new__(cls)
+    for name, value in state: setattr(obj, name, value)
+    return obj
+
+timezones = {}
+
+def get_timezone(offset):
+    """Returns the shared timezone of an offset in seconds, with UTC for no
+    offset, or None for local times"""
+
+    if offset is None: return None
+    timezone = timezones.get(offset)
+    if timezone is None:
+        timezone = timezones[offset] = tz.tzutc() if offset == 0 else tz.tzoffset(None, offset)
+    return timezone
@@ -0,0 +1,392 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Persistent store of schedules and service information in an SQLite database,
+queried by time, service and CRID"""
+
+from dabepg import *
+from dabepg.partition import get_service, partition
+from dabepg.snapshot import TEXT_TYPES, get_timezone
+import dabepg.snapshot as snapshot
+import datetime
+import logging
+import sqlite3
+
+logger = logging.getLogger('dabepg.store')
+
+# bump whenever the schema changes
+SCHEMA_VERSION = 1
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (id INTEGER PRIMARY KEY, created INTEGER, created_offset INTEGER, version INTEGER, originator TEXT);
+CREATE TABLE IF NOT EXISTS programmes (id INTEGER PRIMARY KEY, schedule INTEGER, shortcrid INTEGER, crid TEXT, version INTEGER,
+    bitrate INTEGER, onair INTEGER, recommendation INTEGER, start INTEGER, end INTEGER, locations INTEGER, extra BLOB);
+CREATE TABLE IF NOT EXISTS texts (programme INTEGER, field INTEGER, position INTEGER, kind INTEGER, text TEXT);
+CREATE TABLE IF NOT EXISTS keywords (programme INTEGER, position INTEGER, keyword TEXT);
+CREATE TABLE IF NOT EXISTS genres (programme INTEGER, position INTEGER, href TEXT, name TEXT);
+CREATE TABLE IF NOT EXISTS memberships (programme INTEGER, position INTEGER, shortcrid INTEGER, crid TEXT, idx INTEGER);
+CREATE TABLE IF NOT EXISTS times (programme INTEGER, location INTEGER, position INTEGER, relative INTEGER,
+    billed INTEGER, billed_offset INTEGER, billed_duration INTEGER, actual INTEGER, actual_offset INTEGER, actual_duration INTEGER);
+CREATE TABLE IF NOT EXISTS bearers (programme INTEGER, location INTEGER, position INTEGER, service TEXT,
+    ecc INTEGER, eid INTEGER, sid INTEGER, scids INTEGER, xpad INTEGER, bearer INTEGER, trigger TEXT);
+CREATE TABLE IF NOT EXISTS serviceinfos (id INTEGER PRIMARY KEY, created INTEGER, created_offset INTEGER, version INTEGER,
+    originator TEXT, data BLOB);
+CREATE INDEX IF NOT EXISTS programmes_start ON programmes (start);
+CREATE INDEX IF NOT EXISTS programmes_shortcrid ON programmes (shortcrid);
+CREATE INDEX IF NOT EXISTS programmes_crid ON programmes (crid);
+CREATE INDEX IF NOT EXISTS texts_programme ON texts (programme);
+CREATE INDEX IF NOT EXISTS keywords_programme ON keywords (programme);
+CREATE INDEX IF NOT EXISTS genres_programme ON genres (programme);
+CREATE INDEX IF NOT EXISTS genres_href ON genres (href);
+CREATE INDEX IF NOT EXISTS memberships_programme ON memberships (programme);
+CREATE INDEX IF NOT EXISTS times_programme ON times (programme);
+CREATE INDEX IF NOT EXISTS bearers_programme ON bearers (programme);
+CREATE INDEX IF NOT EXISTS bearers_service ON bearers (service, programme);
+CREATE INDEX IF NOT EXISTS serviceinfos_created ON serviceinfos (created);
+"""
+
+# the fields of a programme whose texts are held in the texts table
+NAMES = 0
+MEDIA = 1
+
+# most programmes looked up in one statement, within the 999 variables older
+# SQLite builds allow
+MAX_IDS = 500
+
+class EpgStore:
+    """Holds programmes and service information in an SQLite database.
+
+    The fields of each programme are written to a table of programmes and to
+    tables of its texts, keywords, genres, memberships, times and bearers, in
+    bulk. Times are held as microseconds since the epoch in UTC, with their
+    offset from UTC, and each programme is indexed by the earliest start and
+    latest end of its billed times. Multimedia, links and programme events,
+    which are not queried on, are held with the programme as a snapshot (see
+    :mod:dabepg.snapshot), as is each service information document.
+
+    Queries return programmes in batches as they are iterated over, so that a
+    query over months of schedules need not fit in memory.
+
+    :param path: path of the database, created if missing
+    :type path: str
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.text_factory = sqlite3.OptimizedUnicode
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError('store is of schema version %d, not %d: %s' % (version, SCHEMA_VERSION, path))
+        self.connection.executescript(SCHEMA)
+        self.connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def add_schedule(self, schedule):
+        """Stores a schedule and its programmes, returning its ID"""
+
+        created, created_offset = encode_time(schedule.created)
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO schedules (created, created_offset, version, originator) VALUES (?, ?, ?, ?)',
+                                             (created, created_offset, schedule.version, schedule.originator))
+            id = cursor.lastrowid
+            self.insert_programmes(schedule.programmes, id)
+        return id
+
+    def add_programmes(self, programmes, schedule=None):
+        """Stores programmes, optionally as belonging to a stored schedule"""
+
+        with self.connection: self.insert_programmes(programmes, schedule)
+
+    def insert_programmes(self, programmes, schedule):
+        rows = Rows()
+        first = self.connection.execute('SELECT coalesce(max(id), 0) + 1 FROM programmes').fetchone()[0]
+        for id, programme in enumerate(programmes, first):
+            write_programme(rows, id, programme, schedule)
+        for table, values in rows.tables.items():
+            if not len(values): continue
+            self.connection.executemany('INSERT INTO %s VALUES (%s)' % (table, ', '.join(['?'] * len(values[0]))), values)
+        logger.debug('stored %d programmes', len(rows.tables['programmes']))
+
+    def add_serviceinfo(self, info):
+        """Stores a service information document, returning its ID"""
+
+        created, created_offset = encode_time(info.created)
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO serviceinfos (created, created_offset, version, originator, data) VALUES (?, ?, ?, ?, ?)',
+                                             (created, created_offset, info.version, info.originator, sqlite3.Binary(snapshot.marshall(info))))
+        return cursor.lastrowid
+
+    def get_serviceinfo(self, at=None):
+        """Returns the latest service information created at or before a time,
+        or the latest of all, or None"""
+
+        if at is None:
+            row = self.connection.execute('SELECT data FROM serviceinfos ORDER BY created DESC, id DESC LIMIT 1').fetchone()
+        else:
+            row = self.connection.execute('SELECT data FROM serviceinfos WHERE created <= ? ORDER BY created DESC, id DESC LIMIT 1',
+                                          (encode_time(at)[0],)).fetchone()
+        if row is None: return None
+        return snapshot.unmarshall(str(row[0]))
+
+    def get_programmes(self, start=None, end=None, service=None, crid=None, shortcrid=None, genre=None, batch=500):
+        """Yields the stored programmes matching every criterion given, in order
+        of their start, building them a batch at a time
+
+        :param start: only programmes ending after this time
+        :type start: datetime
+        :param end: only programmes starting before this time
+        :type end: datetime
+        :param service: only programmes located on this service
+        :type service: ContentId, Bearer, str
+        :param crid: only programmes with this CRID
+        :type crid: str
+        :param shortcrid: only programmes with this short CRID
+        :type shortcrid: int
+        :param genre: only programmes of this genre, given by href
+        :type genre: str
+        :param batch: number of programmes to build at a time
+        :type batch: int
+        """
+
+        clauses = []
+        values = []
+        if start is not None:
+            clauses.append('end > ?')
+            values.append(encode_time(start)[0])
+        if end is not None:
+            clauses.append('start < ?')
+            values.append(encode_time(end)[0])
+        if service is not None:
+            clauses.append('id IN (SELECT programme FROM bearers WHERE service = ?)')
+            values.append(str(get_service(service)))
+        if crid is not None:
+            clauses.append('crid = ?')
+            values.append(str(crid))
+        if shortcrid is not None:
+            clauses.append('shortcrid = ?')
+            values.append(int(shortcrid))
+        if genre is not None:
+            clauses.append('id IN (SELECT programme FROM genres WHERE href = ?)')
+            values.append(str(genre))
+        sql = 'SELECT id, shortcrid, crid, version, bitrate, onair, recommendation, locations, extra FROM programmes'
+        if len(clauses): sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY start, id'
+
+        cursor = self.connection.execute(sql, values)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not len(rows): break
+            for programme in self.read_programmes(rows): yield programme
+
+    def get_programme(self, shortcrid=None, crid=None):
+        """Returns the programme stored last with a short CRID or CRID, or None"""
+
+        column, value = ('shortcrid', int(shortcrid)) if shortcrid is not None else ('crid', str(crid))
+        row = self.connection.execute('SELECT id, shortcrid, crid, version, bitrate, onair, recommendation, locations, extra '
+                                      'FROM programmes WHERE %s = ? ORDER BY id DESC LIMIT 1' % column, (value,)).fetchone()
+        if row is None: return None
+        return self.read_programmes([row])[0]
+
+    def get_schedule(self, start=None, end=None, service=None):
+        """Returns a schedule of the stored programmes in a window"""
+
+        schedule = Schedule()
+        schedule.programmes = list(self.get_programmes(start, end, service))
+        return schedule
+
+    def export(self, start, end, tz=None, marshall=None):
+        """Yields the daily documents of each service for the stored programmes
+        in a window, as by :func:dabepg.partition.partition, loading one day of
+        programmes at a time. Documents are yielded as ``(filename, Epg)``, or
+        as ``(filename, data)`` if a marshall function is given, such as
+        :func:dabepg.xml.marshall or :func:dabepg.binary.marshall.
+
+        :param start: start of the window
+        :type start: datetime
+        :param end: end of the window
+        :type end: datetime
+        :param tz: timezone whose days the documents cover, defaulting to UTC
+        :type tz: tzinfo
+
+        Bounds without a timezone are taken to be in UTC, as stored times are.
+        """
+
+        if tz is None: tz = get_timezone(0)
+        if start.tzinfo is None: start = start.replace(tzinfo=get_timezone(0))
+        if end.tzinfo is None: end = end.replace(tzinfo=get_timezone(0))
+        day = start.astimezone(tz).date()
+        while True:
+            day_start = datetime.datetime(day.year, day.month, day.day, tzinfo=tz)
+            if day_start >= end: break
+            day_end = day_start + datetime.timedelta(days=1)
+            schedule = Schedule()
+            schedule.programmes = list(self.get_programmes(max(start, day_start), min(end, day_end)))
+            for filename, epg in partition(schedule, tz):
+                if not filename.startswith(day.strftime('%Y%m%d')): continue
+                yield filename, (marshall(epg) if marshall is not None else epg)
+            day += datetime.timedelta(days=1)
+
+    def read_programmes(self, rows):
+        """Builds the programmes of rows of the programmes table, with the rows
+        of the other tables for them"""
+
+        ids = [x[0] for x in rows]
+        programmes = {}
+        result = []
+        for id, shortcrid, crid, version, bitrate, onair, recommendation, locations, extra in rows:
+            programme = Programme(shortcrid, crid, bitrate, bool(onair), bool(recommendation), version)
+            if locations: programme.locations = [Location() for i in range(locations)]
+            programmes[id] = programme
+            result.append(programme)
+
+        for id, field, kind, text in self.select('programme, field, kind, text FROM texts', ids, 'field, position'):
+            programme = programmes[id]
+            (programme.names if field == NAMES else programme.media).append(TEXT_TYPES[kind].intern(text))
+        for id, keyword in self.select('programme, keyword FROM keywords', ids):
+            programmes[id].keywords.append(intern_string(keyword))
+        genres = {}
+        for id, href, name in self.select('programme, href, name FROM genres', ids):
+            genre = genres.get((href, name))
+            if genre is None: genre = genres[(href, name)] = Genre(href, name)
+            programmes[id].genres.append(genre)
+        for id, shortcrid, crid, index in self.select('programme, shortcrid, crid, idx FROM memberships', ids):
+            programmes[id].memberships.append(Membership(shortcrid, crid, index))
+        for row in self.select('programme, location, relative, billed, billed_offset, billed_duration, actual, actual_offset, actual_duration FROM times', ids, 'location, position'):
+            programmes[row[0]].locations[row[1]].times.append(read_time(row[2:]))
+        for row in self.select('programme, location, ecc, eid, sid, scids, xpad, bearer, trigger FROM bearers', ids, 'location, position'):
+            id = ContentId.intern(*row[2:7])
+            programmes[row[0]].locations[row[1]].bearers.append(Bearer(id, row[8]) if row[7] else id)
+
+        for id, shortcrid, crid, version, bitrate, onair, recommendation, locations, extra in rows:
+            if extra is not None: read_extra(programmes[id], snapshot.unmarshall(str(extra)))
+        return result
+
+    def select(self, sql, ids, order='position'):
+        """Yields the rows of a table for the given programmes, in order of
+        their position, looking up at most :data:MAX_IDS programmes at a time"""
+
+        for i in xrange(0, len(ids), MAX_IDS):
+            chunk = ids[i:i + MAX_IDS]
+            for row in self.connection.execute('SELECT %s WHERE programme IN (%s) ORDER BY programme, %s'
+                                               % (sql, ', '.join(['?'] * len(chunk)), order), chunk):
+                yield row
+
+    def __len__(self):
+        return self.connection.execute('SELECT count(*) FROM programmes').fetchone()[0]
+
+    def __repr__(self):
+        return '<EpgStore: %s>' % self.path
+
+class Rows:
+    """Rows to insert, by table"""
+
+    def __init__(self):
+        self.tables = dict([(x, []) for x in ('programmes', 'texts', 'keywords', 'genres', 'memberships', 'times', 'bearers')])
+
+def write_programme(rows, id, programme, schedule):
+    """Adds the rows of a programme to those to insert"""
+
+    start, end, services = get_extent(programme)
+    extra = {}
+    tables = rows.tables
+    for field, texts in ((NAMES, programme.names), (MEDIA, programme.media)):
+        for position, text in enumerate(texts):
+            if type(text) in TEXT_TYPES and text._max_length == type(text).max_length:
+                tables['texts'].append((id, field, position, TEXT_TYPES.index(type(text)), text.text))
+            else:
+                extra.setdefault(field, []).append((position, text))
+    tables['keywords'].extend([(id, i, x) for i, x in enumerate(programme.keywords)])
+    tables['genres'].extend([(id, i, x.href, x.name) for i, x in enumerate(programme.genres)])
+    tables['memberships'].extend([(id, i, x.shortcrid, str(x.crid) if x.crid is not None else None, x.index)
+                                  for i, x in enumerate(programme.memberships)])
+    for location_position, location in enumerate(programme.locations):
+        for position, time in enumerate(location.times):
+            tables['times'].append((id, location_position, position) + write_time(time))
+        for position, bearer in enumerate(location.bearers):
+            contentid = get_service(bearer)
+            trigger = bearer.trigger if isinstance(bearer, Bearer) else None
+            tables['bearers'].append((id, location_position, position, str(contentid)) + contentid.get_key() + (isinstance(bearer, Bearer), trigger))
+    if len(programme.links): extra['links'] = programme.links
+    if len(programme.events): extra['events'] = programme.events
+    tables['programmes'].append((id, schedule,
+                                 int(programme.shortcrid) if programme.shortcrid is not None else None,
+                                 str(programme.crid) if programme.crid is not None else None,
+                                 programme.version, programme.bitrate, programme.onair, programme.recommendation,
+                                 encode_time(start)[0], encode_time(end)[0], len(programme.locations),
+                                 sqlite3.Binary(snapshot.marshall(extra)) if len(extra) else None))
+
+def write_time(time):
+    """Returns the columns of a time, with offsets and durations in
+    microseconds"""
+
+    if isinstance(time, RelativeTime):
+        return (1, encode_duration(time.billed_offset), None, encode_duration(time.billed_duration),
+                encode_duration(time.actual_offset), None, encode_duration(time.actual_duration))
+    return ((0,) + encode_time(time.billed_time) + (encode_duration(time.billed_duration),) +
+            encode_time(time.actual_time) + (encode_duration(time.actual_duration),))
+
+def read_time(row):
+    relative, billed, billed_offset, billed_duration, actual, actual_offset, actual_duration = row
+    if relative:
+        return RelativeTime(decode_duration(billed), decode_duration(billed_duration), decode_duration(actual), decode_duration(actual_duration))
+    return Time(decode_time(billed, billed_offset), decode_duration(billed_duration), decode_time(actual, actual_offset), decode_duration(actual_duration))
+
+def read_extra(programme, extra):
+    """Puts the values held in a programme's snapshot back in their places"""
+
+    for position, text in extra.get(NAMES, []): programme.names.insert(position, text)
+    for position, media in extra.get(MEDIA, []): programme.media.insert(position, media)
+    if extra.has_key('links'): programme.links = extra['links']
+    if extra.has_key('events'): programme.events = extra['events']
+
+def encode_time(time):
+    """Returns a time as microseconds since the epoch in UTC and its offset from
+    UTC in seconds. A time without a timezone is taken to be in UTC, with no
+    offset."""
+
+    if time is None: return None, None
+    offset = time.utcoffset()
+    delta = time.replace(tzinfo=None) - EPOCH
+    if offset is not None:
+        delta -= offset
+        offset = offset.days * 86400 + offset.seconds
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds, offset
+
+def decode_time(micros, offset):
+    if micros is None: return None
+    time = EPOCH + datetime.timedelta(microseconds=micros)
+    if offset is None: return time
+    return (time + datetime.timedelta(seconds=offset)).replace(tzinfo=get_timezone(offset))
+
+def encode_duration(duration):
+    if duration is None: return None
+    return (duration.days * 86400 + duration.seconds) * 1000000 + duration.microseconds
+
+def decode_duration(micros):
+    if micros is None: return None
+    return datetime.timedelta(microseconds=micros)
@@ -0,0 +1,19 @@
+from dabepg import *
+import datetime
+
+def build_schedule(start, count=48, crid='crid://example.com/%d', **kwargs):
+    """Returns a schedule of hour long programmes from a start, alternating
+    between two services, with names, descriptions and genres shared among
+    them. Other arguments are passed to the schedule."""
+
+    schedule = Schedule(**kwargs)
+    for i in range(count):
+        service = 'e1.ce15.c221.0' if i % 2 else 'e1.ce15.c222.0'
+        programme = Programme(i + 1, crid=crid % (i + 1))
+        programme.names.append(MediumName.intern('Show %d' % (i % 4)))
+        programme.media.append(ShortDescription('Music and chat'))
+        programme.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2009:3.6.%d' % (i % 3), 'Music'))
+        programme.locations.append(Location(times=[Time(start + datetime.timedelta(hours=i), datetime.timedelta(hours=1))]))
+        programme.locations[0].bearers.append(Bearer(service))
+        schedule.programmes.append(programme)
+    return schedule
@@ -0,0 +1,137 @@
+import unittest
+
+from dabepg import *
+from dabepg.archive import ScheduleArchive
+from dabepg.test import build_schedule
+from dateutil.tz import tzutc, tzoffset
+import dabepg.archive as archive
+import datetime
+import tempfile
+import shutil
+import os
+
+class ScheduleArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'epg.archive')
+        self.archive = ScheduleArchive(self.path)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def build_schedule(self, month, count=48):
+        schedule = build_schedule(datetime.datetime(2011, month, 1, tzinfo=tzoffset(None, 3600)), count,
+                                  'crid://example.com/%d/%%d' % month, created=datetime.datetime(2011, month, 1, tzinfo=tzutc()))
+        for i, programme in enumerate(schedule.programmes):
+            programme.recommendation = bool(i % 2)
+            programme.names.append(LongName(u'The Sh\xf6w'))
+        return schedule
+
+    def test_roundtrip(self):
+        schedule = self.build_schedule(7)
+        first = schedule.programmes[0]
+        first.keywords = ['music']
+        first.memberships.append(Membership(50, 'crid://example.com/group', 2))
+        first.locations.append(Location(times=[Time(datetime.datetime(2011, 7, 2, 12, 0), datetime.timedelta(minutes=30))],
+                                        bearers=[ContentId('e1', 'ce15', 'c223', '0')]))
+        first.locations[1].bearers.append(ContentId('e1', 'ce15', 'c224', '0'))
+        second = schedule.programmes[1]
+        second.locations[0].times[0] = Time(datetime.datetime(2011, 7, 1, 12, 0, tzinfo=tzutc()), datetime.timedelta(hours=1),
+                                            datetime.datetime(2011, 7, 1, 12, 1, tzinfo=tzutc()), datetime.timedelta(minutes=59))
+        second.names.append(ShortName('One'))
+        self.archive.append(schedule)
+        self.assertEqual(len(self.archive), 48)
+
+        programme = self.archive.get_programme(0)
+        self.assertEqual((programme.shortcrid, programme.crid, programme.version, programme.onair, programme.recommendation),
+                         (1, 'crid://example.com/7/1', 1, True, False))
+        self.assertEqual(programme.names, first.names)
+        self.assertTrue(programme.names[0] is MediumName.intern('Show 0'))
+        self.assertEqual(programme.names[1].text, u'The Sh\xf6w')
+        self.assertEqual(programme.media, first.media)
+        self.assertEqual([(x.href, x.name) for x in programme.genres], [('urn:tva:metadata:cs:ContentCS:2009:3.6.0', 'Music')])
+        self.assertEqual(programme.keywords, ['music'])
+        self.assertEqual(programme.memberships[0].crid, 'crid://example.com/group')
+        self.assertEqual(programme.get_times(), first.get_times())
+        self.assertEqual(programme.get_times()[0][0].utcoffset(), datetime.timedelta(hours=1))
+        self.assertEqual(programme.locations[1].times[0].billed_time.tzinfo, None)
+        self.assertTrue(isinstance(programme.locations[0].bearers[0], Bearer))
+        self.assertEqual([str(x) for x in programme.locations[1].bearers], ['e1.ce15.c223.0', 'e1.ce15.c224.0'])
+        self.assertTrue(programme.locations[1].bearers[0] is ContentId.fromstring('e1.ce15.c223.0'))
+
+        # locations the columns cannot hold are kept whole
+        programme = self.archive.get_programme(1)
+        time = programme.locations[0].times[0]
+        self.assertEqual((time.actual_time, time.actual_duration), (datetime.datetime(2011, 7, 1, 12, 1, tzinfo=tzutc()), datetime.timedelta(minutes=59)))
+        self.assertEqual([x.text for x in programme.names], ['Show 1', u'The Sh\xf6w', 'One'])
+        self.assertEqual(self.archive.get_programme(-1).crid, 'crid://example.com/7/48')
+        self.assertRaises(IndexError, self.archive.get_programme, 48)
+
+    def test_find(self):
+        self.archive.append(self.build_schedule(7))
+        self.archive.append(self.build_schedule(8).programmes)
+        self.assertEqual(len(self.archive.segments), 2)
+        start = datetime.datetime(2011, 8, 1, 10, 30, tzinfo=tzutc())
+        end = datetime.datetime(2011, 8, 1, 13, 0, tzinfo=tzutc())
+        self.assertEqual(list(self.archive.find(start, end)), [59, 60, 61])
+        self.assertEqual(list(self.archive.find(start, end, service='e1.ce15.c221.0')), [59, 61])
+        self.assertEqual(list(self.archive.find(service=ContentId('e1', 'ce15', 'c223', '0'))), [])
+        self.assertEqual(list(self.archive.find(crid='crid://example.com/8/5')), [52])
+        self.assertEqual(self.archive.count(genre='urn:tva:metadata:cs:ContentCS:2009:3.6.1'), 32)
+        self.assertEqual(self.archive.count(genre='urn:tva:metadata:cs:ContentCS:2009:3.6'), 96)
+        self.assertEqual(self.archive.count(datetime.datetime(2011, 8, 1, tzinfo=tzutc()), service='e1.ce15.c222.0',
+                                            genre='urn:tva:metadata:cs:ContentCS:2009:3.6.1'), 8)
+
+        # queries on an archive opened afresh read only the strings they look for
+        other = ScheduleArchive(self.path)
+        self.assertEqual(list(other.find(start, end, service='e1.ce15.c221.0')), [59, 61])
+        self.assertEqual(list(other.find(crid='crid://example.com/8/5')), [52])
+        self.assertEqual(list(other.find(crid='crid://example.com/8/')), [])
+        self.assertEqual(list(other.find(crid='://example.com/8/5')), [])
+        self.assertEqual(other.strings, None)
+        self.assertEqual(other.find_string(u'The Sh\xf6w'), other.get_strings()[u'The Sh\xf6w'.encode('utf-8')])
+        other.close()
+
+        schedule = self.archive.slice(start, end)
+        self.assertEqual([x.crid for x in schedule.programmes], ['crid://example.com/8/12', 'crid://example.com/8/13', 'crid://example.com/8/14'])
+
+    def test_reopen(self):
+        self.archive.append(self.build_schedule(7))
+        self.archive.close()
+        # a failed append leaves data past the last segment, which is ignored and overwritten
+        f = open(self.path, 'ab')
+        try: f.write('partial')
+        finally: f.close()
+        self.archive = ScheduleArchive(self.path)
+        self.assertEqual(len(self.archive), 48)
+        self.archive.append(self.build_schedule(8, 2))
+        self.archive.close()
+        self.archive = ScheduleArchive(self.path)
+        self.assertEqual(len(self.archive), 50)
+        self.assertEqual([x.crid for x in self.archive.toschedule([47, 48]).programmes], ['crid://example.com/7/48', 'crid://example.com/8/1'])
+        # strings are stored once across segments
+        self.assertEqual(self.archive.segments[1].string_count, 2)
+
+    def test_rows(self):
+        self.archive.append(self.build_schedule(7))
+        numpy = archive.numpy
+        archive.numpy = None
+        try:
+            other = ScheduleArchive(self.path)
+            start = datetime.datetime(2011, 7, 1, 10, 30, tzinfo=tzutc())
+            self.assertEqual(other.find(start, service='e1.ce15.c221.0', genre='urn:tva:metadata:cs:ContentCS:2009:3.6.1')[:3], [13, 19, 25])
+            self.assertEqual(other.get_programme(13).get_times(), self.archive.get_programme(13).get_times())
+            other.close()
+        finally:
+            archive.numpy = numpy
+
+    def test_invalid(self):
+        f = open(self.path, 'r+b')
+        try: f.write('NOTANARCHIVE')
+        finally: f.close()
+        self.assertRaises(ValueError, ScheduleArchive, self.path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from dabepg import *
+from dabepg.cache import ParseCache
+from dateutil.tz import tzutc
+import dabepg.binary
+import dabepg.cache
+import datetime
+import tempfile
+import shutil
+import time
+import os
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ParseCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, shortcrid):
+        schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 3, 35, tzinfo=tzutc()))
+        programme = Programme(shortcrid, crid='crid://bbc.co.uk/%d' % shortcrid)
+        programme.names.append(MediumName('Gilles Peterson'))
+        programme.locations.append(Location(times=[Time(datetime.datetime(2003, 12, 18, 14, 0, 0, tzinfo=tzutc()), datetime.timedelta(hours=2))],
+                                            bearers=[Bearer('e1.ce15.c221.0')]))
+        schedule.programmes.append(programme)
+        path = os.path.join(self.directory, name)
+        f = open(path, 'wb')
+        f.write(dabepg.binary.marshall(Epg(schedule)))
+        f.close()
+        return path
+
+    def test_hit(self):
+        path = self.write('PI.EHB', 1)
+        first = self.cache.binary(path)
+        second = self.cache.binary(path)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertFalse(first is second)
+        self.assertEqual(second.schedule.programmes[0].shortcrid, 1)
+        self.assertEqual(second.schedule.get_programme(1).get_name().text, 'Gilles Peterson')
+
+        # the same contents under another name are recognised by their hash
+        shutil.copy(path, os.path.join(self.directory, 'copy.EHB'))
+        self.cache.binary(os.path.join(self.directory, 'copy.EHB'))
+        self.assertEqual(self.cache.hits, 2)
+
+        # changed contents are parsed again
+        self.write('PI.EHB', 2)
+        self.assertEqual(self.cache.binary(path).schedule.programmes[0].shortcrid, 2)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_stat(self):
+        cache = ParseCache(self.cache.directory, check='stat')
+        path = self.write('PI.EHB', 1)
+        cache.binary(path)
+        cache.binary(path)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        cache.binary(path)
+        self.assertEqual(cache.misses, 2)
+
+    def test_version(self):
+        path = self.write('PI.EHB', 1)
+        self.cache.binary(path)
+        version = dabepg.cache.FORMAT_VERSION
+        dabepg.cache.FORMAT_VERSION = version + 1
+        try:
+            self.assertEqual(self.cache.binary(path).schedule.programmes[0].shortcrid, 1)
+            self.assertEqual(self.cache.misses, 2)
+            self.cache.binary(path)
+            self.assertEqual(self.cache.hits, 1)
+        finally:
+            dabepg.cache.FORMAT_VERSION = version
+
+    def test_corrupt(self):
+        path = self.write('PI.EHB', 1)
+        self.cache.binary(path)
+        for name in os.listdir(self.cache.directory):
+            f = open(os.path.join(self.cache.directory, name), 'r+b')
+            f.seek(-10, 2)
+            f.truncate()
+            f.close()
+        self.assertEqual(self.cache.binary(path).schedule.programmes[0].shortcrid, 1)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_eviction(self):
+        paths = [self.write('PI%d.EHB' % i, i) for i in range(1, 4)]
+        self.cache.binary(paths[0])
+        size = sum([os.path.getsize(os.path.join(self.cache.directory, x)) for x in os.listdir(self.cache.directory)])
+        self.cache.max_size = size * 2
+        self.cache.binary(paths[1])
+        entries = os.listdir(self.cache.directory)
+        for i, name in enumerate(entries):
+            entry = os.path.join(self.cache.directory, name)
+            os.utime(entry, (time.time(), time.time() - 100 + i))
+        self.cache.binary(paths[0]) # touched, so the most recently used
+        self.cache.binary(paths[2])
+        self.assertEqual(len(os.listdir(self.cache.directory)), 2)
+        self.cache.binary(paths[0])
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 3))
+        self.cache.binary(paths[1])
+        self.assertEqual(self.cache.misses, 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from dabepg import *
+from dabepg.columnar import ColumnarSchedule
+from dateutil.tz import tzutc, tzoffset
+import dabepg.columnar
+import dabepg.xml
+import dabepg.binary
+import datetime
+import re
+
+def build_schedule():
+    schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 3, 35, tzinfo=tzutc()), version=2, originator='Global Radio')
+    start = datetime.datetime(2011, 7, 27, 6, 0, 0, tzinfo=tzoffset(None, 3600))
+    for i in range(6):
+        programme = Programme(i + 1, crid='crid://example.com/%d' % (i + 1))
+        programme.names.append(ShortName('Show %d' % (i % 2)))
+        programme.names.append(MediumName('The Show %d' % (i % 2)))
+        programme.media.append(ShortDescription('A show'))
+        bearer = 'e1.ce15.c221.0' if i % 2 else 'e1.ce15.c222.0'
+        programme.locations.append(Location(times=[Time(start + datetime.timedelta(hours=i), datetime.timedelta(hours=1))],
+                                            bearers=[bearer]))
+        schedule.programmes.append(programme)
+    # a programme that does not fit the columns alone
+    programme = Programme(7, onair=False, recommendation=False)
+    programme.names.append(LongName('Simulcast'))
+    programme.names.append(ShortName('Sim'))
+    programme.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.7'))
+    programme.locations.append(Location(times=[Time(start + datetime.timedelta(hours=6), datetime.timedelta(hours=1)),
+                                               Time(start + datetime.timedelta(hours=9), datetime.timedelta(hours=1))],
+                                        bearers=['e1.ce15.c223.0', 'e1.ce15.c221.0']))
+    schedule.programmes.append(programme)
+    return schedule
+
+class ColumnarScheduleTest(unittest.TestCase):
+
+    def test_roundtrip(self):
+        schedule = build_schedule()
+        columnar = ColumnarSchedule.fromschedule(schedule)
+        self.assertEqual(len(columnar), 7)
+        self.assertEqual(len(columnar.residuals), 1)
+        self.assertEqual(len(columnar.texts), 5)
+        self.assertEqual(dabepg.binary.marshall(Epg(columnar)), dabepg.binary.marshall(Epg(schedule)))
+        self.assertEqual(dabepg.xml.marshall(Epg(columnar)), dabepg.xml.marshall(Epg(schedule)))
+        self.assertEqual(dabepg.binary.marshall(Epg(columnar.toschedule())), dabepg.binary.marshall(Epg(schedule)))
+
+        # the programmes of a columnar schedule are built afresh on each pass,
+        # and the times batch encoded for one must not be taken for another's
+        expected = dabepg.binary.marshall(Epg(schedule))
+        for i in range(3):
+            self.assertEqual(dabepg.binary.marshall(Epg(ColumnarSchedule.fromschedule(build_schedule()))), expected)
+
+    def test_programme_file(self):
+        epg = dabepg.xml.unmarshall(re.sub(r'<memberOf[^>]*>', '', open('test/PI.xml').read()))
+        columnar = ColumnarSchedule.fromschedule(epg.schedule)
+        self.assertEqual(dabepg.xml.marshall(Epg(columnar)), dabepg.xml.marshall(epg))
+
+    def test_views(self):
+        columnar = ColumnarSchedule.fromschedule(build_schedule())
+        programme = columnar[-1]
+        self.assertEqual([x.text for x in programme.names], ['Simulcast', 'Sim'])
+        self.assertEqual([str(x) for x in programme.locations[0].bearers], ['e1.ce15.c223.0', 'e1.ce15.c221.0'])
+        self.assertFalse(programme.onair)
+        programme.names = [MediumName('Renamed')]
+        self.assertEqual(columnar[-1].names[0].text, 'Simulcast')
+        columnar[-1] = programme
+        self.assertEqual(columnar[-1].names[0].text, 'Renamed')
+
+    def test_operations(self):
+        schedule = build_schedule()
+        for numpy in (dabepg.columnar.numpy, None):
+            dabepg.columnar.numpy, saved = numpy, dabepg.columnar.numpy
+            try:
+                columnar = ColumnarSchedule.fromschedule(schedule)
+                columnar.shift(datetime.timedelta(hours=1))
+                scope = columnar.get_scope()
+                self.assertEqual(scope.start, datetime.datetime(2011, 7, 27, 6, 0, 0, tzinfo=tzutc()))
+                self.assertEqual(scope.end, datetime.datetime(2011, 7, 27, 16, 0, 0, tzinfo=tzutc()))
+                self.assertEqual([str(x) for x in scope.services], ['e1.ce15.c222.0', 'e1.ce15.c221.0', 'e1.ce15.c223.0'])
+                self.assertEqual(schedule.programmes[-1].get_times()[1][0].hour, 15)
+
+                self.assertEqual([x.shortcrid for x in columnar.filter_service('e1.ce15.c221.0')], [2, 4, 6, 7])
+                self.assertEqual([x.shortcrid for x in columnar.filter_service(ContentId('e1', 'ce15', 'c222', '0'))], [1, 3, 5])
+                self.assertEqual([x.shortcrid for x in columnar.filter_time(datetime.datetime(2011, 7, 27, 7, 30, tzinfo=tzutc()),
+                                                                          datetime.datetime(2011, 7, 27, 8, 0, tzinfo=tzutc()))], [2])
+                self.assertEqual([x.shortcrid for x in columnar.select([6, 0])], [7, 1])
+            finally:
+                dabepg.columnar.numpy = saved
+
+if __name__ == "__main__":
+    unittest.main()
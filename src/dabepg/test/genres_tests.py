@@ -0,0 +1,83 @@
+import unittest
+
+from dabepg import Genre
+from dabepg.genres import GenreRegistry, get_registry, parse_href
+from dabepg.binary import encode_genre, decode_genre
+from dabepg import tva_genre_2009
+from bitarray import bitarray
+import pickle
+
+class GenreRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = get_registry()
+
+    def test_lookup(self):
+        genre = self.registry.get('urn:tva:metadata:cs:ContentCS:2009:3.1.1.10.4')
+        self.assertEqual(genre.name, 'Music')
+        self.assertTrue(genre is tva_genre_2009.Content.NonFiction.News.Cultural.Music)
+        self.assertEqual(self.registry.get('urn:tva:metadata:cs:ContentCS:2009:3.6').name, 'Music')
+        self.assertEqual(self.registry.get('urn:tva:metadata:cs:ContentCS:2009:9.9'), None)
+
+        # the same href always registers as the first instance
+        registry = GenreRegistry()
+        first = registry.register(Genre('urn:tva:metadata:cs:ContentCS:2009:3.2', 'SPORTS'))
+        self.assertTrue(registry.register(Genre('urn:tva:metadata:cs:ContentCS:2009:3.2')) is first)
+        self.assertEqual(len(registry), 1)
+
+    def test_frozen(self):
+        # the shared genres cannot be changed, but copies of them can
+        genre = self.registry.get('urn:tva:metadata:cs:ContentCS:2009:3.6')
+        self.assertRaises(AttributeError, setattr, genre, 'name', 'Jazz')
+        self.assertRaises(AttributeError, setattr, self.registry.decode(self.registry.get_encoding(genre)), 'href', 'radio')
+        self.assertEqual(genre.name, 'Music')
+        copy = genre.copy()
+        copy.name = 'Jazz'
+        self.assertEqual((copy.href, copy.name), (genre.href, 'Jazz'))
+
+        # a genre given to the registry is left as it is, and a frozen copy shared
+        registry = GenreRegistry()
+        given = Genre('urn:tva:metadata:cs:ContentCS:2009:3.2', 'SPORTS')
+        shared = registry.register(given)
+        self.assertFalse(shared is given)
+        given.name = 'Sport'
+        self.assertEqual(shared.name, 'SPORTS')
+        self.assertRaises(AttributeError, setattr, shared, 'name', 'Sport')
+        self.assertEqual(pickle.loads(pickle.dumps(shared, 2)).name, 'SPORTS')
+
+    def test_hierarchy(self):
+        early = 'urn:tva:metadata:cs:ContentCS:2009:3.6.1.1'
+        self.assertEqual([x.href for x in self.registry.get_ancestors(early)],
+                         ['urn:tva:metadata:cs:ContentCS:2009:3.6.1', 'urn:tva:metadata:cs:ContentCS:2009:3.6'])
+        self.assertEqual([x.href for x in self.registry.get_ancestors('urn:tva:metadata:cs:ContentCS:2009:3.6.1.7')],
+                         ['urn:tva:metadata:cs:ContentCS:2009:3.6.1', 'urn:tva:metadata:cs:ContentCS:2009:3.6'])
+        descendants = [x.href for x in self.registry.get_descendants('urn:tva:metadata:cs:ContentCS:2009:3.6.1')]
+        self.assertEqual(descendants, [early])
+        self.assertTrue(self.registry.is_ancestor('urn:tva:metadata:cs:ContentCS:2009:3.6', early))
+        self.assertFalse(self.registry.is_ancestor(early, 'urn:tva:metadata:cs:ContentCS:2009:3.6'))
+        self.assertFalse(self.registry.is_ancestor('urn:tva:metadata:cs:ContentCS:2009:3.1', early))
+
+    def test_encoding(self):
+        genre = self.registry.get('urn:tva:metadata:cs:ContentCS:2009:3.6.1.1')
+        bits = encode_genre(genre)
+        self.assertEqual(bits.tobytes(), '\x03\x03\x06\x01\x01')
+        self.assertTrue(decode_genre(bits) is genre)
+
+        # genres outside the registry decode to the year it holds their scheme in
+        bits = encode_genre(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.99'))
+        self.assertEqual(decode_genre(bits).href, 'urn:tva:metadata:cs:ContentCS:2009:3.6.99')
+        bits = encode_genre(Genre('urn:tva:metadata:cs:IntentionCS:2002:1.9'))
+        self.assertEqual(decode_genre(bits).href, 'urn:tva:metadata:cs:IntentionCS:2005:1.9')
+        bits = encode_genre(Genre('urn:tva:metadata:cs:FormatCS:2002:2.1.5'))
+        self.assertEqual(decode_genre(bits).href, 'urn:tva:metadata:cs:FormatCS:2009:2.1.5')
+        self.assertRaises(ValueError, decode_genre, bitarray('00001111'))
+        self.assertRaises(ValueError, GenreRegistry().get_href, '\x03\x03\x06')
+        self.assertRaises(ValueError, encode_genre, Genre('urn:tva:metadata:cs:UnknownCS:2002:4.1'))
+        self.assertRaises(ValueError, encode_genre, Genre('radio'))
+
+    def test_parse_href(self):
+        self.assertEqual(parse_href('urn:tva:metadata:cs:ContentCS:2002:3.6.9'), ('ContentCS', 2002, (3, 6, 9)))
+        self.assertEqual(parse_href('urn:tva:metadata:cs:IntentionCS:2005:1.3"'), None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+"""Reports the time taken to import dabepg and its marshallers into a fresh
+interpreter, and which of the heavier dependencies they load
+
+USAGE: import_benchmark.py [number of runs]"""
+
+import subprocess
+import sys
+
+MODULES = ['dabepg', 'dabepg.xml', 'dabepg.binary']
+DEPENDENCIES = ['dateutil.tz', 'isodate', 'xml.dom.minidom', 'bitarray', 'numpy']
+
+SCRIPT = """
+import sys, time
+start = time.time()
+import %s
+elapsed = time.time() - start
+print elapsed, ' '.join([x for x in %r if x in sys.modules])
+"""
+
+def measure(module):
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT % (module, DEPENDENCIES)])
+    elapsed, loaded = output.strip().split(' ', 1) if ' ' in output.strip() else (output.strip(), '')
+    return float(elapsed), loaded
+
+runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+for module in MODULES:
+    results = [measure(module) for i in range(runs)]
+    times = sorted([x[0] for x in results])
+    print '%-14s median %.1fms, best %.1fms, loads: %s' % (module, times[len(times) // 2] * 1000, times[0] * 1000, results[0][1] or 'none')
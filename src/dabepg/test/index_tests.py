@@ -0,0 +1,152 @@
+import unittest
+
+from dabepg import *
+from dabepg.index import IntervalIndex, GenreIndex
+from dateutil.tz import tzutc
+import datetime
+import pickle
+
+def at(hour, minute=0):
+    return datetime.datetime(2011, 7, 27, hour, minute, tzinfo=tzutc())
+
+def build_programme(shortcrid, hour, hours, *bearers):
+    programme = Programme(shortcrid)
+    programme.locations.append(Location(times=[Time(at(hour), datetime.timedelta(hours=hours))], bearers=list(bearers)))
+    return programme
+
+class IntervalIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = Schedule(created=at(0))
+        self.schedule.programmes.append(build_programme(1, 6, 3, 'e1.ce15.c221.0'))
+        self.schedule.programmes.append(build_programme(2, 9, 1, 'e1.ce15.c221.0', 'e1.ce15.c222.0'))
+        self.schedule.programmes.append(build_programme(3, 10, 2, 'e1.ce15.c221.0'))
+        self.index = IntervalIndex(self.schedule)
+
+    def shortcrids(self, entries):
+        return [x[2].shortcrid for x in entries]
+
+    def test_queries(self):
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c221.0', at(8), at(10))), [1, 2])
+        self.assertEqual(self.shortcrids(self.index.get_range(ContentId('e1', 'ce15', 'c221', '0'), at(9), at(9, 30))), [2])
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c222.0', at(0), at(23))), [2])
+        self.assertEqual(self.shortcrids(self.index.get_at('e1.ce15.c221.0', at(8, 59))), [1])
+        self.assertEqual(self.shortcrids(self.index.get_at('e1.ce15.c221.0', at(12))), [])
+        now, next = self.index.get_now_next('e1.ce15.c221.0', at(9, 30))
+        self.assertEqual((now[2].shortcrid, next[2].shortcrid), (2, 3))
+        self.assertEqual(next[:2], (at(10), at(12)))
+        self.assertEqual(self.index.get_now_next('e1.ce15.c221.0', at(12)), (None, None))
+        self.assertEqual(self.index.get_now_next('e1.ce15.c223.0', at(12)), (None, None))
+
+    def test_updates(self):
+        programmes = self.schedule.programmes
+        programmes.append(build_programme(4, 12, 1, 'e1.ce15.c221.0'))
+        programmes.insert(0, build_programme(5, 5, 1, 'e1.ce15.c221.0'))
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c221.0', at(0), at(23))), [5, 1, 2, 3, 4])
+        programmes.remove(programmes[1])
+        del programmes[-1]
+        programmes[0] = build_programme(6, 4, 1, 'e1.ce15.c222.0')
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c221.0', at(0), at(23))), [2, 3])
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c222.0', at(0), at(23))), [6, 2])
+        programmes[0:2] = [build_programme(7, 1, 1, 'e1.ce15.c222.0')]
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c222.0', at(0), at(23))), [7])
+
+        programme = programmes[-1]
+        programme.locations[0].times[0] = Time(at(20), datetime.timedelta(hours=1))
+        self.schedule.update(programme)
+        self.assertEqual(self.index.get_range('e1.ce15.c221.0', at(0), at(23))[0][:2], (at(20), at(21)))
+
+        self.schedule.programmes = []
+        self.assertEqual(len(self.index), 0)
+        self.index.close()
+        self.schedule.programmes.append(build_programme(8, 1, 1, 'e1.ce15.c222.0'))
+        self.assertEqual(len(self.index), 0)
+
+    def test_duplicates(self):
+        programme = self.schedule.programmes[2]
+        self.schedule.programmes.append(programme)
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c221.0', at(0), at(23))), [1, 2, 3, 3])
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        index = [x for x in schedule.listeners if isinstance(x, IntervalIndex)][0]
+        del schedule.programmes[-1]
+        self.assertEqual(self.shortcrids(index.get_range('e1.ce15.c221.0', at(0), at(23))), [1, 2, 3])
+        self.schedule.programmes.pop()
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c221.0', at(0), at(23))), [1, 2, 3])
+        self.schedule.programmes.remove(programme)
+        self.assertEqual(self.shortcrids(self.index.get_range('e1.ce15.c221.0', at(0), at(23))), [1, 2])
+        self.assertEqual(len(self.index), 3)
+
+    def test_pickle(self):
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        index = [x for x in schedule.listeners if isinstance(x, IntervalIndex)][0]
+        schedule.programmes.append(build_programme(4, 12, 1, 'e1.ce15.c221.0'))
+        self.assertEqual(len(index), 5)
+        del schedule.programmes[1]
+        self.assertEqual(self.shortcrids(index.get_range('e1.ce15.c221.0', at(0), at(23))), [1, 3, 4])
+
+MUSIC = 'urn:tva:metadata:cs:ContentCS:2009:3.6'
+CLASSICAL = 'urn:tva:metadata:cs:ContentCS:2009:3.6.1'
+JAZZ = 'urn:tva:metadata:cs:ContentCS:2002:3.6.2'
+NEWS = 'urn:tva:metadata:cs:ContentCS:2009:3.1.1'
+
+class GenreIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = Schedule(created=at(0))
+        for shortcrid, hrefs in [(1, [CLASSICAL]), (2, [NEWS]), (3, [JAZZ, CLASSICAL]), (4, []), (5, ['radio'])]:
+            programme = build_programme(shortcrid, shortcrid, 1, 'e1.ce15.c221.0')
+            programme.genres.extend([Genre(x) for x in hrefs])
+            self.schedule.programmes.append(programme)
+        self.index = GenreIndex(self.schedule)
+
+    def shortcrids(self, programmes):
+        return [x.shortcrid for x in programmes]
+
+    def test_queries(self):
+        self.assertEqual(self.shortcrids(self.index.get_programmes(MUSIC)), [1, 3])
+        self.assertEqual(self.shortcrids(self.index.get_programmes(Genre(CLASSICAL))), [1, 3])
+        self.assertEqual(self.shortcrids(self.index.get_programmes(('ContentCS', (3, 6, 2)))), [3])
+        self.assertEqual(self.shortcrids(self.index.get_programmes('urn:tva:metadata:cs:ContentCS:2009:3')), [1, 2, 3])
+        self.assertEqual(self.index.get_programmes('urn:tva:metadata:cs:ContentCS:2009:3.2'), [])
+        self.assertEqual(self.index.count(MUSIC), 2)
+        self.assertEqual(len(self.index), 3)
+
+        subgenres = self.index.get_subgenres(MUSIC)
+        self.assertEqual([(x.href, x.name, count) for x, count in subgenres],
+                         [(CLASSICAL, 'Classical music', 2), ('urn:tva:metadata:cs:ContentCS:2009:3.6.2', 'Jazz', 1)])
+        self.assertEqual([(x.href, count) for x, count in self.index.get_subgenres()], [('urn:tva:metadata:cs:ContentCS:2009:3', 3)])
+
+    def test_updates(self):
+        programme = self.schedule.programmes[2]
+        del programme.genres[0]
+        self.schedule.update(programme)
+        self.assertEqual(self.index.get_subgenres(MUSIC)[0][1], 2)
+        self.assertEqual(self.index.get_subgenres(MUSIC)[1:], [])
+        del self.schedule.programmes[0]
+        self.assertEqual(self.shortcrids(self.index.get_programmes(MUSIC)), [3])
+
+    def test_duplicates(self):
+        programme = self.schedule.programmes[0]
+        self.schedule.programmes.append(programme)
+        self.assertEqual(self.shortcrids(self.index.get_programmes(MUSIC)), [1, 3])
+        self.assertEqual(len(self.index), 3)
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        index = [x for x in schedule.listeners if isinstance(x, GenreIndex)][0]
+        del schedule.programmes[0]
+        self.assertEqual(self.shortcrids(index.get_programmes(MUSIC)), [1, 3])
+        self.schedule.programmes.pop()
+        self.assertEqual(self.shortcrids(self.index.get_programmes(CLASSICAL)), [1, 3])
+        self.assertEqual(self.index.count(MUSIC), 2)
+        del self.schedule.programmes[0]
+        self.assertEqual(self.shortcrids(self.index.get_programmes(CLASSICAL)), [3])
+        self.assertEqual(len(self.index), 2)
+
+    def test_pickle(self):
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        index = [x for x in schedule.listeners if isinstance(x, GenreIndex)][0]
+        del schedule.programmes[0]
+        self.assertEqual(self.shortcrids(index.get_programmes(MUSIC)), [3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Reports the memory held per programme by a week long schedule of half hour
+programmes
+
+USAGE: memory_benchmark.py [number of programmes]"""
+
+from dabepg import *
+from dateutil.tz import tzutc
+import datetime
+import sys
+
+def build_schedule(count):
+    schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 0, 0, tzinfo=tzutc()))
+    start = datetime.datetime(2011, 7, 27, 0, 0, 0, tzinfo=tzutc())
+    for i in range(count):
+        programme = Programme(i + 1, crid='crid://example.com/%d' % (i + 1))
+        programme.names.append(ShortName('Show %d' % (i % 100)))
+        programme.names.append(MediumName('The Show %d' % (i % 100)))
+        programme.media.append(ShortDescription('Description of show %d' % (i % 100)))
+        programme.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.7'))
+        programme.locations.append(Location(times=[Time(start + datetime.timedelta(minutes=30 * i), datetime.timedelta(minutes=30))],
+                                            bearers=[Bearer('e1.ce15.c221.0')]))
+        schedule.programmes.append(programme)
+    return schedule
+
+def sizeof(o, seen):
+    """Returns the size of an object and everything reachable from it that has
+    not been seen already, leaving out shared and interned values"""
+
+    if id(o) in seen or isinstance(o, (type, int, long, bool, float, basestring, datetime.tzinfo)) or o is None: return 0
+    seen.add(id(o))
+    size = sys.getsizeof(o)
+    if isinstance(o, (list, tuple)):
+        for x in o: size += sizeof(x, seen)
+    elif isinstance(o, dict):
+        for k, v in o.items(): size += sizeof(k, seen) + sizeof(v, seen)
+    else:
+        if hasattr(o, '__dict__'): size += sizeof(o.__dict__, seen)
+        for cls in type(o).__mro__:
+            for slot in cls.__dict__.get('__slots__', ()):
+                if hasattr(o, slot): size += sizeof(getattr(o, slot), seen)
+    return size
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 336
+programmes = build_schedule(count).programmes
+seen = set()
+total = sum([sizeof(x, seen) for x in programmes])
+print '%d programmes, %d bytes held, %.1f bytes per programme' % (len(programmes), total, float(total) / len(programmes))
@@ -0,0 +1,101 @@
+import unittest
+
+from dabepg import *
+from dabepg.merge import merge, TRIMMED, SPLIT, DROPPED
+from dateutil.tz import tzutc
+import datetime
+
+def at(hour, minute=0):
+    return datetime.datetime(2011, 7, 27, hour, minute, tzinfo=tzutc())
+
+def build_schedule(*programmes):
+    schedule = Schedule(created=at(0))
+    for shortcrid, start, end, bearers in programmes:
+        programme = Programme(shortcrid)
+        programme.names.append(ShortName('Show %d' % shortcrid))
+        programme.locations.append(Location(times=[Time(start, end - start)], bearers=bearers))
+        schedule.programmes.append(programme)
+    return schedule
+
+def get_times(schedule):
+    return [(x.shortcrid, [(str(l.bearers[0]) if len(l.bearers) else None, t.billed_time.hour, t.billed_time.minute,
+                            (t.billed_time + t.billed_duration).hour) for l in x.locations for t in l.times]) for x in schedule.programmes]
+
+class MergeTest(unittest.TestCase):
+
+    def test_merge(self):
+        editorial = build_schedule((1, at(6), at(9), ['e1.ce15.c221.0']),
+                                   (2, at(9), at(12), ['e1.ce15.c221.0']),
+                                   (3, at(6), at(12), ['e1.ce15.c222.0']))
+        news = build_schedule((10, at(7), at(8), ['e1.ce15.c221.0']),
+                              (11, at(11), at(13), ['e1.ce15.c221.0']))
+        music = build_schedule((20, at(6), at(8), ['e1.ce15.c222.0']))
+
+        schedule, conflicts = merge([editorial, news, music], [1, 2, 0])
+        self.assertEqual(get_times(schedule), [(1, [('e1.ce15.c221.0', 6, 0, 7), ('e1.ce15.c221.0', 8, 0, 9)]),
+                                               (3, [('e1.ce15.c222.0', 6, 0, 12)]),
+                                               (10, [('e1.ce15.c221.0', 7, 0, 8)]),
+                                               (2, [('e1.ce15.c221.0', 9, 0, 11)]),
+                                               (11, [('e1.ce15.c221.0', 11, 0, 13)])])
+        self.assertEqual([(x.service, x.start.hour, x.end.hour, x.kept.shortcrid, x.displaced.shortcrid, x.action) for x in conflicts],
+                         [('e1.ce15.c221.0', 7, 8, 10, 1, SPLIT),
+                          ('e1.ce15.c221.0', 11, 12, 11, 2, TRIMMED),
+                          ('e1.ce15.c222.0', 6, 8, 3, 20, DROPPED)])
+
+        # inputs are left as they were, and untouched programmes are not copied
+        self.assertEqual(editorial.programmes[0].get_times()[0][1], datetime.timedelta(hours=3))
+        self.assertTrue(schedule.programmes[1] is editorial.programmes[2])
+
+    def test_shared_location(self):
+        simulcast = build_schedule((1, at(6), at(8), ['e1.ce15.c221.0', 'e1.ce15.c222.0']))
+        optout = build_schedule((2, at(7), at(8), ['e1.ce15.c222.0']))
+        schedule, conflicts = merge([optout, simulcast])
+        programme = schedule.get_programme(1)
+        self.assertEqual([([str(x) for x in l.bearers], [(t.billed_time.hour, t.billed_duration.seconds // 3600) for t in l.times])
+                          for l in programme.locations],
+                         [(['e1.ce15.c221.0'], [(6, 2)]), (['e1.ce15.c222.0'], [(6, 1)])])
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0].action, TRIMMED)
+
+    def test_copies(self):
+        editorial = build_schedule((1, at(6), at(9), ['e1.ce15.c221.0']))
+        location = editorial.programmes[0].locations[0]
+        location.times[0].actual_time = at(6, 5)
+        location.times[0].actual_duration = datetime.timedelta(hours=3)
+        location.times.append(RelativeTime(datetime.timedelta(minutes=15), datetime.timedelta(minutes=5)))
+        news = build_schedule((10, at(7), at(8), ['e1.ce15.c221.0']))
+        schedule, conflicts = merge([editorial, news], [1, 2])
+        programme = schedule.get_programme(1)
+        times = programme.locations[0].times
+        self.assertEqual([(x.billed_time.hour, x.actual_time.hour, x.actual_time.minute, x.actual_duration) for x in times[:2]],
+                         [(6, 6, 5, datetime.timedelta(minutes=55)), (8, 8, 0, datetime.timedelta(minutes=65))])
+        self.assertTrue(isinstance(times[2], RelativeTime))
+        self.assertEqual(times[2].billed_offset, datetime.timedelta(minutes=15))
+
+        # the lists of a rebuilt programme are its own
+        programme.names.append(LongName('The Show'))
+        self.assertEqual(len(editorial.programmes[0].names), 1)
+        self.assertEqual(len(editorial.programmes[0].locations[0].times), 2)
+
+    def test_untimed(self):
+        editorial = build_schedule((1, at(6), at(9), ['e1.ce15.c221.0']), (2, at(7), at(7), ['e1.ce15.c221.0']))
+        editorial.programmes.insert(0, Programme(9))
+        news = build_schedule((10, at(7), at(8), ['e1.ce15.c221.0']))
+        schedule, conflicts = merge([editorial, news], [1, 2])
+        # a programme of no duration is kept, and one with no times goes last
+        self.assertEqual(get_times(schedule), [(1, [('e1.ce15.c221.0', 6, 0, 7), ('e1.ce15.c221.0', 8, 0, 9)]),
+                                               (2, [('e1.ce15.c221.0', 7, 0, 7)]),
+                                               (10, [('e1.ce15.c221.0', 7, 0, 8)]),
+                                               (9, [])])
+        self.assertTrue(schedule.get_programme(2) is editorial.programmes[2])
+        self.assertEqual([(x.kept.shortcrid, x.displaced.shortcrid) for x in conflicts], [(10, 1)])
+
+    def test_ties(self):
+        a = build_schedule((1, at(6), at(8), ['e1.ce15.c221.0']))
+        b = build_schedule((2, at(7), at(9), ['e1.ce15.c221.0']))
+        schedule, conflicts = merge([a, b], [1, 1])
+        self.assertEqual(get_times(schedule), [(1, [('e1.ce15.c221.0', 6, 0, 8)]), (2, [('e1.ce15.c221.0', 8, 0, 9)])])
+        self.assertEqual(merge([], [])[0].programmes, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,282 @@
+import unittest
+
+from dabepg import *
+from dateutil.tz import tzutc
+import datetime
+import pickle
+
+class CompactModelTest(unittest.TestCase):
+
+    def test_slots(self):
+        for o in (Programme(1), ProgrammeEvent(2), Location(), Time(None, None), RelativeTime(None, None),
+                  Bearer('e1.ce15.c221.0'), ContentId('e1', 'ce15'), Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.7'),
+                  ShortName('Show'), LongDescription('A show')):
+            self.assertFalse(hasattr(o, '__dict__'), type(o))
+
+    def test_lazy_lists(self):
+        programme = Programme(1)
+        self.assertFalse(hasattr(programme, '_names'))
+        self.assertEqual(programme.names, [])
+        programme.names.append(ShortName('Show'))
+        self.assertEqual(programme.get_name().text, 'Show')
+        programme.keywords = ['music']
+        self.assertEqual(programme.keywords, ['music'])
+        location = Location(bearers=['e1.ce15.c221.0'])
+        self.assertEqual(location.bearers, [ContentId('e1', 'ce15', 'c221', '0')])
+        self.assertEqual(location.times, [])
+
+    def test_max_length(self):
+        self.assertEqual(MediumName.max_length, 16)
+        self.assertEqual(MediumName('Show').max_length, 16)
+        self.assertEqual(Text('Show', 20).max_length, 20)
+
+    def test_pickle(self):
+        programme = Programme(1, crid='crid://example.com/1')
+        programme.names.append(MediumName('Show'))
+        programme.locations.append(Location(times=[Time(datetime.datetime(2011, 7, 27, 14, 0, tzinfo=tzutc()), datetime.timedelta(hours=1))],
+                                            bearers=[Bearer('e1.ce15.c221.0')]))
+        for protocol in (0, 1, 2):
+            copy = pickle.loads(pickle.dumps(programme, protocol))
+            self.assertEqual(copy.crid, programme.crid)
+            self.assertEqual(copy.names[0].text, 'Show')
+            self.assertEqual(copy.get_times(), programme.get_times())
+            self.assertEqual(str(copy.locations[0].bearers[0]), 'e1.ce15.c221.0')
+            # unset lazy lists stay unset
+            self.assertFalse(hasattr(copy, '_events'))
+        self.assertEqual(pickle.loads(pickle.dumps(RelativeTime(datetime.timedelta(minutes=5), None))).billed_offset, datetime.timedelta(minutes=5))
+        self.assertEqual(pickle.loads(pickle.dumps(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.7', 'Pop'))).name, 'Pop')
+
+class ImportTest(unittest.TestCase):
+
+    def test_lazy_module(self):
+        module = LazyModule('json')
+        self.assertEqual(module.dumps([1]), '[1]')
+        self.assertTrue('dumps' in module.__dict__)
+        self.assertRaises(AttributeError, getattr, module, 'missing')
+
+    def test_created(self):
+        before = now()
+        schedule = Schedule()
+        self.assertTrue(before <= schedule.created <= now())
+        self.assertNotEqual(schedule.created.utcoffset(), None)
+        self.assertEqual(Schedule(created=datetime.datetime(2011, 7, 27, tzinfo=tzutc())).created.year, 2011)
+
+class IdentifierTest(unittest.TestCase):
+
+    def test_contentid(self):
+        a = ContentId.fromstring('e1.ce15.c221.0')
+        self.assertTrue(a is ContentId.fromstring('e1.ce15.c221.0'))
+        self.assertTrue(a is ContentId.fromstring('E1.CE15.C221.0'))
+        self.assertTrue(a is ContentId.intern(ContentId(0xe1, 0xce15, 0xc221, 0)))
+        self.assertTrue(a is Bearer('e1.ce15.c221.0').id)
+        self.assertTrue(a is Location(bearers=[ContentId('e1', 'ce15', 'c221', '0')]).bearers[0])
+        self.assertEqual(ContentId('e1', 'ce15', 'c221', '0'), a)
+        self.assertNotEqual(ContentId('e1', 'ce15', 'c222', '0'), a)
+        self.assertEqual(a, 'e1.ce15.c221.0')
+        self.assertEqual(len(set([a, ContentId('e1', 'ce15', 'c221', '0'), ContentId('e1', 'ce15', 'c222', '0')])), 2)
+        self.assertEqual(len(set([a, 'e1.ce15.c221.0'])), 1)
+        self.assertEqual({'e1.ce15.c221.0': 1}.get(a), 1)
+        self.assertEqual({a: 1}.get('e1.ce15.c221.0'), 1)
+        self.assertNotEqual(a, Programme(1))
+
+        # shared content IDs are frozen, and those passed in to be shared are left as they were
+        self.assertRaises(AttributeError, setattr, a, 'sid', 0xc222)
+        id = ContentId('e1', 'ce15', 'c225', '0')
+        shared = ContentId.intern(id)
+        self.assertFalse(shared is id)
+        id.sid = 0xc226
+        self.assertEqual((str(shared), str(id)), ('e1.ce15.c225.0', 'e1.ce15.c226.0'))
+        self.assertTrue(ContentId.intern(ContentId('e1', 'ce15', 'c225', '0')) is shared)
+        self.assertRaises(ValueError, ContentId.fromstring, 'radio1')
+
+        # frozen ones keep their hash, which copies and pickles work out again
+        self.assertEqual(hash(shared), hash('e1.ce15.c225.0'))
+        copied = shared.copy()
+        copied.sid = 0xc226
+        self.assertEqual(hash(copied), hash('e1.ce15.c226.0'))
+        self.assertEqual(hash(pickle.loads(pickle.dumps(copied, 2))), hash('e1.ce15.c226.0'))
+
+    def test_decode_contentid(self):
+        import dabepg.binary
+        bits = dabepg.binary.encode_contentid(ContentId('e1', 'ce15', 'c221', '0'))
+        self.assertTrue(dabepg.binary.decode_contentid(bits) is ContentId.fromstring('e1.ce15.c221.0'))
+        self.assertTrue(dabepg.binary.decode_contentid(bits) is dabepg.binary.decode_contentid(bits.copy()))
+
+    def test_crid(self):
+        crid = Crid.fromstring('crid://bbc.co.uk/4969758988')
+        self.assertEqual((crid.authority, crid.data), ('bbc.co.uk', '4969758988'))
+        self.assertEqual(str(crid), 'crid://bbc.co.uk/4969758988')
+        self.assertTrue(crid is Crid.fromstring('crid://bbc.co.uk/4969758988'))
+        self.assertEqual(crid, Crid('bbc.co.uk', '4969758988'))
+
+    def test_text(self):
+        name = LongName.intern('The Breakfast Show')
+        self.assertTrue(name is LongName.intern('The Breakfast Show'))
+        self.assertTrue(name.text is ShortDescription.intern('The Breakfast Show').text)
+        self.assertFalse(name is MediumName.intern('The Breakfast Show'))
+        self.assertEqual(name, LongName('The Breakfast Show'))
+        self.assertNotEqual(name, MediumName('The Breakfast Show'))
+        self.assertEqual(len(set([name, LongName('The Breakfast Show'), LongName('The Drive Show')])), 2)
+
+        # shared texts are frozen, but copies of them are not
+        self.assertRaises(AttributeError, setattr, name, 'text', 'The Drive Show')
+        self.assertRaises(AttributeError, setattr, name, 'max_length', 20)
+        self.assertTrue(LongName.intern('The Breakfast Show') is name)
+        copy = name.copy()
+        copy.text = 'The Drive Show'
+        self.assertEqual((name.text, copy.text), ('The Breakfast Show', 'The Drive Show'))
+        name = LongName('The Breakfast Show')
+        name.text = 'The Drive Show'
+        self.assertEqual(name.text, 'The Drive Show')
+        self.assertFalse(hasattr(pickle.loads(pickle.dumps(LongName.intern('The Drive Show'))), '_frozen'))
+
+    def test_parsed_text(self):
+        from dabepg.xml import parse_name, parse_keywords, EPG_NS
+        from xml.etree import ElementTree
+        names = [parse_name(ElementTree.fromstring('<longName xmlns="%s">The Breakfast Show</longName>' % EPG_NS)) for i in range(2)]
+        self.assertTrue(names[0] is names[1])
+        self.assertTrue(isinstance(names[0], LongName))
+        keywords = [parse_keywords(ElementTree.fromstring('<keywords>news, sport</keywords>')) for i in range(2)]
+        self.assertEqual(keywords[0], ['news', 'sport'])
+        self.assertTrue(keywords[0][1] is keywords[1][1])
+
+    def test_scope(self):
+        schedule = Schedule()
+        for bearer in ['e1.ce15.c221.0', 'e1.ce15.c222.0', 'e1.ce15.c221.0']:
+            programme = Programme(1)
+            programme.locations.append(Location(times=[Time(datetime.datetime(2011, 7, 27, 14, 0, tzinfo=tzutc()), datetime.timedelta(hours=1))],
+                                                bearers=[Bearer(bearer)]))
+            schedule.programmes.append(programme)
+        self.assertEqual([str(x) for x in schedule.get_scope().services], ['e1.ce15.c221.0', 'e1.ce15.c222.0'])
+
+class ScopeTrackingTest(unittest.TestCase):
+
+    def build_programme(self, hour, *bearers):
+        programme = Programme(hour)
+        programme.locations.append(Location(times=[Time(datetime.datetime(2011, 7, 27, hour, 0, tzinfo=tzutc()), datetime.timedelta(hours=1))],
+                                            bearers=list(bearers)))
+        return programme
+
+    def assertScope(self, schedule, start, end, services):
+        for scope in (schedule.get_scope(), schedule.compute_scope()):
+            self.assertEqual((scope.start.hour, scope.end.hour), (start, end))
+            self.assertEqual(sorted([str(x) for x in scope.services]), services)
+
+    def test_tracking(self):
+        schedule = Schedule()
+        self.assertEqual(schedule.get_scope(), None)
+        first = self.build_programme(6, 'e1.ce15.c221.0')
+        schedule.programmes.append(first)
+        schedule.programmes.extend([self.build_programme(8, 'e1.ce15.c222.0'), self.build_programme(7, 'e1.ce15.c221.0')])
+        self.assertScope(schedule, 6, 9, ['e1.ce15.c221.0', 'e1.ce15.c222.0'])
+        schedule.programmes.remove(first)
+        self.assertScope(schedule, 7, 9, ['e1.ce15.c221.0', 'e1.ce15.c222.0'])
+        del schedule.programmes[0]
+        self.assertScope(schedule, 7, 8, ['e1.ce15.c221.0'])
+
+        programme = schedule.programmes[0]
+        programme.locations[0].times[0] = Time(datetime.datetime(2011, 7, 27, 10, 0, tzinfo=tzutc()), datetime.timedelta(hours=2))
+        programme.locations[0].bearers.append(ContentId.fromstring('e1.ce15.c223.0'))
+        schedule.update(programme)
+        self.assertScope(schedule, 10, 12, ['e1.ce15.c221.0', 'e1.ce15.c223.0'])
+
+        programme.locations[0].times[0] = Time(datetime.datetime(2011, 7, 27, 11, 0, tzinfo=tzutc()), datetime.timedelta(hours=2))
+        schedule.rebuild_scope()
+        self.assertScope(schedule, 11, 13, ['e1.ce15.c221.0', 'e1.ce15.c223.0'])
+
+        # locations changed in place are found unless the check is skipped
+        programme.locations[0].times[0].billed_time = datetime.datetime(2011, 7, 27, 9, 0, tzinfo=tzutc())
+        programme.locations[0].bearers.pop()
+        self.assertEqual(schedule.get_scope(check=False).start.hour, 11)
+        scope = schedule.get_scope()
+        self.assertEqual((scope.start.hour, scope.end.hour, [str(x) for x in scope.services]), (9, 11, ['e1.ce15.c221.0']))
+        self.assertScope(schedule, 9, 11, ['e1.ce15.c221.0'])
+        from dabepg.xml import marshall
+        programme.locations[0].times[0].billed_time = datetime.datetime(2011, 7, 27, 8, 0, tzinfo=tzutc())
+        self.assertTrue('startTime="2011-07-27T08:00:00+00:00"' in marshall(Epg(schedule)))
+
+        schedule.programmes = []
+        self.assertEqual(schedule.get_scope(), None)
+
+        # as are locations filled in after the programme was added
+        programme = Programme(2)
+        schedule.programmes.append(programme)
+        programme.locations.append(Location(times=[Time(datetime.datetime(2011, 7, 27, 6, 0, tzinfo=tzutc()), datetime.timedelta(hours=1))],
+                                            bearers=[ContentId.fromstring('e1.ce15.c224.0')]))
+        self.assertScope(schedule, 6, 7, ['e1.ce15.c224.0'])
+
+    def test_pickle(self):
+        schedule = Schedule()
+        schedule.programmes.append(self.build_programme(6, 'e1.ce15.c221.0'))
+        schedule = pickle.loads(pickle.dumps(schedule, 2))
+        schedule.programmes.append(self.build_programme(8, 'e1.ce15.c222.0'))
+        del schedule.programmes[0]
+        self.assertScope(schedule, 8, 9, ['e1.ce15.c222.0'])
+
+class KeyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = Schedule()
+        for i in range(5):
+            self.schedule.programmes.append(Programme(i + 1, crid='crid://example.com/%d' % (i + 1)))
+
+    def test_lookup(self):
+        self.assertEqual(self.schedule.get_programme(3).crid, 'crid://example.com/3')
+        self.assertEqual(self.schedule.get_programme(shortcrid='3').crid, 'crid://example.com/3')
+        self.assertEqual(self.schedule.get_programme(crid='crid://example.com/4').shortcrid, 4)
+        self.assertEqual(self.schedule.get_programme(6), None)
+        del self.schedule.programmes[0]
+        self.assertEqual(self.schedule.get_programme(1), None)
+        self.assertEqual(self.schedule.get_programme(crid='crid://example.com/1'), None)
+
+    def test_upsert(self):
+        replaced = self.schedule.programmes[2]
+        self.assertTrue(self.schedule.upsert(Programme(3, version=2)) is replaced)
+        self.assertEqual(self.schedule.programmes[2].version, 2)
+        self.assertEqual(self.schedule.upsert(Programme(30, crid='crid://example.com/4', version=2)).shortcrid, 4)
+        self.assertEqual(self.schedule.programmes[3].shortcrid, 30)
+        self.assertEqual(self.schedule.get_programme(4), None)
+        self.assertEqual(self.schedule.upsert(Programme(6)), None)
+        self.schedule.programmes.insert(0, Programme(7))
+        self.assertEqual(self.schedule.upsert(Programme(6, version=3)).shortcrid, 6)
+        self.assertEqual([(x.shortcrid, x.version) for x in self.schedule.programmes],
+                         [(7, 1), (1, 1), (2, 1), (3, 2), (30, 2), (5, 1), (6, 3)])
+
+    def test_remove(self):
+        self.assertEqual(self.schedule.remove(crid='crid://example.com/2').shortcrid, 2)
+        self.assertEqual(self.schedule.remove(4).shortcrid, 4)
+        self.assertEqual(self.schedule.remove(4), None)
+        self.assertEqual([x.shortcrid for x in self.schedule.programmes], [1, 3, 5])
+
+    def test_shared_keys(self):
+        first, second = Programme(1, crid='crid://example.com/1'), Programme(1, crid='crid://example.com/1')
+        self.schedule.programmes.extend([first, second])
+        self.assertTrue(self.schedule.get_programme(1) is second)
+        self.assertTrue(self.schedule.remove(1) is second)
+        self.assertTrue(self.schedule.get_programme(crid='crid://example.com/1') is first)
+        self.assertTrue(self.schedule.remove(1) is first)
+        original = self.schedule.programmes[0]
+        self.assertTrue(self.schedule.remove(1) is original)
+        self.assertEqual(self.schedule.get_programme(1), None)
+
+    def test_positions(self):
+        for i in range(5, 20): self.schedule.programmes.append(Programme(i + 1))
+        self.schedule.get_position(self.schedule.programmes[0])
+        for shortcrid in (2, 10, 3, 20, 1):
+            self.assertEqual(self.schedule.remove(shortcrid).shortcrid, shortcrid)
+        # removals are counted off the positions rather than every position counted again
+        self.assertEqual(len(self.schedule.removed), 5)
+        self.schedule.upsert(Programme(21))
+        self.assertEqual([self.schedule.get_position(x) for x in self.schedule.programmes], range(16))
+        self.assertEqual(len(self.schedule.removed), 5)
+        self.schedule.replace(self.schedule.get_programme(11), Programme(22))
+        self.assertEqual(self.schedule.get_position(self.schedule.get_programme(22)), 6)
+        self.assertEqual([x.shortcrid for x in self.schedule.programmes], [4, 5, 6, 7, 8, 9, 22, 12, 13, 14, 15, 16, 17, 18, 19, 21])
+
+    def test_pickle(self):
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        schedule.upsert(Programme(2, version=4))
+        self.assertEqual(schedule.programmes[1].version, 4)
+
+if __name__ == "__main__":
+    unittest.main()
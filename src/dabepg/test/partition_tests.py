@@ -0,0 +1,71 @@
+import unittest
+
+from dabepg import *
+from dabepg.partition import partition, get_days
+from dateutil.tz import tzutc, tzoffset
+import datetime
+
+def at(day, hour, minute=0):
+    return datetime.datetime(2011, 7, day, hour, minute, tzinfo=tzutc())
+
+def build_schedule(*programmes):
+    schedule = Schedule(created=at(27, 0), version=3)
+    for shortcrid, start, end, bearers in programmes:
+        programme = Programme(shortcrid)
+        programme.names.append(ShortName('Show %d' % shortcrid))
+        programme.locations.append(Location(times=[Time(start, end - start)], bearers=bearers))
+        schedule.programmes.append(programme)
+    return schedule
+
+def get_documents(schedule, tz=None):
+    return [(filename, [x.shortcrid for x in epg.schedule.programmes]) for filename, epg in partition(schedule, tz)]
+
+class PartitionTest(unittest.TestCase):
+
+    def test_partition(self):
+        schedule = build_schedule((1, at(27, 6), at(27, 9), ['e1.ce15.c221.0']),
+                                  (2, at(27, 22), at(28, 1), ['e1.ce15.c221.0', 'e1.ce15.c222.0']),
+                                  (3, at(28, 1), at(28, 3), ['e1.ce15.c221.0']),
+                                  (4, at(27, 23), at(28, 0), ['e1.ce15.c222.0']))
+        self.assertEqual(get_documents(schedule), [('20110727_e1_ce15_c221_0_PI.xml', [1, 2]),
+                                                   ('20110727_e1_ce15_c222_0_PI.xml', [2, 4]),
+                                                   ('20110728_e1_ce15_c221_0_PI.xml', [2, 3]),
+                                                   ('20110728_e1_ce15_c222_0_PI.xml', [2])])
+
+        # programmes are copied, and the header is carried over
+        filename, epg = list(partition(schedule))[0]
+        self.assertFalse(epg.schedule.programmes[0] is schedule.programmes[0])
+        self.assertEqual(epg.schedule.programmes[0].names, schedule.programmes[0].names)
+        self.assertEqual(epg.schedule.version, 3)
+        self.assertEqual(epg.schedule.get_scope().start, at(27, 6))
+
+    def test_restrict(self):
+        schedule = build_schedule((1, at(27, 6), at(27, 9), ['e1.ce15.c221.0', 'e1.ce15.c222.0']))
+        schedule.programmes[0].locations[0].times.append(Time(at(28, 6), datetime.timedelta(hours=3)))
+        documents = list(partition(schedule))
+        self.assertEqual([x[0] for x in documents], ['20110727_e1_ce15_c221_0_PI.xml', '20110727_e1_ce15_c222_0_PI.xml',
+                                                     '20110728_e1_ce15_c221_0_PI.xml', '20110728_e1_ce15_c222_0_PI.xml'])
+
+        # each document holds only the times of its day on the bearers of its service
+        schedule = documents[3][1].schedule
+        programme = schedule.programmes[0]
+        self.assertEqual([str(x) for x in programme.locations[0].bearers], ['e1.ce15.c222.0'])
+        self.assertEqual(programme.get_times(), [(at(28, 6), datetime.timedelta(hours=3))])
+        scope = schedule.get_scope()
+        self.assertEqual((scope.start, scope.end, [str(x) for x in scope.services]), (at(28, 6), at(28, 9), ['e1.ce15.c222.0']))
+        programme.names.append(LongName('The Show'))
+        self.assertEqual(len(documents[0][1].schedule.programmes[0].names), 1)
+
+    def test_local_days(self):
+        schedule = build_schedule((1, at(27, 22, 30), at(27, 23, 30), ['e1.ce15.c221.0']))
+        self.assertEqual(get_documents(schedule), [('20110727_e1_ce15_c221_0_PI.xml', [1])])
+        self.assertEqual(get_documents(schedule, tzoffset('BST', 3600)), [('20110727_e1_ce15_c221_0_PI.xml', [1]),
+                                                                          ('20110728_e1_ce15_c221_0_PI.xml', [1])])
+
+    def test_days(self):
+        self.assertEqual(get_days(at(27, 23), datetime.timedelta(hours=1)), [datetime.date(2011, 7, 27)])
+        self.assertEqual(get_days(at(27, 0), datetime.timedelta()), [datetime.date(2011, 7, 27)])
+        self.assertEqual(len(get_days(at(27, 12), datetime.timedelta(days=2))), 3)
+
+if __name__ == "__main__":
+    unittest.main()
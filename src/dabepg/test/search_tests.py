@@ -0,0 +1,82 @@
+import unittest
+
+from dabepg import *
+from dabepg.search import SearchIndex, tokenize
+from dateutil.tz import tzutc
+import datetime
+import pickle
+
+def build_programme(shortcrid, name, description=None, keywords=()):
+    programme = Programme(shortcrid)
+    programme.names.append(LongName(name))
+    if description is not None: programme.media.append(ShortDescription(description))
+    programme.keywords.extend(keywords)
+    return programme
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = Schedule(created=datetime.datetime(2011, 7, 27, tzinfo=tzutc()))
+        self.schedule.programmes.append(build_programme(1, 'Jazz Line-Up', 'The best new jazz'))
+        self.schedule.programmes.append(build_programme(2, 'Breakfast Show', 'News, travel and jazzy tunes', ['music']))
+        self.schedule.programmes.append(build_programme(3, 'The News', 'Headlines', ['news', 'current affairs']))
+        self.index = SearchIndex(self.schedule)
+
+    def shortcrids(self, programmes):
+        return [x.shortcrid for x in programmes]
+
+    def test_search(self):
+        self.assertEqual(self.shortcrids(self.index.search('news', prefix=False)), [3, 2])
+        self.assertEqual(self.shortcrids(self.index.search('jazz', prefix=False)), [1])
+        self.assertEqual(self.shortcrids(self.index.search('JAZ')), [1, 2])
+        self.assertEqual(self.shortcrids(self.index.search('news jaz')), [2])
+        self.assertEqual(self.shortcrids(self.index.search('affairs')), [3])
+        self.assertEqual(self.shortcrids(self.index.search('news', limit=1)), [3])
+        self.assertEqual(self.index.search('weather'), [])
+        self.assertEqual(self.index.search(''), [])
+        self.assertEqual(self.index.complete('ja'), [u'jazz', u'jazzy'])
+
+    def test_updates(self):
+        programme = self.schedule.programmes[0]
+        programme.names[0] = LongName('Late Night Jazz')
+        self.schedule.update(programme)
+        self.assertEqual(self.shortcrids(self.index.search('line')), [])
+        self.assertEqual(self.shortcrids(self.index.search('late night')), [1])
+        del self.schedule.programmes[0]
+        self.assertEqual(self.shortcrids(self.index.search('jazz')), [2])
+        self.assertEqual(self.index.complete('l'), [])
+        self.schedule.programmes.append(build_programme(4, 'Jazz Club'))
+        self.assertEqual(self.shortcrids(self.index.search('jazz')), [4, 2])
+
+    def test_duplicates(self):
+        programme = self.schedule.programmes[2]
+        self.schedule.programmes.append(programme)
+        self.assertEqual(self.shortcrids(self.index.search('news', limit=5)), [3, 2])
+        self.assertEqual(self.shortcrids(self.index.search('news jaz')), [2])
+        self.assertEqual(len(self.index), 3)
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        index = [x for x in schedule.listeners if isinstance(x, SearchIndex)][0]
+        schedule.programmes.pop()
+        self.assertEqual(self.shortcrids(index.search('news', prefix=False)), [3, 2])
+        self.schedule.programmes.pop()
+        self.assertEqual(self.shortcrids(self.index.search('news', limit=5)), [3, 2])
+        self.assertEqual(self.index.complete('af'), [u'affairs'])
+        del self.schedule.programmes[2]
+        self.assertEqual(self.shortcrids(self.index.search('news', limit=5)), [2])
+        self.assertEqual(self.index.complete('af'), [])
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search('headlines'), [])
+
+    def test_pickle(self):
+        schedule = pickle.loads(pickle.dumps(self.schedule, 2))
+        index = [x for x in schedule.listeners if isinstance(x, SearchIndex)][0]
+        self.assertEqual(self.shortcrids(index.search('news', prefix=False)), [3, 2])
+        del schedule.programmes[2]
+        self.assertEqual(self.shortcrids(index.search('news')), [2])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Line-Up: The Best'), [u'line', u'up', u'the', u'best'])
+        self.assertEqual(tokenize('Caf\xc3\xa9 Society'), [u'caf\xe9', u'society'])
+
+if __name__ == "__main__":
+    unittest.main()
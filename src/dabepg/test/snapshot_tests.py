@@ -0,0 +1,119 @@
+import unittest
+
+from dabepg import *
+from dateutil.tz import tzutc, tzoffset
+import dabepg.snapshot as snapshot
+import datetime
+import tempfile
+import os
+
+class SnapshotTest(unittest.TestCase):
+
+    def build_schedule(self):
+        schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 3, 35, tzinfo=tzutc()), version=3, originator='Global Radio')
+        for i in range(3):
+            programme = Programme(i + 1, crid='crid://example.com/%d' % (i + 1), bitrate=160 if i else None, recommendation=bool(i))
+            programme.names.append(MediumName.intern('Show %d' % (i % 2)))
+            programme.names.append(LongName('The Show'))
+            programme.media.append(ShortDescription('Music and chat'))
+            programme.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2009:3.6.1', 'Music'))
+            programme.keywords = ['music', 'chat']
+            start = datetime.datetime(2011, 7, 27, 6 + i, 0, tzinfo=tzoffset(None, 3600 * i))
+            programme.locations.append(Location(times=[Time(start, datetime.timedelta(hours=1), start + datetime.timedelta(seconds=30, microseconds=250), datetime.timedelta(minutes=58))],
+                                                bearers=[ContentId('e1', 'ce15', 'c221', '0')]))
+            programme.locations[0].bearers.append(Bearer('e1.ce15.c222.0'))
+            schedule.programmes.append(programme)
+        programme = schedule.programmes[0]
+        programme.memberships.append(Membership(50, 'crid://example.com/group', 2))
+        programme.links.append(Link('http://example.com', description='Home'))
+        programme.media.append(Multimedia('http://example.com/logo.png', Multimedia.LOGO_COLOUR_SQUARE))
+        event = ProgrammeEvent(7, crid='crid://example.com/1/7', version=2)
+        event.names.append(ShortName('Event'))
+        event.locations.append(Location(times=[RelativeTime(datetime.timedelta(minutes=15), datetime.timedelta(minutes=5))]))
+        event.locations[0].bearers.append(Bearer('e1.ce15.c221.0', '0a1b2c3d'))
+        programme.events.append(event)
+        return schedule
+
+    def test_schedule(self):
+        schedule = self.build_schedule()
+        copy = snapshot.unmarshall(snapshot.marshall(Epg(schedule, Epg.DRM)))
+        self.assertEqual(copy.type, Epg.DRM)
+        copy = copy.schedule
+        self.assertEqual((copy.created, copy.version, copy.originator), (schedule.created, 3, 'Global Radio'))
+        self.assertEqual(len(copy.programmes), 3)
+        for programme, original in zip(copy.programmes, schedule.programmes):
+            for field in ('shortcrid', 'crid', 'version', 'bitrate', 'onair', 'recommendation', 'names', 'keywords'):
+                self.assertEqual(getattr(programme, field), getattr(original, field))
+            self.assertEqual(programme.media[0], original.media[0])
+            self.assertEqual([x.href for x in programme.genres], [x.href for x in original.genres])
+            time, other = programme.locations[0].times[0], original.locations[0].times[0]
+            self.assertEqual((time.billed_time, time.billed_duration, time.actual_time, time.actual_duration),
+                             (other.billed_time, other.billed_duration, other.actual_time, other.actual_duration))
+            self.assertEqual(time.billed_time.utcoffset(), other.billed_time.utcoffset())
+            self.assertEqual(programme.locations[0].bearers, original.locations[0].bearers)
+            self.assertTrue(isinstance(programme.locations[0].bearers[1], Bearer))
+
+        # the lists that were never used are left unallocated
+        self.assertFalse(hasattr(copy.programmes[1], '_events'))
+        self.assertFalse(hasattr(copy.programmes[1], '_links'))
+
+        programme = copy.programmes[0]
+        self.assertEqual((programme.memberships[0].shortcrid, programme.memberships[0].index), (50, 2))
+        self.assertEqual((str(programme.links[0]), programme.links[0].description), ('http://example.com', 'Home'))
+        self.assertEqual(programme.media[1].type, Multimedia.LOGO_COLOUR_SQUARE)
+        event = programme.events[0]
+        self.assertEqual((event.shortcrid, event.crid, event.version, event.names[0].text), (7, 'crid://example.com/1/7', 2, 'Event'))
+        self.assertEqual(event.locations[0].times[0].billed_offset, datetime.timedelta(minutes=15))
+        self.assertEqual(event.locations[0].bearers[0].trigger, '0a1b2c3d')
+
+        # values are shared, and the built in indexes counted when first used,
+        # taking in changes made before then
+        self.assertTrue(copy.programmes[0].names[0] is copy.programmes[2].names[0])
+        self.assertTrue(copy.programmes[0].locations[0].bearers[0] is ContentId.fromstring('e1.ce15.c221.0'))
+        self.assertEqual(copy.key_index.deferred, copy.programmes)
+        removed = copy.programmes.pop()
+        copy.programmes.append(Programme(9))
+        self.assertEqual(copy.key_index.deferred, None)
+        self.assertTrue(copy.get_programme(2) is copy.programmes[1])
+        self.assertTrue(copy.get_programme(9) is copy.programmes[2])
+        self.assertEqual(copy.get_programme(3), None)
+        self.assertEqual(copy.get_scope().start, schedule.get_scope().start)
+        self.assertEqual(copy.get_scope().end, schedule.programmes[1].get_times()[0][0] + datetime.timedelta(hours=1))
+
+    def test_serviceinfo(self):
+        info = ServiceInfo(datetime.datetime(2011, 7, 27, tzinfo=tzutc()), originator='Global Radio')
+        ensemble = Ensemble(ContentId('e1', 'ce15'))
+        ensemble.names.append(ShortName('Digital1'))
+        service = Service(ContentId('e1', 'ce15', 'c221', '0'), bitrate=128)
+        service.names.append(MediumName('Heart'))
+        service.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.9'))
+        ensemble.services.append(service)
+        info.ensembles.append(ensemble)
+        copy = snapshot.unmarshall(snapshot.marshall(info))
+        self.assertTrue(isinstance(copy, ServiceInfo))
+        self.assertEqual((copy.created, copy.originator), (info.created, 'Global Radio'))
+        service = copy.ensembles[0].services[0]
+        self.assertEqual((service.ids, service.bitrate, service.get_name().text), ([ContentId('e1', 'ce15', 'c221', '0')], 128, 'Heart'))
+        self.assertEqual(service.genres[0].href, 'urn:tva:metadata:cs:ContentCS:2002:3.6.9')
+
+    def test_input(self):
+        data = snapshot.marshall(self.build_schedule())
+        fd, path = tempfile.mkstemp()
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            self.assertEqual(len(snapshot.unmarshall(path).programmes), 3)
+            f = open(path, 'rb')
+            try: self.assertEqual(len(snapshot.unmarshall(f).programmes), 3)
+            finally: f.close()
+        finally:
+            os.remove(path)
+
+    def test_invalid(self):
+        data = snapshot.marshall(self.build_schedule())
+        self.assertRaises(ValueError, snapshot.SnapshotReader().read, data.replace(' %d\n' % snapshot.FORMAT_VERSION, ' 0\n', 1))
+        self.assertRaises(ValueError, snapshot.SnapshotReader().read, '<epg/>')
+        self.assertRaises(ValueError, snapshot.marshall, Epg(Schedule(originator=object())))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+
+from dabepg import *
+from dabepg.store import EpgStore
+from dabepg.test import build_schedule
+from dateutil.tz import tzutc, tzoffset
+import dabepg.store
+import dabepg.xml
+import datetime
+import tempfile
+import shutil
+import os
+
+class EpgStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = EpgStore()
+        self.schedule = build_schedule(datetime.datetime(2011, 7, 27, tzinfo=tzoffset(None, 3600)),
+                                       created=datetime.datetime(2011, 7, 27, tzinfo=tzutc()), originator='Global Radio')
+        for programme in self.schedule.programmes: programme.keywords = ['music']
+        first = self.schedule.programmes[0]
+        first.memberships.append(Membership(50, 'crid://example.com/group', 2))
+        first.locations[0].times.append(Time(datetime.datetime(2011, 7, 27, 12, 0, 0, 500, tzinfo=tzutc()), datetime.timedelta(minutes=30),
+                                             datetime.datetime(2011, 7, 27, 12, 1, tzinfo=tzutc()), datetime.timedelta(minutes=29)))
+        first.locations.append(Location(bearers=[ContentId('e1', 'ce15', 'c223', '0')]))
+        first.links.append(Link('http://example.com'))
+        first.media.insert(0, Multimedia('http://example.com/logo.png', Multimedia.LOGO_COLOUR_SQUARE))
+        event = ProgrammeEvent(7)
+        event.locations.append(Location(times=[RelativeTime(datetime.timedelta(minutes=15), datetime.timedelta(minutes=5))]))
+        first.events.append(event)
+        self.store.add_schedule(self.schedule)
+
+    def test_programme(self):
+        self.assertEqual(len(self.store), 48)
+        programme = self.store.get_programme(crid='crid://example.com/1')
+        original = self.schedule.programmes[0]
+        self.assertEqual((programme.shortcrid, programme.crid, programme.version, programme.onair), (1, 'crid://example.com/1', 1, True))
+        self.assertEqual(programme.names, original.names)
+        self.assertTrue(programme.names[0] is MediumName.intern('Show 0'))
+        self.assertEqual(programme.media[0].type, Multimedia.LOGO_COLOUR_SQUARE)
+        self.assertEqual(programme.media[1], ShortDescription('Music and chat'))
+        self.assertEqual(programme.keywords, ['music'])
+        self.assertEqual([(x.href, x.name) for x in programme.genres], [('urn:tva:metadata:cs:ContentCS:2009:3.6.0', 'Music')])
+        self.assertEqual((programme.memberships[0].shortcrid, programme.memberships[0].crid, programme.memberships[0].index),
+                         (50, 'crid://example.com/group', 2))
+        self.assertEqual(programme.get_times(), original.get_times())
+        self.assertEqual(programme.get_times()[0][0].utcoffset(), datetime.timedelta(hours=1))
+        time = programme.locations[0].times[1]
+        self.assertEqual((time.actual_time, time.actual_duration), (datetime.datetime(2011, 7, 27, 12, 1, tzinfo=tzutc()), datetime.timedelta(minutes=29)))
+        self.assertEqual(time.billed_time.microsecond, 500)
+        self.assertTrue(isinstance(programme.locations[0].bearers[0], Bearer))
+        self.assertTrue(programme.locations[0].bearers[0].id is ContentId.fromstring('e1.ce15.c222.0'))
+        self.assertTrue(programme.locations[1].bearers[0] is ContentId.fromstring('e1.ce15.c223.0'))
+        self.assertEqual(str(programme.links[0]), 'http://example.com')
+        self.assertEqual(programme.events[0].locations[0].times[0].billed_offset, datetime.timedelta(minutes=15))
+        self.assertEqual(self.store.get_programme(48).crid, 'crid://example.com/48')
+        self.assertEqual(self.store.get_programme(49), None)
+
+    def test_queries(self):
+        start = datetime.datetime(2011, 7, 27, 10, 30, tzinfo=tzutc())
+        end = datetime.datetime(2011, 7, 27, 13, 0, tzinfo=tzutc())
+        programmes = self.store.get_programmes(start, end, batch=2)
+        self.assertFalse(isinstance(programmes, list))
+        # the first programme starts the evening before, and has a time in the window too
+        self.assertEqual([x.shortcrid for x in programmes], [1, 12, 13, 14])
+        self.assertEqual([x.shortcrid for x in self.store.get_programmes(start, end, service='e1.ce15.c221.0')], [12, 14])
+        self.assertEqual([x.shortcrid for x in self.store.get_programmes(service=ContentId('e1', 'ce15', 'c223', '0'))], [1])
+        self.assertEqual([x.shortcrid for x in self.store.get_programmes(crid='crid://example.com/5')], [5])
+        self.assertEqual(len(list(self.store.get_programmes(genre='urn:tva:metadata:cs:ContentCS:2009:3.6.1'))), 16)
+        self.assertEqual(len(self.store.get_schedule(start, end).programmes), 4)
+
+        # programmes are looked up in chunks, whatever the batch
+        expected = [(x.shortcrid, x.names, x.genres[0].href, x.get_times()) for x in self.store.get_programmes(batch=1000)]
+        ids = dabepg.store.MAX_IDS
+        dabepg.store.MAX_IDS = 5
+        try:
+            self.assertEqual([(x.shortcrid, x.names, x.genres[0].href, x.get_times()) for x in self.store.get_programmes(batch=1000)], expected)
+        finally:
+            dabepg.store.MAX_IDS = ids
+
+    def test_export(self):
+        start = datetime.datetime(2011, 7, 27, 0, 0, tzinfo=tzutc())
+        end = datetime.datetime(2011, 7, 28, 6, 0, tzinfo=tzutc())
+        documents = list(self.store.export(start, end))
+        self.assertEqual([x[0] for x in documents], ['20110727_e1_ce15_c221_0_PI.xml', '20110727_e1_ce15_c222_0_PI.xml',
+                                                      '20110728_e1_ce15_c221_0_PI.xml', '20110728_e1_ce15_c222_0_PI.xml'])
+        self.assertEqual([x.shortcrid for x in documents[1][1].schedule.programmes], [1, 3, 5, 7, 9, 11, 13, 15, 17, 19, 21, 23, 25])
+        # the first programme keeps only its time on that day, on that service
+        programme = documents[1][1].schedule.programmes[0]
+        self.assertEqual([str(x) for x in programme.locations[0].bearers], ['e1.ce15.c222.0'])
+        self.assertEqual([x[0].hour for x in programme.get_times()], [12])
+        self.assertEqual([x.shortcrid for x in documents[2][1].schedule.programmes], [26, 28, 30])
+        # bounds without a timezone are in UTC
+        naive = list(self.store.export(start.replace(tzinfo=None), end.replace(tzinfo=None)))
+        self.assertEqual([x[0] for x in naive], [x[0] for x in documents])
+        filename, data = self.store.export(start, end, marshall=dabepg.xml.marshall).next()
+        self.assertEqual(filename, '20110727_e1_ce15_c221_0_PI.xml')
+        self.assertTrue('Show 1' in data)
+
+    def test_serviceinfo(self):
+        self.assertEqual(self.store.get_serviceinfo(), None)
+        for day in (27, 28):
+            info = ServiceInfo(datetime.datetime(2011, 7, day, tzinfo=tzutc()), originator='Global Radio %d' % day)
+            info.ensembles.append(Ensemble(ContentId('e1', 'ce15')))
+            self.store.add_serviceinfo(info)
+        self.assertEqual(self.store.get_serviceinfo().originator, 'Global Radio 28')
+        info = self.store.get_serviceinfo(datetime.datetime(2011, 7, 27, 12, tzinfo=tzutc()))
+        self.assertEqual((info.originator, str(info.ensembles[0])), ('Global Radio 27', 'e1.ce15'))
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'epg.db')
+            store = EpgStore(path)
+            store.add_programmes(self.schedule.programmes[:3])
+            store.close()
+            store = EpgStore(path)
+            self.assertEqual([x.shortcrid for x in store.get_programmes()], [1, 2, 3])
+            store.close()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+
+from dabepg import *
+from dabepg.transcode import xml_to_binary, binary_to_xml
+from dabepg.binary import Element, Attribute, CData, encode_header, encode_contentid
+from dateutil.tz import tzutc
+import dabepg.xml
+import dabepg.binary
+import datetime
+import re
+
+class XmlToBinaryTest(unittest.TestCase):
+
+    def test_schedule(self):
+        xml = open('test/PI.xml').read()
+        data = xml_to_binary(xml)
+
+        # the object model path does not parse memberOf, and reads shortIds as strings
+        epg = dabepg.xml.unmarshall(re.sub(r'<memberOf[^>]*>', '', xml))
+        for programme in epg.schedule.programmes:
+            programme.shortcrid = int(programme.shortcrid)
+            for event in programme.events: event.shortcrid = int(event.shortcrid)
+        self.assertTrue('crid://www.bbc.co.uk/WorldwideGroup' in data)
+        self.assertEqual(xml_to_binary(re.sub(r'<memberOf[^>]*>', '', xml)), dabepg.binary.marshall(epg))
+
+        epg = dabepg.binary.unmarshall(data)
+        self.assertEqual(len(epg.schedule.programmes), 1)
+        programme = epg.schedule.programmes[0]
+        self.assertEqual(programme.shortcrid, 213456)
+        self.assertEqual([x.text for x in programme.names], ['Gilles Peterson', 'Gilles Peterson: Worldwide'])
+        self.assertEqual(str(programme.locations[0].bearers[0]), 'e1.ce15.c221.0')
+
+    def test_serviceinfo(self):
+        info = ServiceInfo(version=2, originator='BBC', provider='BBC', created=datetime.datetime(2001, 02, 28, 0, 0, 0, 0))
+        ensemble = Ensemble(ContentId('e1', 'ce15'))
+        info.ensembles.append(ensemble)
+        ensemble.frequencies.append(225648)
+        ensemble.names.append(ShortName('BBC'))
+        ensemble.names.append(MediumName('BBC National'))
+        radio1 = Service(ContentId('e1', 'ce15', 'c221', '0'), bitrate=160)
+        radio1.names.append(ShortName('Radio 1'))
+        radio1.names.append(MediumName('BBC Radio 1'))
+        radio1.media.append(ShortDescription('Rock and pop music from the BBC.'))
+        radio1.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.7', 'Rap/Hip Hop/Reggae'))
+        radio1.keywords.extend(['music', 'pop'])
+        ensemble.services.append(radio1)
+        radio2 = Service(ContentId('e1', 'ce15', 'c222', '0'))
+        radio2.names.append(ShortName('Radio 2'))
+        ensemble.services.append(radio2)
+
+        xml = '''<?xml version="1.0" encoding="UTF-8"?>
+<serviceInformation creationTime="2001-02-28T00:00:00" originator="BBC" serviceProvider="BBC" version="2" xml:lang="en"
+    xmlns="http://www.worlddab.org/schemas/epgSI/14" xmlns:epg="http://www.worlddab.org/schemas/epgDataTypes/14">
+    <ensemble id="e1.ce15">
+        <epg:shortName>BBC</epg:shortName>
+        <epg:mediumName>BBC National</epg:mediumName>
+        <frequency kHz="225648" type="primary"/>
+        <service bitrate="160">
+            <serviceID id="e1.ce15.c221.0"/>
+            <epg:shortName>Radio 1</epg:shortName>
+            <epg:mediumName>BBC Radio 1</epg:mediumName>
+            <mediaDescription>
+                <epg:shortDescription><![CDATA[Rock and pop music from the BBC.]]></epg:shortDescription>
+            </mediaDescription>
+            <epg:genre href="urn:tva:metadata:cs:ContentCS:2002:3.6.7"/>
+            <keywords><![CDATA[music, pop]]></keywords>
+        </service>
+        <service>
+            <serviceID id="e1.ce15.c222.0"/>
+            <epg:shortName>Radio 2</epg:shortName>
+        </service>
+    </ensemble>
+</serviceInformation>'''
+        self.assertEqual(xml_to_binary(xml), dabepg.binary.marshall(info))
+
+class BinaryToXmlTest(unittest.TestCase):
+
+    def test_roundtrip(self):
+        schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 3, 35, tzinfo=tzutc()), version=2, originator='Global Radio')
+        programme = Programme(213456, crid='crid://bbc.co.uk/4969758988')
+        programme.names.append(MediumName('Gilles Peterson'))
+        programme.names.append(LongName('Gilles Peterson: Worldwide'))
+        programme.locations.append(Location(times=[Time(datetime.datetime(2003, 12, 18, 14, 0, 0, tzinfo=tzutc()), datetime.timedelta(hours=2))],
+                                            bearers=[Bearer('e1.ce15.c221.0')]))
+        programme.media.append(ShortDescription('Gilles Peterson brings you two hours of global beats & the best of cool.'))
+        programme.genres.append(Genre('urn:tva:metadata:cs:ContentCS:2002:3.6.7'))
+        event = ProgrammeEvent(6353, recommendation=True)
+        event.names.append(ShortName('Herbert'))
+        event.locations.append(Location(times=[RelativeTime(datetime.timedelta(minutes=45), datetime.timedelta(minutes=15))]))
+        programme.events.append(event)
+        schedule.programmes.append(programme)
+
+        data = dabepg.binary.marshall(Epg(schedule))
+        xml = binary_to_xml(data)
+        self.assertTrue('<epg:mediumName>Gilles Peterson</epg:mediumName>' in xml)
+        self.assertTrue('<epg:time duration="PT2H" time="2003-12-18T14:00:00+00:00"/>' in xml)
+        self.assertTrue('<![CDATA[Gilles Peterson brings you two hours of global beats & the best of cool.]]>' in xml)
+        self.assertEqual(xml_to_binary(xml), data)
+
+    def test_tokens_and_default_contentid(self):
+        programme = Element(0x1c, [Attribute(0x81, 1, 24)])
+        programme.children.append(Element(0x11, cdata=CData('\x01 Show')))
+        programme.children.append(Element(0x19, children=[Element(0x2c, [Attribute(0x80, datetime.datetime(2010, 7, 30, 12, 0, tzinfo=tzutc())),
+                                                                          Attribute(0x81, datetime.timedelta(hours=1))])]))
+        data = Element(0x21, children=[programme]).tobytes().tobytes()
+        data = encode_header(0x04, 9) + '\x01\x07Evening' + data
+        contentid = encode_contentid(ContentId.fromstring('e1.ce15.c221.0')).tobytes()
+        data = encode_header(0x05, len(contentid)) + contentid + data
+        data = encode_header(0x02, len(data)) + data
+
+        xml = binary_to_xml(data)
+        self.assertTrue('<epg:mediumName>Evening Show</epg:mediumName>' in xml)
+        self.assertTrue('<epg:bearer id="e1.ce15.c221.0"/>' in xml)
+
+if __name__ == "__main__":
+    unittest.main()
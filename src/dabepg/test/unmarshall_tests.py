@@ -0,0 +1,72 @@
+import unittest
+
+from dabepg import *
+from dateutil.tz import tzutc
+import dabepg.xml
+import dabepg.binary
+import datetime
+import tempfile
+import re
+import os
+
+class UnmarshallInputTest(unittest.TestCase):
+
+    def setUp(self):
+        schedule = Schedule(created=datetime.datetime(2011, 7, 27, 14, 3, 35, tzinfo=tzutc()), version=2, originator='Global Radio')
+        programme = Programme(213456, crid='crid://bbc.co.uk/4969758988')
+        programme.names.append(MediumName('Gilles Peterson'))
+        programme.locations.append(Location(times=[Time(datetime.datetime(2003, 12, 18, 14, 0, 0, tzinfo=tzutc()), datetime.timedelta(hours=2))],
+                                            bearers=[Bearer('e1.ce15.c221.0')]))
+        schedule.programmes.append(programme)
+        self.binary = dabepg.binary.marshall(Epg(schedule))
+        self.xml = re.sub(r'<memberOf[^>]*>', '', open('test/PI.xml').read())
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths: os.remove(path)
+
+    def write(self, data):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+    def test_binary(self):
+        path = self.write(self.binary)
+        for i in (self.binary, path, open(path, 'rb')):
+            epg = dabepg.binary.unmarshall(i)
+            self.assertEqual(epg.schedule.programmes[0].shortcrid, 213456)
+            self.assertEqual(str(epg.schedule.programmes[0].locations[0].bearers[0]), 'e1.ce15.c221.0')
+
+    def test_xml(self):
+        path = self.write(self.xml)
+        f = open(path, 'rb')
+        f.read(1)
+        f.seek(0)
+        for i in (self.xml, path, open(path, 'rb'), f):
+            epg = dabepg.xml.unmarshall(i)
+            self.assertEqual(epg.schedule.programmes[0].crid, 'crid://bbc.co.uk/4969758988')
+
+    def test_bom(self):
+        body = self.xml[self.xml.index('?>') + 2:]
+        for i in ('\xef\xbb\xbf' + self.xml, '\xef\xbb\xbf\n' + body, body.decode('utf-8').encode('utf-16')):
+            self.assertTrue(dabepg.xml.is_document(i))
+            epg = dabepg.xml.unmarshall(i)
+            self.assertEqual(epg.schedule.programmes[0].crid, 'crid://bbc.co.uk/4969758988')
+        self.assertTrue(dabepg.xml.is_document(u'\ufeff<epg/>'))
+        self.assertFalse(dabepg.xml.is_document('test/PI.xml'))
+        from dabepg.transcode import xml_to_binary
+        self.assertEqual(xml_to_binary('\xef\xbb\xbf' + self.xml), xml_to_binary(self.xml))
+
+    def test_map_file(self):
+        f = open(self.write(self.xml), 'rb')
+        data = dabepg.xml.map_file(f)
+        self.assertEqual(data[:5], self.xml[:5])
+        data.close()
+        f.read(1)
+        self.assertEqual(dabepg.xml.map_file(f), None)
+        self.assertEqual(dabepg.xml.map_file(open(self.write(''), 'rb')), None)
+
+if __name__ == "__main__":
+    unittest.main()
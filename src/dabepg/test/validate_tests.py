@@ -0,0 +1,128 @@
+import unittest
+
+from dabepg import *
+from dabepg.validate import validate
+from dateutil.tz import tzutc
+import dabepg.validate
+import datetime
+
+def at(hour, minute=0):
+    return datetime.datetime(2011, 7, 27, hour, minute, tzinfo=tzutc())
+
+class ValidateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = Schedule(created=at(0))
+        for shortcrid, start, end, bearer in ((1, at(6), at(9), 'e1.ce15.c221.0'),
+                                              (2, at(8), at(10), 'e1.ce15.c221.0'),
+                                              (3, at(10), at(11), 'e1.ce15.c221.0'),
+                                              (4, at(11, 30), at(12), 'e1.ce15.c221.0'),
+                                              (5, at(6), at(9), 'e1.ce15.c222.0'),
+                                              (6, at(9), at(12), 'e1.ce15.c222.0')):
+            programme = Programme(shortcrid)
+            programme.locations.append(Location(times=[Time(start, end - start)], bearers=[bearer]))
+            self.schedule.programmes.append(programme)
+
+    def add(self, shortcrid, times, bearers=('e1.ce15.c221.0',)):
+        programme = Programme(shortcrid)
+        programme.locations.append(Location(times=times, bearers=list(bearers)))
+        self.schedule.programmes.append(programme)
+
+    def check(self, *args, **kwargs):
+        """Returns the reports of a schedule checked with and without NumPy"""
+        reports = []
+        for numpy in (dabepg.validate.numpy, None):
+            dabepg.validate.numpy, saved = numpy, dabepg.validate.numpy
+            try:
+                reports.append(validate(*args, **kwargs))
+            finally:
+                dabepg.validate.numpy = saved
+        return reports
+
+    def test_valid(self):
+        schedule = Schedule(created=at(0))
+        schedule.programmes = [x for x in self.schedule.programmes if x.shortcrid in (5, 6)]
+        for report in self.check(schedule, start=at(6), end=at(12)):
+            self.assertEqual(report.services, {'e1.ce15.c222.0' : 2})
+            self.assertTrue(report.is_valid())
+        for report in self.check(schedule, start=at(9), end=at(11)):
+            self.assertTrue(report.is_valid())
+
+    def test_nested(self):
+        # a programme within a longer one still overlaps it after it ends
+        self.add(7, [Time(at(13), datetime.timedelta(hours=4))])
+        self.add(8, [Time(at(14), datetime.timedelta(hours=1))])
+        self.add(9, [Time(at(16), datetime.timedelta(hours=2))])
+        for report in self.check(self.schedule):
+            self.assertEqual([(x.start.hour, x.end.hour, x.first.shortcrid, x.second.shortcrid) for x in report.overlaps],
+                             [(8, 9, 1, 2), (14, 15, 7, 8), (16, 17, 7, 9)])
+            self.assertEqual([(x.start.hour, x.end.hour, x.before.shortcrid, x.after.shortcrid) for x in report.gaps][1:],
+                             [(12, 13, 4, 7)])
+
+    def test_tolerance(self):
+        self.add(7, [Time(at(12, 5), datetime.timedelta(hours=1))])
+        for report in self.check(self.schedule, tolerance=datetime.timedelta(minutes=5)):
+            self.assertEqual([x.start for x in report.gaps], [at(11)])
+            self.assertEqual(len(report.overlaps), 1)
+        for report in self.check(self.schedule, tolerance=datetime.timedelta(hours=1)):
+            self.assertTrue(report.is_valid())
+
+    def test_edges(self):
+        for report in self.check(self.schedule, start=at(5), end=at(12)):
+            self.assertEqual([(x.service, x.start.hour, x.end.hour, x.before, x.after.shortcrid) for x in report.gaps if x.before is None],
+                             [('e1.ce15.c221.0', 5, 6, None, 1), ('e1.ce15.c222.0', 5, 6, None, 5)])
+            self.assertEqual([x for x in report.gaps if x.after is None], [])
+        for report in self.check(self.schedule, start=at(7), end=at(14)):
+            self.assertEqual([(x.service, x.start.hour, x.end.hour, x.before.shortcrid, x.after) for x in report.gaps if x.after is None],
+                             [('e1.ce15.c221.0', 12, 14, 4, None), ('e1.ce15.c222.0', 12, 14, 6, None)])
+
+    def test_untimed(self):
+        # untimed programmes and times claim no period of a service
+        self.add(7, [])
+        self.add(8, [Time(None, datetime.timedelta(hours=1))])
+        for report in self.check(self.schedule):
+            self.assertEqual(report.services, {'e1.ce15.c221.0' : 4, 'e1.ce15.c222.0' : 2})
+            self.assertEqual(len(report.overlaps), 1)
+
+    def test_relative(self):
+        # relative times belong to events within a programme, not to the timeline
+        self.add(7, [RelativeTime(datetime.timedelta(), datetime.timedelta(hours=12))])
+        for report in self.check(self.schedule):
+            self.assertEqual(report.services, {'e1.ce15.c221.0' : 4, 'e1.ce15.c222.0' : 2})
+            self.assertEqual(len(report.overlaps), 1)
+
+    def test_bearers(self):
+        # a time is checked on every service it is carried on, and on None without bearers
+        self.add(7, [Time(at(12), datetime.timedelta(hours=1))], ['e1.ce15.c221.0', 'e1.ce15.c222.0'])
+        self.add(8, [Time(at(1), datetime.timedelta(hours=2))], [])
+        self.add(9, [Time(at(2), datetime.timedelta(hours=2))], [])
+        for report in self.check(self.schedule):
+            self.assertEqual(report.services, {'e1.ce15.c221.0' : 5, 'e1.ce15.c222.0' : 3, None : 2})
+            self.assertEqual([(x.service, x.first.shortcrid, x.second.shortcrid) for x in report.overlaps],
+                             [(None, 8, 9), ('e1.ce15.c221.0', 1, 2)])
+            self.assertEqual([(x.service, x.before.shortcrid, x.after.shortcrid) for x in report.gaps], [('e1.ce15.c221.0', 3, 4)])
+            self.assertEqual(len(report.get_problems(None)), 1)
+
+    def test_validate(self):
+        for numpy in (dabepg.validate.numpy, None):
+            dabepg.validate.numpy, saved = numpy, dabepg.validate.numpy
+            try:
+                report = validate(self.schedule)
+                self.assertFalse(report.is_valid())
+                self.assertEqual(report.services, {'e1.ce15.c221.0' : 4, 'e1.ce15.c222.0' : 2})
+                self.assertEqual([(x.service, x.start.hour, x.end.hour, x.first.shortcrid, x.second.shortcrid) for x in report.overlaps],
+                                 [('e1.ce15.c221.0', 8, 9, 1, 2)])
+                self.assertEqual([(x.service, x.start, x.end, x.before.shortcrid, x.after.shortcrid) for x in report.gaps],
+                                 [('e1.ce15.c221.0', at(11), at(11, 30), 3, 4)])
+                self.assertEqual(len(report.get_problems(ContentId.fromstring('e1.ce15.c221.0'))), 2)
+                self.assertEqual(report.get_problems('e1.ce15.c222.0'), [])
+
+                report = validate(self.schedule, start=at(6), end=at(13), tolerance=datetime.timedelta(minutes=30))
+                self.assertEqual([(x.service, x.start.hour, x.end.hour) for x in report.gaps],
+                                 [('e1.ce15.c221.0', 12, 13), ('e1.ce15.c222.0', 12, 13)])
+                self.assertEqual(len(report.overlaps), 1)
+            finally:
+                dabepg.validate.numpy = saved
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,659 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Direct transcoding between the XML (TS 102 818) and binary (TS 102 371)
+representations of PI and SI documents, without building the intermediate
+object model"""
+
+from __future__ import absolute_import
+from dabepg import ContentId, LazyModule
+from dabepg.xml import SCHEDULE_NS, SERVICEINFO_NS, EPG_NS, TYPES_NS, XSI_NS, map_file, is_document, \
+    SCHEDULE_SCHEMA_LOCATION, SERVICEINFO_SCHEMA_LOCATION, get_iso_period
+from dabepg.binary import Element, Attribute, CData, encode_header, decode_header, \
+    decode_contentid, decode_timepoint, token_table_pattern
+from bitarray import bitarray
+from xml.etree.ElementTree import iterparse
+import datetime
+import logging
+
+# imported on first use
+isodate = LazyModule('isodate')
+
+logger = logging.getLogger('dabepg.transcode')
+
+NAME_TAGS = [('shortName', 0x10), ('mediumName', 0x11), ('longName', 0x12)]
+
+MULTIMEDIA_TYPES = {
+    'logo_unrestricted' : 0x02,
+    'logo_mono_square' : 0x03,
+    'logo_colour_square' : 0x04,
+    'logo_mono_rectangle' : 0x05,
+    'logo_colour_rectangle' : 0x06
+}
+MULTIMEDIA_VALUES = dict([(v, k) for k, v in MULTIMEDIA_TYPES.items()])
+
+def xml_to_binary(i):
+    """Transcodes a PI or SI XML document straight to its binary encoding,
+    equivalent to ``binary.marshall(xml.unmarshall(i))``.
+
+    Programmes (and services) are mapped onto binary elements as soon as
+    they have been parsed and are then discarded, so only one of them is
+    held in memory at a time.
+
+    :param i: String, path or File object to read XML from
+    :type i: str, file
+    """
+
+    if isinstance(i, basestring) and not is_document(i):
+        f = open(i, 'rb')
+        try: return xml_to_binary(f)
+        finally: f.close()
+    elif isinstance(i, file):
+        data = map_file(i)
+        if data is not None:
+            try: return xml_to_binary_events(iterparse(data, events=('start', 'end')))
+            finally: data.close()
+    else:
+        # unlike StringIO, a cStringIO reader shares the string's buffer
+        import cStringIO
+        i = cStringIO.StringIO(i)
+    return xml_to_binary_events(iterparse(i, events=('start', 'end')))
+
+def xml_to_binary_events(events):
+
+    event, root = events.next()
+    if root.tag == '{%s}epg' % SCHEDULE_NS:
+        return transcode_epg(root, events)
+    elif root.tag == '{%s}serviceInformation' % SERVICEINFO_NS:
+        return transcode_serviceinfo(root, events)
+    else:
+        raise Exception('Arrgh! this be neither serviceInformation nor epg - to Davy Jones\' locker with ye!')
+
+def transcode_epg(root, events):
+    if root.get('system') == 'DRM': raise Exception('parser only supports DAB EPG')
+
+    schedule_attributes = []
+    programmes = []
+    scope = ScopeBuilder()
+    contentids = {}
+
+    for event, e in events:
+        if event == 'start' and e.tag == '{%s}schedule' % SCHEDULE_NS:
+            version = int(e.get('version', 1))
+            if version > 1:
+                schedule_attributes.append(Attribute(0x80, version, 16))
+            created = e.get('creationTime')
+            schedule_attributes.append(Attribute(0x81, isodate.parse_datetime(created) if created else datetime.datetime.now()))
+            if e.get('originator') is not None:
+                schedule_attributes.append(Attribute(0x82, e.get('originator')))
+            schedule = e
+        elif event == 'end' and e.tag == '{%s}programme' % SCHEDULE_NS:
+            programmes.append(build_programme(e, contentids, scope).tobytes().tobytes())
+            schedule.remove(e)
+
+    # schedule
+    data = ''.join([x.tobytes().tobytes() for x in schedule_attributes])
+    if scope.start is not None:
+        data += scope.build().tobytes().tobytes()
+    data += ''.join(programmes)
+    data = encode_header(0x21, len(data)) + data
+
+    # epg (default type is DAB, so no need to encode)
+    return encode_header(0x02, len(data)) + data
+
+def transcode_serviceinfo(root, events):
+    if root.get('system') == 'DRM': raise Exception("DRM not yet supported")
+
+    contentids = {}
+
+    # serviceInformation
+    info_element = Element(0x03)
+    if int(root.get('version', 1)) > 1: info_element.attributes.append(Attribute(0x80, int(root.get('version')), 16))
+    if root.get('creationTime'): info_element.attributes.append(Attribute(0x81, isodate.parse_datetime(root.get('creationTime'))))
+    if root.get('originator'): info_element.attributes.append(Attribute(0x82, root.get('originator')))
+    if root.get('serviceProvider'): info_element.attributes.append(Attribute(0x83, root.get('serviceProvider')))
+
+    services = []
+    for event, e in events:
+        if event == 'start' and e.tag == '{%s}ensemble' % SERVICEINFO_NS:
+            ensemble = e
+        elif event == 'end' and e.tag == '{%s}service' % SERVICEINFO_NS:
+            services.append(build_service(e, contentids))
+            ensemble.remove(e)
+        elif event == 'end' and e.tag == '{%s}ensemble' % SERVICEINFO_NS:
+            # only one ensemble per file
+            if len(info_element.children): raise ValueError("Cannot have more than one ensemble per binary encoded Service Information file")
+            info_element.children.append(build_ensemble(e, services, contentids))
+            services = []
+
+    if not len(info_element.children): raise ValueError("You must specify an ensemble in this binary encoded Service Information file")
+
+    return info_element.tobytes().tobytes()
+
+class ScopeBuilder:
+    """Accumulates the schedule scope as programmes stream past, in the same
+    way as :func:`dabepg.Schedule.get_scope`"""
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.services = []
+
+    def add_time(self, billed_time, billed_duration):
+        if self.start is None or self.start > billed_time:
+            self.start = billed_time
+        if self.end is None or self.end < billed_time + billed_duration:
+            self.end = billed_time + billed_duration
+
+    def add_service(self, id):
+        if id not in self.services: self.services.append(id)
+
+    def build(self):
+        scope_element = Element(0x24)
+        scope_element.attributes.append(Attribute(0x80, self.start))
+        scope_element.attributes.append(Attribute(0x81, self.end))
+        for service in self.services:
+            service_scope_element = Element(0x25)
+            service_scope_element.attributes.append(Attribute(0x80, service))
+            scope_element.children.append(service_scope_element)
+        return scope_element
+
+def get_contentid(string, contentids):
+    id = contentids.get(string)
+    if id is None:
+        id = contentids[string] = ContentId.fromstring(string)
+    return id
+
+def build_names(e, element, ns=EPG_NS):
+    for name, tag in NAME_TAGS:
+        for c in e.findall('{%s}%s' % (ns, name)):
+            element.children.append(Element(tag, cdata=CData(c.text)))
+
+def build_location(e, contentids, scope=None):
+    location_element = Element(0x19)
+    for c in e.findall('{%s}time' % EPG_NS):
+        time_element = Element(0x2c)
+        billed_time = isodate.parse_datetime(c.get('time'))
+        billed_duration = isodate.parse_duration(c.get('duration'))
+        time_element.attributes.append(Attribute(0x80, billed_time))
+        if c.get('actualTime') is not None:
+            time_element.attributes.append(Attribute(0x82, isodate.parse_datetime(c.get('actualTime'))))
+        if c.get('actualDuration') is not None:
+            time_element.attributes.append(Attribute(0x83, isodate.parse_duration(c.get('actualDuration'))))
+        time_element.attributes.append(Attribute(0x81, billed_duration))
+        location_element.children.append(time_element)
+        if scope is not None: scope.add_time(billed_time, billed_duration)
+    for c in e.findall('{%s}relativeTime' % EPG_NS):
+        time_element = Element(0x2f)
+        time_element.attributes.append(Attribute(0x80, isodate.parse_duration(c.get('time'))))
+        time_element.attributes.append(Attribute(0x81, isodate.parse_duration(c.get('duration'))))
+        if c.get('actualTime') is not None:
+            time_element.attributes.append(Attribute(0x82, isodate.parse_duration(c.get('actualTime'))))
+        if c.get('actualDuration') is not None:
+            time_element.attributes.append(Attribute(0x83, isodate.parse_duration(c.get('actualDuration'))))
+        location_element.children.append(time_element)
+    for c in e.findall('{%s}bearer' % EPG_NS):
+        id = get_contentid(c.get('id'), contentids)
+        bearer_element = Element(0x2d)
+        bearer_element.attributes.append(Attribute(0x80, id))
+        location_element.children.append(bearer_element)
+        if scope is not None: scope.add_service(id)
+    return location_element
+
+def build_mediagroup(e, element, ns=EPG_NS):
+    mediagroup_element = Element(0x13)
+    for m in e.findall('{%s}mediaDescription' % ns):
+        for c in m.findall('{%s}shortDescription' % EPG_NS):
+            mediagroup_element.children.append(Element(0x1a, cdata=CData(c.text)))
+        for c in m.findall('{%s}longDescription' % EPG_NS):
+            mediagroup_element.children.append(Element(0x1b, cdata=CData(c.text)))
+        for c in m.findall('{%s}multimedia' % EPG_NS):
+            media_element = Element(0x2b)
+            if c.get('mimetype') is not None:
+                media_element.attributes.append(Attribute(0x80, c.get('mimetype')))
+            media_element.attributes.append(Attribute(0x82, c.get('url')))
+            type = c.get('type', 'logo_unrestricted')
+            if type not in MULTIMEDIA_TYPES: raise ValueError('unknown multimedia type: %s' % type)
+            media_element.attributes.append(Attribute(0x83, MULTIMEDIA_TYPES[type], 8))
+            if type == 'logo_unrestricted':
+                if c.get('width'): media_element.attributes.append(Attribute(0x84, int(c.get('width')), 16))
+                if c.get('height'): media_element.attributes.append(Attribute(0x85, int(c.get('height')), 16))
+            mediagroup_element.children.append(media_element)
+    if len(mediagroup_element.children):
+        element.children.append(mediagroup_element)
+
+def build_genres(e, element):
+    for c in e.findall('{%s}genre' % EPG_NS):
+        genre_element = Element(0x14)
+        genre_element.attributes.append(Attribute(0x80, c.get('href')))
+        element.children.append(genre_element)
+
+def build_memberships(e, element, ns):
+    for c in e.findall('{%s}memberOf' % ns):
+        membership_element = Element(0x17)
+        if c.get('crid') is not None:
+            membership_element.attributes.append(Attribute(0x80, c.get('crid')))
+        membership_element.attributes.append(Attribute(0x81, int(c.get('shortId')), 24))
+        if c.get('index') is not None:
+            membership_element.attributes.append(Attribute(0x82, int(c.get('index')), 16))
+        element.children.append(membership_element)
+
+def build_links(e, element, ns):
+    for c in e.findall('{%s}link' % ns):
+        link_element = Element(0x18)
+        link_element.attributes.append(Attribute(0x80, c.get('url')))
+        if c.get('description') is not None:
+            link_element.attributes.append(Attribute(0x83, c.get('description')))
+        if c.get('mimeType') is not None:
+            link_element.attributes.append(Attribute(0x81, c.get('mimeType')))
+        if c.get('expiryTime') is not None:
+            link_element.attributes.append(Attribute(0x84, isodate.parse_datetime(c.get('expiryTime'))))
+        element.children.append(link_element)
+
+def build_programme(e, contentids, scope):
+    programme_element = Element(0x1c)
+    programme_element.attributes.append(Attribute(0x81, int(e.get('shortId')), 24))
+    if e.get('id') is not None:
+        programme_element.attributes.append(Attribute(0x80, e.get('id')))
+    programme_element.attributes.append(Attribute(0x82, int(e.get('version', 1)), 16))
+    if e.get('recommendation', 'yes') == 'yes':
+        programme_element.attributes.append(Attribute(0x83, 0x02, 8))
+    if e.get('broadcast', 'on-air') != 'on-air':
+        programme_element.attributes.append(Attribute(0x84, 0x02, 8))
+    if e.get('bitrate') is not None:
+        programme_element.attributes.append(Attribute(0x87, int(e.get('bitrate')), 16))
+    build_names(e, programme_element)
+    for c in e.findall('{%s}location' % EPG_NS):
+        programme_element.children.append(build_location(c, contentids, scope))
+    build_mediagroup(e, programme_element)
+    build_genres(e, programme_element)
+    build_memberships(e, programme_element, SCHEDULE_NS)
+    build_links(e, programme_element, SCHEDULE_NS)
+    for c in e.findall('{%s}programmeEvent' % EPG_NS):
+        programme_element.children.append(build_programme_event(c, contentids))
+    return programme_element
+
+def build_programme_event(e, contentids):
+    event_element = Element(0x2e)
+    if e.get('id') is not None:
+        event_element.attributes.append(Attribute(0x80, e.get('id')))
+    event_element.attributes.append(Attribute(0x81, int(e.get('shortId')), 24))
+    if int(e.get('version', 1)) > 1:
+        event_element.attributes.append(Attribute(0x82, int(e.get('version')), 16))
+    if e.get('recommendation') == 'yes':
+        event_element.attributes.append(Attribute(0x83, 0x02, 8))
+    if e.get('broadcast', 'on-air') != 'on-air':
+        event_element.attributes.append(Attribute(0x84, 0x02, 8))
+    build_names(e, event_element)
+    for c in e.findall('{%s}location' % EPG_NS):
+        event_element.children.append(build_location(c, contentids))
+    build_mediagroup(e, event_element)
+    build_genres(e, event_element)
+    build_memberships(e, event_element, EPG_NS)
+    build_links(e, event_element, EPG_NS)
+    return event_element
+
+def build_service(e, contentids):
+    service_element = Element(0x28)
+    if int(e.get('version', 1)) > 1: service_element.attributes.append(Attribute(0x80, int(e.get('version')), 16))
+    if e.get('bitrate'): service_element.attributes.append(Attribute(0x83, int(e.get('bitrate')) * 10, 16))
+
+    # service IDs - the first in the list is primary, all others secondary
+    for i, c in enumerate(e.findall('{%s}serviceID' % SERVICEINFO_NS)):
+        serviceid_element = Element(0x29)
+        serviceid_element.attributes.append(Attribute(0x80, get_contentid(c.get('id'), contentids)))
+        if i > 0: serviceid_element.attributes.append(Attribute(0x81, 0x02, 8)) # mark as secondary
+        service_element.children.append(serviceid_element)
+
+    build_names(e, service_element)
+    build_mediagroup(e, service_element, SERVICEINFO_NS)
+    build_genres(e, service_element)
+
+    keywords = []
+    for c in e.findall('{%s}keywords' % SERVICEINFO_NS):
+        keywords.extend([x.strip() for x in c.text.split(',')])
+    if len(keywords):
+        service_element.children.append(Element(0x16, cdata=CData(','.join(keywords))))
+
+    return service_element
+
+def build_ensemble(e, services, contentids):
+    ensemble_element = Element(0x26)
+    ensemble_element.attributes.append(Attribute(0x80, get_contentid(e.get('id'), contentids)))
+    if int(e.get('version', 1)) > 1: ensemble_element.attributes.append(Attribute(0x81, int(e.get('version')), 16))
+
+    build_names(e, ensemble_element)
+
+    frequencies = e.findall('{%s}frequency' % SERVICEINFO_NS)
+    if not len(frequencies):
+        raise ValueError('At least one frequency must be defined for this ensemble')
+    for c in frequencies:
+        frequency_element = Element(0x27)
+        frequency_element.attributes.append(Attribute(0x81, int(c.get('kHz')), 24))
+        ensemble_element.children.append(frequency_element)
+
+    build_mediagroup(e, ensemble_element, SERVICEINFO_NS)
+
+    ensemble_element.children.extend(services)
+    return ensemble_element
+
+def binary_to_xml(i):
+    """Transcodes a binary PI or SI document straight to its XML form, in the
+    same layout as ``xml.marshall(binary.unmarshall(i))``.
+
+    The element structure is walked directly over the encoded bytes, expanding
+    token tables and resolving default content IDs on the way, and only the
+    attribute values that are written out are decoded.
+
+    :param i: String, path or File object to read binary from
+    :type i: str, file
+    """
+
+    if isinstance(i, basestring) and i[:1] not in ('\x02', '\x03'):
+        f = open(i, 'rb')
+        try: return binary_to_xml(f)
+        finally: f.close()
+    elif isinstance(i, file):
+        data = map_file(i)
+        if data is None: return binary_to_xml(i.read())
+        try: return binary_to_xml(data)
+        finally: data.close()
+
+    tag, start, end = decode_header(i)
+    root = read_node(i, tag, start, end)
+
+    if root.tag == 0x02:
+        xml = write_epg(root)
+    elif root.tag == 0x03:
+        xml = write_serviceinfo(root)
+    else:
+        raise Exception('Arrgh! this be neither serviceInformation nor epg - to Davy Jones\' locker with ye!')
+
+    return ('<?xml version="1.0" encoding="UTF-8"?>' + xml).encode('UTF-8')
+
+class Node:
+    """A binary element whose attribute values are kept as undecoded bytes"""
+
+    def __init__(self, tag, parent=None):
+        self.tag = tag
+        self.parent = parent
+        self.attributes = {}
+        self.children = []
+        self.cdata = None
+        self.tokens = None
+        self.default_contentid = None
+
+    def get_children(self, tag):
+        return [x for x in self.children if x.tag == tag]
+
+    def get_text(self):
+        """Returns the CDATA with any tokens from the nearest token table expanded"""
+        text = self.cdata
+        x = self
+        while x is not None:
+            if x.tokens is not None:
+                tokens = x.tokens
+                text = token_table_pattern.sub(lambda m: tokens.get(ord(m.group(0)), m.group(0)), text)
+                break
+            x = x.parent
+        return text.decode('latin-1')
+
+    def get_default_contentid(self):
+        x = self
+        while x is not None:
+            if x.default_contentid is not None: return x.default_contentid
+            x = x.parent
+
+    def __repr__(self):
+        return '<Node: 0x%02X>' % self.tag
+
+def read_node(data, tag, start, end, parent=None):
+    node = Node(tag, parent)
+    i = start
+    while i < end:
+        child_tag, child_start, child_end = decode_header(data, i)
+        # attributes
+        if child_tag >= 0x80 and child_tag <= 0x87:
+            node.attributes[child_tag] = data[child_start:child_end]
+        # token table
+        elif child_tag == 0x04:
+            node.tokens = read_tokentable(data, child_start, child_end)
+        # default content ID
+        elif child_tag == 0x05:
+            node.default_contentid = decode_contentid(to_bitarray(data[child_start:child_end]))
+        # default language
+        elif child_tag == 0x06:
+            pass
+        # cdata
+        elif child_tag == 0x01:
+            node.cdata = data[child_start:child_end]
+        # children
+        elif child_tag >= 0x02 and child_tag <= 0x30:
+            node.children.append(read_node(data, child_tag, child_start, child_end, node))
+        else:
+            raise ValueError('unknown element 0x%02x under parent 0x%02x' % (child_tag, tag))
+        i = child_end
+    return node
+
+def read_tokentable(data, start, end):
+    tokens = {}
+    i = start
+    while i < end:
+        length = ord(data[i+1])
+        tokens[ord(data[i])] = data[i+2:i+2+length]
+        i += 2 + length
+    return tokens
+
+def to_bitarray(data):
+    bits = bitarray()
+    bits.frombytes(data)
+    return bits
+
+def int_value(data):
+    return int(data.encode('hex'), 16)
+
+def string_value(data):
+    return data.decode('latin-1')
+
+def timepoint_value(data):
+    return decode_timepoint(to_bitarray(data)).isoformat()
+
+def duration_value(data):
+    return get_iso_period(datetime.timedelta(seconds=int_value(data)))
+
+def contentid_value(data):
+    return str(decode_contentid(to_bitarray(data)))
+
+def escape(data):
+    return data.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
+def write(name, attributes=None, content=None):
+    """Renders an XML element in the same way as ``minidom`` would"""
+
+    xml = '<' + name
+    if attributes:
+        for key in sorted(attributes.keys()):
+            xml += ' %s="%s"' % (key, escape(attributes[key]))
+    if content:
+        return xml + '>' + ''.join(content) + '</' + name + '>'
+    return xml + '/>'
+
+def cdata(text):
+    if ']]>' in text: raise ValueError("']]>' not allowed in a CDATA section")
+    return '<![CDATA[' + text + ']]>'
+
+def write_attributes(node, *mappings):
+    """Decodes the node attributes present in the ``(tag, name, decoder)``
+    mappings into a dictionary of XML attributes"""
+
+    attributes = {}
+    for tag, name, decoder in mappings:
+        if tag in node.attributes:
+            attributes[name] = decoder(node.attributes[tag])
+    return attributes
+
+def write_epg(node):
+    attributes = {
+        'system' : 'DRM' if int_value(node.attributes.get(0x80, '\x01')) == 0x02 else 'DAB',
+        'xmlns' : SCHEDULE_NS,
+        'xmlns:epg' : TYPES_NS,
+        'xmlns:xsi' : XSI_NS,
+        'xsi:schemaLocation' : SCHEDULE_SCHEMA_LOCATION,
+        'xml:lang' : 'en'
+    }
+    return write('epg', attributes, [write_schedule(c) for c in node.get_children(0x21)])
+
+def write_schedule(node):
+    attributes = write_attributes(node, (0x80, 'version', lambda x: str(int_value(x))),
+                                        (0x81, 'creationTime', lambda x: decode_timepoint(to_bitarray(x)).replace(microsecond=0).isoformat()),
+                                        (0x82, 'originator', string_value))
+    attributes.setdefault('version', '1')
+    content = []
+    for c in node.get_children(0x24):
+        scope_attributes = write_attributes(c, (0x80, 'startTime', timepoint_value), (0x81, 'stopTime', timepoint_value))
+        services = [write('serviceScope', write_attributes(x, (0x80, 'id', contentid_value))) for x in c.get_children(0x25)]
+        content.append(write('scope', scope_attributes, services))
+    for c in node.get_children(0x1c):
+        content.append(write_programme(c))
+    return write('schedule', attributes, content)
+
+def write_programme(node, name='programme'):
+    attributes = write_attributes(node, (0x80, 'id', string_value),
+                                        (0x81, 'shortId', lambda x: str(int_value(x))),
+                                        (0x82, 'version', lambda x: str(int_value(x))),
+                                        (0x87, 'bitrate', lambda x: str(int_value(x))))
+    if int_value(node.attributes.get(0x83, '\x01')) == 0x02: attributes['recommendation'] = 'yes'
+    if int_value(node.attributes.get(0x84, '\x01')) == 0x02: attributes['broadcast'] = 'off-air'
+    content = write_names(node)
+    content.extend([write_location(c) for c in node.get_children(0x19)])
+    content.extend(write_media(node, 'epg:'))
+    content.extend(write_genres(node))
+    content.extend(write_memberships(node))
+    content.extend(write_links(node))
+    content.extend([write_programme(c, 'epg:programmeEvent') for c in node.get_children(0x2e)])
+    return write(name, attributes, content)
+
+def write_names(node):
+    content = []
+    for tag, name in [(0x10, 'epg:shortName'), (0x11, 'epg:mediumName'), (0x12, 'epg:longName')]:
+        for c in node.get_children(tag):
+            content.append(write(name, content=[escape(c.get_text())]))
+    return content
+
+def write_location(node):
+    content = []
+    for c in node.children:
+        if c.tag == 0x2c:
+            content.append(write('epg:time', write_attributes(c, (0x80, 'time', timepoint_value),
+                                                                 (0x81, 'duration', duration_value),
+                                                                 (0x82, 'actualTime', timepoint_value),
+                                                                 (0x83, 'actualDuration', duration_value))))
+        elif c.tag == 0x2f:
+            content.append(write('epg:relativeTime', write_attributes(c, (0x80, 'time', duration_value),
+                                                                         (0x81, 'duration', duration_value),
+                                                                         (0x82, 'actualTime', duration_value),
+                                                                         (0x83, 'actualDuration', duration_value))))
+    bearers = [write('epg:bearer', write_attributes(c, (0x80, 'id', contentid_value))) for c in node.get_children(0x2d)]
+
+    # apply a default content ID
+    if not len(bearers) and node.get_children(0x2c):
+        default_contentid = node.get_default_contentid()
+        if default_contentid is not None:
+            bearers.append(write('epg:bearer', {'id' : str(default_contentid)}))
+    content.extend(bearers)
+    return write('epg:location', content=content)
+
+def write_media(node, namespace=''):
+    content = []
+    for group in node.get_children(0x13):
+        for c in group.children:
+            if c.tag == 0x1a:
+                media = write('epg:shortDescription', content=[cdata(c.get_text())])
+            elif c.tag == 0x1b:
+                media = write('epg:longDescription', content=[cdata(c.get_text())])
+            elif c.tag == 0x2b:
+                attributes = write_attributes(c, (0x82, 'url', string_value))
+                attributes['type'] = MULTIMEDIA_VALUES.get(int_value(c.attributes.get(0x83, '\x02')), 'logo_unrestricted')
+                if attributes['type'] == 'logo_unrestricted':
+                    attributes.update(write_attributes(c, (0x84, 'width', lambda x: str(int_value(x))),
+                                                          (0x85, 'height', lambda x: str(int_value(x)))))
+                media = write('epg:multimedia', attributes)
+            else: continue
+            content.append(write('%smediaDescription' % namespace, content=[media]))
+    return content
+
+def write_genres(node):
+    return [write('epg:genre', write_attributes(c, (0x80, 'href', string_value))) for c in node.get_children(0x14)]
+
+def write_memberships(node):
+    return [write('memberOf', write_attributes(c, (0x80, 'crid', string_value),
+                                                  (0x81, 'shortId', lambda x: str(int_value(x))),
+                                                  (0x82, 'index', lambda x: str(int_value(x)))))
+            for c in node.get_children(0x17)]
+
+def write_links(node):
+    return [write('link', write_attributes(c, (0x80, 'url', string_value),
+                                              (0x81, 'mimeType', string_value),
+                                              (0x83, 'description', string_value),
+                                              (0x84, 'expiryTime', timepoint_value)))
+            for c in node.get_children(0x18)]
+
+def write_serviceinfo(node):
+    attributes = write_attributes(node, (0x80, 'version', lambda x: str(int_value(x))),
+                                        (0x81, 'creationTime', lambda x: decode_timepoint(to_bitarray(x)).replace(microsecond=0).isoformat()),
+                                        (0x82, 'originator', string_value),
+                                        (0x83, 'serviceProvider', string_value))
+    attributes.update({
+        'xmlns' : SERVICEINFO_NS,
+        'xmlns:epg' : TYPES_NS,
+        'xmlns:xsi' : XSI_NS,
+        'xsi:schemaLocation' : SERVICEINFO_SCHEMA_LOCATION,
+        'xml:lang' : 'en'
+    })
+    return write('serviceInformation', attributes, [write_ensemble(c) for c in node.get_children(0x26)])
+
+def write_ensemble(node):
+    attributes = write_attributes(node, (0x80, 'id', contentid_value), (0x81, 'version', lambda x: str(int_value(x))))
+    content = write_names(node)
+    for i, c in enumerate(node.get_children(0x27)):
+        frequency_attributes = write_attributes(c, (0x81, 'kHz', lambda x: str(int_value(x))))
+        if i > 0: frequency_attributes['type'] = 'secondary'
+        content.append(write('frequency', frequency_attributes))
+    content.extend(write_media(node))
+    content.extend([write_service(c) for c in node.get_children(0x28)])
+    return write('ensemble', attributes, content)
+
+def write_service(node):
+    attributes = write_attributes(node, (0x80, 'version', lambda x: str(int_value(x))),
+                                        (0x83, 'bitrate', lambda x: str(int_value(x) / 10)))
+    content = []
+    for c in node.get_children(0x29):
+        id_attributes = write_attributes(c, (0x80, 'id', contentid_value))
+        id_attributes['type'] = 'secondary' if int_value(c.attributes.get(0x81, '\x01')) == 0x02 else 'primary'
+        content.append(write('serviceID', id_attributes))
+    content.extend(write_names(node))
+    content.extend(write_media(node))
+    content.extend(write_genres(node))
+    content.extend(write_links(node))
+    for c in node.get_children(0x16):
+        content.append(write('keywords', content=[cdata(', '.join(c.get_text().split(',')))]))
+    return write('service', attributes, content)
@@ -0,0 +1,216 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Checks of the timelines of the services of a schedule for overlapping
+programmes and for gaps between them"""
+
+from dabepg import Bearer, Time, to_seconds
+import datetime
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger('dabepg.validate')
+
+class Overlap:
+    """A period of a service claimed by two programmes
+
+    :param service: service ID, or None for locations without bearers
+    :type service: str
+    :param start: start of the overlap
+    :type start: datetime
+    :param end: end of the overlap
+    :type end: datetime
+    :param first: programme that started first
+    :type first: Programme
+    :param second: programme that started within the first
+    :type second: Programme
+    """
+
+    def __init__(self, service, start, end, first, second):
+        self.service = service
+        self.start = start
+        self.end = end
+        self.first = first
+        self.second = second
+
+    def __repr__(self):
+        return '<Overlap: %s %s-%s, %s and %s>' % (self.service, self.start, self.end, self.first, self.second)
+
+class Gap:
+    """A period of a service with no programme
+
+    :param service: service ID, or None for locations without bearers
+    :type service: str
+    :param start: start of the gap
+    :type start: datetime
+    :param end: end of the gap
+    :type end: datetime
+    :param before: programme ending at the start of the gap, if any
+    :type before: Programme
+    :param after: programme starting at the end of the gap, if any
+    :type after: Programme
+    """
+
+    def __init__(self, service, start, end, before, after):
+        self.service = service
+        self.start = start
+        self.end = end
+        self.before = before
+        self.after = after
+
+    def __repr__(self):
+        return '<Gap: %s %s-%s, after %s and before %s>' % (self.service, self.start, self.end, self.before, self.after)
+
+class ValidationReport:
+    """Overlaps and gaps found in a schedule, in service and time order
+
+    :param overlaps: overlapping programmes
+    :type overlaps: list
+    :param gaps: gaps between programmes
+    :type gaps: list
+    :param services: number of programme times checked on each service
+    :type services: dict
+    """
+
+    def __init__(self, overlaps, gaps, services):
+        self.overlaps = overlaps
+        self.gaps = gaps
+        self.services = services
+
+    def is_valid(self):
+        return not len(self.overlaps) and not len(self.gaps)
+
+    def get_problems(self, service):
+        """Returns the overlaps and gaps on a service, in time order"""
+        if service is not None: service = str(service)
+        problems = [x for x in self.overlaps + self.gaps if x.service == service]
+        problems.sort(key=lambda x: x.start)
+        return problems
+
+    def __str__(self):
+        return '%d services, %d overlaps, %d gaps' % (len(self.services), len(self.overlaps), len(self.gaps))
+
+    def __repr__(self):
+        return '<ValidationReport: %s>' % str(self)
+
+def validate(schedule, start=None, end=None, tolerance=datetime.timedelta()):
+    """Checks the timeline of every service in a schedule for overlapping
+    programmes and for gaps.
+
+    The billed times of each service are gathered into arrays of start and end
+    seconds, sorted by start, and compared against the running latest end of
+    the programmes before them, using NumPy when it is installed.
+
+    :param schedule: schedule to check
+    :type schedule: Schedule
+    :param start: if given, the time from which every service should be covered
+    :type start: datetime
+    :param end: if given, the time up to which every service should be covered
+    :type end: datetime
+    :param tolerance: longest gap or overlap to let pass
+    :type tolerance: timedelta
+    """
+
+    # content IDs are hashable, so the times are grouped by them and only named once per service
+    ids = {}
+    for programme in schedule.programmes:
+        for location in programme.locations:
+            keys = [x.id if isinstance(x, Bearer) else x for x in location.bearers] or [None]
+            for time in location.times:
+                # relative times belong to events, and untimed programmes claim no period
+                if not isinstance(time, Time) or time.billed_time is None: continue
+                entry = (time.billed_time, time.billed_duration, programme)
+                for key in keys: ids.setdefault(key, []).append(entry)
+    services = {}
+    for key, entries in ids.items():
+        services.setdefault(str(key) if key is not None else None, []).extend(entries)
+
+    tolerance = to_seconds(tolerance)
+    overlaps = []
+    gaps = []
+    for service in sorted(services.keys()):
+        entries = services[service]
+        service_overlaps, service_gaps = check_service(service, entries, tolerance)
+        overlaps.extend(service_overlaps)
+        gaps.extend(service_gaps)
+
+        # the edges of the period the schedule should cover
+        first = min(entries, key=lambda x: x[0])
+        last = max(entries, key=lambda x: x[0] + x[1])
+        if start is not None and to_seconds(first[0] - start) > tolerance:
+            gaps.append(Gap(service, start, first[0], None, first[2]))
+        if end is not None and to_seconds(end - (last[0] + last[1])) > tolerance:
+            gaps.append(Gap(service, last[0] + last[1], end, last[2], None))
+
+    gaps.sort(key=lambda x: (x.service, x.start))
+    report = ValidationReport(overlaps, gaps, dict([(k, len(v)) for k, v in services.items()]))
+    logger.debug('validated schedule: %s', report)
+    return report
+
+def check_service(service, entries, tolerance):
+    """Returns the overlaps and gaps among the (start, duration, programme)
+    entries of a service"""
+
+    # seconds from the first entry are enough to order the times
+    base = entries[0][0]
+    if numpy is not None:
+        starts = numpy.array([to_seconds(x[0] - base) for x in entries], dtype=numpy.int64)
+        ends = starts + numpy.array([to_seconds(x[1]) for x in entries], dtype=numpy.int64)
+        order = numpy.argsort(starts, kind='mergesort')
+        starts, ends = starts[order], ends[order]
+
+        # the latest end so far, and the entry holding it
+        latest = numpy.maximum.accumulate(ends)
+        holders = numpy.maximum.accumulate(numpy.where(ends == latest, numpy.arange(len(ends)), 0))
+        overlapping = numpy.flatnonzero(latest[:-1] - starts[1:] > tolerance)
+        gapped = numpy.flatnonzero(starts[1:] - latest[:-1] > tolerance)
+        order, holders = order.tolist(), holders.tolist()
+    else:
+        seconds = [to_seconds(x[0] - base) for x in entries]
+        order = sorted(range(len(entries)), key=lambda i: seconds[i])
+        starts = [seconds[i] for i in order]
+        ends = [seconds[i] + to_seconds(entries[i][1]) for i in order]
+        latest = []
+        holders = []
+        for i, x in enumerate(ends):
+            if not len(latest) or x >= latest[-1]:
+                latest.append(x)
+                holders.append(i)
+            else:
+                latest.append(latest[-1])
+                holders.append(holders[-1])
+        overlapping = [i for i in range(len(ends) - 1) if latest[i] - starts[i + 1] > tolerance]
+        gapped = [i for i in range(len(ends) - 1) if starts[i + 1] - latest[i] > tolerance]
+
+    overlaps = []
+    for i in overlapping:
+        first, second = entries[order[holders[i]]], entries[order[i + 1]]
+        overlaps.append(Overlap(service, second[0], min(first[0] + first[1], second[0] + second[1]), first[2], second[2]))
+    gaps = []
+    for i in gapped:
+        before, after = entries[order[holders[i]]], entries[order[i + 1]]
+        gaps.append(Gap(service, before[0] + before[1], after[0], before[2], after[2]))
+    return overlaps, gaps
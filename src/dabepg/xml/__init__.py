@@ -21,10 +21,12 @@
 #===============================================================================
 
 from dabepg import *
-import xml.dom.minidom
-import isodate
 from xml.dom import XML_NAMESPACE
 
+# imported on first use
+minidom = LazyModule('xml.dom.minidom')
+isodate = LazyModule('isodate')
+
 EPG_NS = 'http://www.worlddab.org/schemas/epgDataTypes/14'
 SCHEDULE_NS = 'http://www.worlddab.org/schemas/epgSchedule/14'
 SERVICEINFO_NS = 'http://www.worlddab.org/schemas/epgSI/14'
@@ -47,7 +49,7 @@ def marshall(obj, listener=MarshallListener(), **kwargs):
     
 def marshall_serviceinfo(info, listener=MarshallListener(), indent=None, **kwargs):
     
-    doc = xml.dom.minidom.Document()
+    doc = minidom.Document()
     
     # service info
     info_element = doc.createElement('serviceInformation')
@@ -132,7 +134,7 @@ def marshall_epg(epg, listener=MarshallListener(), indent=None):
     :indent: Characters to use for XML indentation
     """
     
-    doc = xml.dom.minidom.Document()
+    doc = minidom.Document()
     
     schedule = epg.schedule
     
@@ -473,19 +475,19 @@ def parse_epg(root):
 
 def parse_name(nameElement):
     if nameElement.tag == '{%s}shortName' % EPG_NS:
-        return ShortName(nameElement.text)
+        return ShortName.intern(nameElement.text)
     elif nameElement.tag == '{%s}mediumName' % EPG_NS:
-        return MediumName(nameElement.text)
+        return MediumName.intern(nameElement.text)
     elif nameElement.tag == '{%s}longName' % EPG_NS:
-        return LongName(nameElement.text)
+        return LongName.intern(nameElement.text)
     else:
         raise ValueError('unknown name element: %s' % nameElement)
     
 def parse_description(descriptionElement):
     if descriptionElement.tag == '{%s}shortDescription' % EPG_NS:
-        return ShortDescription(descriptionElement.text)
+        return ShortDescription.intern(descriptionElement.text)
     elif descriptionElement.tag == '{%s}longDescription' % EPG_NS:
-        return LongDescription(descriptionElement.text)   
+        return LongDescription.intern(descriptionElement.text)   
     else:
         raise ValueError('unknown description element: %s' % descriptionElement)
     
@@ -529,7 +531,7 @@ def parse_link(linkElement):
     return link
         
 def parse_keywords(keywordsElement):
-    return map(lambda x: x.strip(), keywordsElement.text.split(','))
+    return map(lambda x: intern_string(x.strip()), keywordsElement.text.split(','))
     
 def parse_service(serviceElement):
     id = ContentId.fromstring(serviceElement.find("{%s}serviceID" % SERVICEINFO_NS).attrib['id'])
@@ -566,21 +568,61 @@ def parse_ensemble(ensembleElement):
 def unmarshall(i):
     """Unmarshalls a PI or SI XML file to its respective :class:Epg or :class:ServiceInfo object
     
-    :param i: String or File object to read XML from
+    Files are memory mapped where possible and strings are fed straight to the
+    parser, so the document is never copied before it is parsed.
+    
+    :param i: String, path or File object to read XML from
     :type i: str, file
     """
     
+    from xml.etree.ElementTree import parse, XMLParser
+    
     # read data
-    import StringIO
-    d = i if isinstance(i, file) else StringIO.StringIO(i)
-    from xml.etree.ElementTree import parse 
-    doc = parse(d)
-    root = doc.getroot()
+    if isinstance(i, basestring) and not is_document(i):
+        f = open(i, 'rb')
+        try: return unmarshall(f)
+        finally: f.close()
+    elif isinstance(i, file):
+        data = map_file(i)
+        if data is None:
+            root = parse(i).getroot()
+        else:
+            try: root = parse(data).getroot()
+            finally: data.close()
+    else:
+        parser = XMLParser()
+        parser.feed(i)
+        root = parser.close()
     
     if root.tag == '{%s}serviceInformation' % SERVICEINFO_NS:
         return parse_serviceinfo(root)
     elif root.tag == '{%s}epg' % SCHEDULE_NS:
         return parse_epg(root)
     else:
-        raise Exception('Arrgh! this be neither serviceInformation nor epg - to Davy Jones\' locker with ye!')   
+        raise Exception('Arrgh! this be neither serviceInformation nor epg - to Davy Jones\' locker with ye!')
+
+# byte order marks that a document may start with
+BOMS = ('\xef\xbb\xbf', '\xff\xfe', '\xfe\xff')
+
+def is_document(string):
+    """Returns whether a string holds an XML document rather than a path to
+    one, going by whether it starts with a markup character once any byte order
+    mark and whitespace are stripped"""
     
+    if isinstance(string, unicode):
+        if string.startswith(u'\ufeff'): return True
+    else:
+        for bom in BOMS:
+            if string.startswith(bom): return True
+    return string.lstrip().startswith('<')
+
+def map_file(f):
+    """Returns a read-only memory map of a whole file, or None if the file cannot
+    be mapped (e.g. pipes, empty files and files that have already been read from)"""
+    
+    import mmap
+    try:
+        if f.tell(): return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError, AttributeError):
+        return None
@@ -0,0 +1,262 @@
+#===============================================================================
+# Python DAB EPG API - Serialize/Deserialize To/From objects to XML/Binary as per
+# ETSI specifications TS 102 818 (XML Specification for DAB EPG) and TS 102
+# 371 (Transportation and Binary Encoding Specification for EPG).
+#
+# Copyright (C) 2010 Global Radio
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#===============================================================================
+
+"""Byte offset index over the programmes of a PI XML file, kept in a sidecar
+file next to it, so that single programmes can be parsed on demand without
+reading the whole document"""
+
+from __future__ import absolute_import
+from dabepg.xml import SCHEDULE_NS, EPG_NS, parse_programme
+from xml.parsers import expat
+from xml.etree.ElementTree import fromstring
+import codecs
+import json
+import os
+import logging
+
+logger = logging.getLogger('dabepg.xml.index')
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 2
+
+class IndexEntry:
+    """Location and key fields of a single programme within a PI file
+
+    :param start: byte offset of the start of the programme element
+    :type start: int
+    :param end: byte offset just past the end of the programme element
+    :type end: int
+    :param shortcrid: Short Crid
+    :type shortcrid: int
+    :param crid: Full Crid
+    :type crid: str
+    :param bearers: bearer IDs of the programme locations
+    :type bearers: list
+    :param time: billed time of the first location, as written in the file
+    :type time: str
+    """
+
+    def __init__(self, start, end, shortcrid, crid=None, bearers=None, time=None):
+        self.start = start
+        self.end = end
+        self.shortcrid = shortcrid
+        self.crid = crid
+        self.bearers = bearers if bearers is not None else []
+        self.time = time
+
+    def __repr__(self):
+        return '<IndexEntry: shortcrid=%s, %d-%d>' % (self.shortcrid, self.start, self.end)
+
+class ProgrammeIndex:
+    """Index of the programmes in a PI XML file
+
+    :param path: path of the indexed PI file
+    :type path: str
+    :param size: size of the file when it was indexed
+    :type size: int
+    :param mtime: modification time of the file when it was indexed
+    :type mtime: float
+    :param namespaces: namespace declarations of the document, by prefix
+    :type namespaces: dict
+    :param entries: indexed programmes, in document order
+    :type entries: list
+    :param encoding: encoding of the document, which its programmes are read in
+    :type encoding: str
+    """
+
+    def __init__(self, path, size, mtime, namespaces, entries, encoding='utf-8'):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.namespaces = namespaces
+        self.entries = entries
+        self.encoding = encoding
+        self.shortcrids = {}
+        self.crids = {}
+        self.bearers = {}
+        for entry in entries:
+            self.shortcrids[entry.shortcrid] = entry
+            if entry.crid is not None: self.crids[entry.crid] = entry
+            for bearer in entry.bearers:
+                self.bearers.setdefault(bearer, []).append(entry)
+
+    def is_valid(self):
+        """Returns whether the indexed file is unchanged, judged by its size and
+        modification time"""
+        try: stat = os.stat(self.path)
+        except OSError: return False
+        return stat.st_size == self.size and stat.st_mtime == self.mtime
+
+    def get_entry(self, shortcrid=None, crid=None):
+        """Returns the entry for the programme with the given short or full CRID"""
+        if shortcrid is not None: return self.shortcrids.get(int(shortcrid))
+        if crid is not None: return self.crids.get(str(crid))
+
+    def get_programme(self, shortcrid=None, crid=None):
+        """Parses the programme with the given short or full CRID, or returns
+        None if it is not in the file"""
+        entry = self.get_entry(shortcrid, crid)
+        if entry is not None: return self.read_programmes([entry])[0]
+
+    def get_programmes(self, bearer):
+        """Parses the programmes located on the given bearer"""
+        return self.read_programmes(self.bearers.get(str(bearer), []))
+
+    def read_programmes(self, entries):
+        """Seeks to and parses the programmes of the given entries"""
+        programmes = []
+        f = open(self.path, 'rb')
+        try:
+            for entry in entries:
+                f.seek(entry.start)
+                programmes.append(parse_fragment(f.read(entry.end - entry.start), self.namespaces, self.encoding))
+        finally:
+            f.close()
+        return programmes
+
+    def save(self, path=None):
+        """Writes the index to its sidecar file"""
+        if path is None: path = self.path + INDEX_SUFFIX
+        f = open(path, 'wb')
+        try:
+            json.dump(dict(version=INDEX_VERSION, size=self.size, mtime=self.mtime, namespaces=self.namespaces, encoding=self.encoding,
+                           programmes=[[x.start, x.end, x.shortcrid, x.crid, x.bearers, x.time] for x in self.entries]), f)
+        finally:
+            f.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __repr__(self):
+        return '<ProgrammeIndex: %s, %d programmes>' % (self.path, len(self.entries))
+
+def parse_fragment(fragment, namespaces, encoding='utf-8'):
+    """Parses a single programme element cut from a document with the given
+    namespace declarations and encoding"""
+
+    if encoding != 'utf-8': fragment = fragment.decode(encoding).encode('utf-8')
+    declarations = ' '.join(['xmlns%s="%s"' % (':' + prefix if prefix else '', uri) for prefix, uri in namespaces.items()]).encode('utf-8')
+    root = fromstring('<index %s>%s</index>' % (declarations, fragment))
+    return parse_programme(root.find('{%s}programme' % SCHEDULE_NS))
+
+def build_index(path):
+    """Scans a PI XML file once, recording the byte offsets and key fields of
+    every programme
+
+    :param path: path of the PI file
+    :type path: str
+    """
+
+    stat = os.stat(path)
+    namespaces = {}
+    entries = []
+    stack = []
+    declared = []
+    pending = []
+    parser = expat.ParserCreate(namespace_separator=' ')
+
+    # a programme ends where the parser reports whatever comes after it, as
+    # the end of the element itself is only reported by where it starts
+    def close(*args):
+        pending.pop().end = parser.CurrentByteIndex
+        parser.CharacterDataHandler = parser.CommentHandler = parser.ProcessingInstructionHandler = None
+
+    def xml_declaration(version, encoding, standalone):
+        if encoding is not None: declared.append(encoding)
+
+    def start_namespace(prefix, uri):
+        if len(stack) <= 2: namespaces[prefix or ''] = uri
+
+    def start_element(name, attrs):
+        if len(pending): close()
+        stack.append(name)
+        if name == SCHEDULE_NS + ' programme' and len(stack) == 3:
+            entries.append(IndexEntry(parser.CurrentByteIndex, None, int(attrs['shortId']), attrs.get('id')))
+        elif len(stack) == 5 and stack[2] == SCHEDULE_NS + ' programme' and stack[3] == EPG_NS + ' location':
+            entry = entries[-1]
+            if name == EPG_NS + ' time' and entry.time is None:
+                entry.time = attrs['time']
+            elif name == EPG_NS + ' bearer' and attrs['id'] not in entry.bearers:
+                entry.bearers.append(attrs['id'])
+
+    def end_element(name):
+        if len(pending): close()
+        if name == SCHEDULE_NS + ' programme' and len(stack) == 3:
+            pending.append(entries[-1])
+            parser.CharacterDataHandler = parser.CommentHandler = parser.ProcessingInstructionHandler = close
+        stack.pop()
+
+    parser.XmlDeclHandler = xml_declaration
+    parser.StartNamespaceDeclHandler = start_namespace
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+
+    f = open(path, 'rb')
+    try:
+        bom = f.read(2)
+        f.seek(0)
+        parser.ParseFile(f)
+    finally:
+        f.close()
+    encoding = get_encoding(declared[0] if len(declared) else None, bom)
+
+    logger.debug('indexed %d programmes in %s', len(entries), path)
+    return ProgrammeIndex(path, stat.st_size, stat.st_mtime, namespaces, entries, encoding)
+
+def get_encoding(declared, bom):
+    """Returns the codec a document is to be read with, from the encoding it
+    declares and the first two bytes of it"""
+
+    if bom == '\xff\xfe': return 'utf-16-le'
+    if bom == '\xfe\xff': return 'utf-16-be'
+    if declared is None: return 'utf-8'
+    return codecs.lookup(declared).name
+
+def load_index(path, save=True):
+    """Returns the index of a PI XML file, read from its sidecar file if that is
+    still valid for the file, or otherwise rebuilt (and saved, by default)
+
+    :param path: path of the PI file
+    :type path: str
+    :param save: whether to write a rebuilt index to the sidecar file
+    :type save: bool
+    """
+
+    try:
+        f = open(path + INDEX_SUFFIX, 'rb')
+        try: data = json.load(f)
+        finally: f.close()
+        if data['version'] == INDEX_VERSION:
+            namespaces = dict([(str(k), str(v)) for k, v in data['namespaces'].items()])
+            index = ProgrammeIndex(path, data['size'], data['mtime'], namespaces,
+                                   [IndexEntry(*x) for x in data['programmes']], str(data['encoding']))
+            if index.is_valid(): return index
+        logger.debug('sidecar index for %s is stale', path)
+    except (IOError, ValueError, KeyError):
+        logger.debug('no usable sidecar index for %s', path)
+
+    index = build_index(path)
+    if save: index.save()
+    return index
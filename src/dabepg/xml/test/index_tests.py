@@ -0,0 +1,101 @@
+import unittest
+
+from dabepg.xml.index import build_index, load_index, INDEX_SUFFIX
+import os
+import shutil
+import tempfile
+import time
+
+PI = '''<?xml version="1.0" encoding="UTF-8"?>
+<epg system="DAB" xml:lang="en" xmlns="http://www.worlddab.org/schemas/epgSchedule/14" xmlns:epg="http://www.worlddab.org/schemas/epgDataTypes/14">
+    <schedule creationTime="2011-07-27T09:03:35" originator="Global Radio" version="2">
+        <programme id="crid://bbc.co.uk/1" shortId="1">
+            <epg:mediumName>Breakfast</epg:mediumName>
+            <epg:location>
+                <epg:time duration="PT3H" time="2011-07-27T06:00:00"/>
+                <epg:bearer id="e1.ce15.c221.0"/>
+            </epg:location>
+        </programme>
+        <programme id="crid://bbc.co.uk/2" shortId="2">
+            <epg:mediumName>Drivetime</epg:mediumName>
+            <epg:location>
+                <epg:time duration="PT3H" time="2011-07-27T16:00:00"/>
+                <epg:bearer id="e1.ce15.c224.0"/>
+            </epg:location>
+            <epg:programmeEvent shortId="3">
+                <epg:location>
+                    <epg:time duration="PT1H" time="2011-07-27T17:00:00"/>
+                    <epg:bearer id="e1.ce15.c221.0"/>
+                </epg:location>
+            </epg:programmeEvent>
+        </programme>
+    </schedule>
+</epg>'''
+
+class ProgrammeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, '20110727_e1_ce15_c221_0_PI.xml')
+        open(self.path, 'wb').write(PI)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_build_index(self):
+        index = build_index(self.path)
+        self.assertEqual(len(index), 2)
+        entry = index.get_entry(shortcrid=2)
+        self.assertEqual(entry.crid, 'crid://bbc.co.uk/2')
+        self.assertEqual(entry.bearers, ['e1.ce15.c224.0'])
+        self.assertEqual(entry.time, '2011-07-27T16:00:00')
+        self.assertTrue(PI[entry.start:entry.end].startswith('<programme id="crid://bbc.co.uk/2"'))
+        self.assertTrue(PI[entry.start:entry.end].endswith('</programme>'))
+
+    def test_get_programme(self):
+        index = build_index(self.path)
+        programme = index.get_programme(crid='crid://bbc.co.uk/2')
+        self.assertEqual(str(programme.names[0]), 'Drivetime')
+        self.assertEqual(len(programme.events), 1)
+        self.assertEqual([str(x.names[0]) for x in index.get_programmes('e1.ce15.c221.0')], ['Breakfast'])
+
+    def test_fragment_ends(self):
+        # an empty programme with a '>' in an attribute, followed straight by another
+        data = PI.replace('        <programme id="crid://bbc.co.uk/2"', '        <programme id="crid://bbc.co.uk/a>b" shortId="4"/><programme id="crid://bbc.co.uk/2"')
+        open(self.path, 'wb').write(data)
+        index = build_index(self.path)
+        entry = index.get_entry(shortcrid=4)
+        self.assertEqual(data[entry.start:entry.end], '<programme id="crid://bbc.co.uk/a>b" shortId="4"/>')
+        self.assertEqual(index.get_programme(shortcrid=4).crid, 'crid://bbc.co.uk/a>b')
+        entry = index.get_entry(shortcrid=2)
+        self.assertTrue(data[entry.start:entry.end].endswith('</programme>'))
+
+    def test_encoding(self):
+        data = PI.replace('Breakfast', u'Caf\xe9'.encode('utf-8'))
+        for encoding, document in (('iso8859-1', data.decode('utf-8').replace('UTF-8', 'ISO-8859-1').encode('iso-8859-1')),
+                                   ('utf-16-le', data.decode('utf-8').replace('UTF-8', 'UTF-16').encode('utf-16-le')),
+                                   ('utf-8', data)):
+            if encoding == 'utf-16-le': document = '\xff\xfe' + document
+            open(self.path, 'wb').write(document)
+            index = build_index(self.path)
+            self.assertEqual(index.encoding, encoding)
+            self.assertEqual(index.get_programme(shortcrid=1).names[0].text, u'Caf\xe9')
+            self.assertEqual(str(index.get_programme(shortcrid=2).names[0]), 'Drivetime')
+            index.save()
+            self.assertEqual(load_index(self.path).encoding, encoding)
+
+    def test_sidecar(self):
+        index = load_index(self.path)
+        self.assertTrue(os.path.exists(self.path + INDEX_SUFFIX))
+        self.assertEqual(len(load_index(self.path)), 2)
+
+        # changing the file invalidates the sidecar
+        open(self.path, 'wb').write(PI.replace('shortId="2"', 'shortId="22"'))
+        os.utime(self.path, (time.time() + 10, time.time() + 10))
+        self.assertFalse(index.is_valid())
+        index = load_index(self.path)
+        self.assertEqual(index.get_entry(shortcrid=2), None)
+        self.assertEqual(str(index.get_programme(shortcrid=22).names[0]), 'Drivetime')
+
+if __name__ == "__main__":
+    unittest.main()